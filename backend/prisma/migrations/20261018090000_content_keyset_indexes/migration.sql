@@ -0,0 +1,8 @@
+-- CreateIndex
+CREATE INDEX "content_created_at_id_idx" ON "content"("created_at" DESC, "id" DESC);
+
+-- CreateIndex
+CREATE INDEX "content_status_created_at_id_idx" ON "content"("status", "created_at" DESC, "id" DESC);
+
+-- CreateIndex
+CREATE INDEX "content_author_id_created_at_id_idx" ON "content"("author_id", "created_at" DESC, "id" DESC);
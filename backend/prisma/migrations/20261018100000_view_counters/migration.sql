@@ -0,0 +1,68 @@
+-- CreateIndex
+CREATE INDEX "content_status_views_idx" ON "content"("status", "views" DESC);
+
+-- CreateIndex
+CREATE INDEX "stories_status_view_count_idx" ON "stories"("status", "view_count" DESC);
+
+-- CreateTable
+CREATE TABLE "view_counters" (
+    "name" TEXT NOT NULL,
+    "shard" INTEGER NOT NULL,
+    "value" BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT "view_counters_pkey" PRIMARY KEY ("name","shard")
+);
+
+-- Running totals of content.views and stories.view_count, kept in sync by
+-- triggers so the admin portal never has to SUM() the whole table. Deltas
+-- land on one of 16 random shards so concurrent view increments don't all
+-- queue on the same counter row; readers sum the shards.
+CREATE OR REPLACE FUNCTION bump_view_counter(counter TEXT, delta BIGINT) RETURNS void AS $$
+BEGIN
+    IF delta <> 0 THEN
+        INSERT INTO "view_counters" ("name", "shard", "value")
+        VALUES (counter, floor(random() * 16)::int, delta)
+        ON CONFLICT ("name", "shard") DO UPDATE SET "value" = "view_counters"."value" + EXCLUDED."value";
+    END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION content_views_counter() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_view_counter('content_views', NEW."views");
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM bump_view_counter('content_views', NEW."views" - OLD."views");
+    ELSE
+        PERFORM bump_view_counter('content_views', -OLD."views");
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION story_views_counter() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM bump_view_counter('story_views', NEW."view_count");
+    ELSIF TG_OP = 'UPDATE' THEN
+        PERFORM bump_view_counter('story_views', NEW."view_count" - OLD."view_count");
+    ELSE
+        PERFORM bump_view_counter('story_views', -OLD."view_count");
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "content_views_counter"
+AFTER INSERT OR DELETE OR UPDATE OF "views" ON "content"
+FOR EACH ROW EXECUTE FUNCTION content_views_counter();
+
+CREATE TRIGGER "story_views_counter"
+AFTER INSERT OR DELETE OR UPDATE OF "view_count" ON "stories"
+FOR EACH ROW EXECUTE FUNCTION story_views_counter();
+
+-- Backfill
+INSERT INTO "view_counters" ("name", "shard", "value")
+SELECT 'content_views', 0, COALESCE(SUM("views"), 0) FROM "content"
+UNION ALL
+SELECT 'story_views', 0, COALESCE(SUM("view_count"), 0) FROM "stories";
@@ -0,0 +1,102 @@
+-- CreateTable
+CREATE TABLE "analytics_daily_rollups" (
+    "day" DATE NOT NULL,
+    "author_id" TEXT NOT NULL,
+    "category_id" TEXT NOT NULL,
+    "content_views" BIGINT NOT NULL DEFAULT 0,
+    "content_engagements" BIGINT NOT NULL DEFAULT 0,
+    "story_views" BIGINT NOT NULL DEFAULT 0,
+    "story_unique_visitors" BIGINT NOT NULL DEFAULT 0,
+    "story_engagements" BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT "analytics_daily_rollups_pkey" PRIMARY KEY ("day","author_id","category_id")
+);
+
+-- CreateTable
+CREATE TABLE "rollup_watermarks" (
+    "name" TEXT NOT NULL,
+    "watermark" TIMESTAMP(3) NOT NULL,
+    "refreshed_at" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+
+    CONSTRAINT "rollup_watermarks_pkey" PRIMARY KEY ("name")
+);
+
+-- CreateIndex
+CREATE INDEX "analytics_daily_rollups_author_id_day_idx" ON "analytics_daily_rollups"("author_id", "day");
+
+-- CreateIndex
+CREATE INDEX "analytics_daily_rollups_category_id_day_idx" ON "analytics_daily_rollups"("category_id", "day");
+
+-- CreateIndex
+CREATE INDEX "story_analytics_created_at_idx" ON "story_analytics"("created_at");
+
+-- Incrementally folds new content_engagement events and story_analytics
+-- snapshots into analytics_daily_rollups and returns the new watermark, or
+-- NULL if another session is already refreshing.
+--
+-- content_engagement is append-only, so events in (watermark, hi] are
+-- counted once and added to the existing rows. story_analytics holds one row
+-- per story and day that the backend keeps updating during the day, so the
+-- story columns are recomputed outright for the last `restate_days` days and
+-- for any older day that received a new snapshot row. `hi` trails the clock
+-- by a few seconds so rows from transactions still in flight are picked up
+-- on the next run instead of being skipped.
+CREATE OR REPLACE FUNCTION refresh_analytics_rollups(restate_days INTEGER DEFAULT 2) RETURNS TIMESTAMP(3) AS $$
+DECLARE
+    hi TIMESTAMP(3) := LOCALTIMESTAMP - INTERVAL '5 seconds';
+    content_lo TIMESTAMP(3);
+    story_lo TIMESTAMP(3);
+    story_from DATE;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_rollups')) THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT "watermark" INTO content_lo FROM "rollup_watermarks" WHERE "name" = 'content_engagement';
+    SELECT "watermark" INTO story_lo FROM "rollup_watermarks" WHERE "name" = 'story_analytics';
+    content_lo := COALESCE(content_lo, '-infinity');
+    story_lo := COALESCE(story_lo, '-infinity');
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "content_views", "content_engagements")
+    SELECT e."created_at"::date, c."author_id", c."category_id",
+           COUNT(*) FILTER (WHERE e."engagement_type" = 'VIEW'),
+           COUNT(*) FILTER (WHERE e."engagement_type" <> 'VIEW')
+    FROM "content_engagement" e
+    JOIN "content" c ON c."id" = e."content_id"
+    WHERE e."created_at" > content_lo AND e."created_at" <= hi
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "content_views" = "analytics_daily_rollups"."content_views" + EXCLUDED."content_views",
+        "content_engagements" = "analytics_daily_rollups"."content_engagements" + EXCLUDED."content_engagements";
+
+    SELECT MIN("date") INTO story_from
+    FROM "story_analytics"
+    WHERE "created_at" > story_lo AND "created_at" <= hi;
+    story_from := LEAST(COALESCE(story_from, CURRENT_DATE), CURRENT_DATE - restate_days);
+
+    UPDATE "analytics_daily_rollups"
+    SET "story_views" = 0, "story_unique_visitors" = 0, "story_engagements" = 0
+    WHERE "day" >= story_from
+      AND ("story_views" <> 0 OR "story_unique_visitors" <> 0 OR "story_engagements" <> 0);
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "story_views", "story_unique_visitors", "story_engagements")
+    SELECT sa."date", s."author_id", s."category_id",
+           SUM(sa."views"), SUM(sa."unique_visitors"), SUM(sa."comments" + sa."bookmarks")
+    FROM "story_analytics" sa
+    JOIN "stories" s ON s."id" = sa."story_id"
+    WHERE sa."date" >= story_from
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "story_views" = EXCLUDED."story_views",
+        "story_unique_visitors" = EXCLUDED."story_unique_visitors",
+        "story_engagements" = EXCLUDED."story_engagements";
+
+    INSERT INTO "rollup_watermarks" ("name", "watermark", "refreshed_at")
+    VALUES ('content_engagement', hi, LOCALTIMESTAMP), ('story_analytics', hi, LOCALTIMESTAMP)
+    ON CONFLICT ("name") DO UPDATE SET
+        "watermark" = EXCLUDED."watermark",
+        "refreshed_at" = EXCLUDED."refreshed_at";
+
+    RETURN hi;
+END;
+$$ LANGUAGE plpgsql;
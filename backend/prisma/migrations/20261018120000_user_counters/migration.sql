@@ -0,0 +1,83 @@
+-- AlterTable
+ALTER TABLE "users" ADD COLUMN     "article_count" INTEGER NOT NULL DEFAULT 0,
+ADD COLUMN     "follower_count" INTEGER NOT NULL DEFAULT 0;
+
+-- CreateIndex
+CREATE INDEX "users_article_count_id_idx" ON "users"("article_count" DESC, "id" DESC);
+
+-- CreateIndex
+CREATE INDEX "users_role_article_count_id_idx" ON "users"("role", "article_count" DESC, "id" DESC);
+
+-- users.article_count / users.follower_count are a counter cache over
+-- content and user_follows, maintained row by row by the triggers below.
+-- reconcile_user_counters() recomputes them in one set-based pass; it is
+-- used for the backfill here and can be rerun at any time to repair drift
+-- (e.g. after a bulk load with triggers disabled). It only writes rows
+-- whose counts actually changed.
+CREATE OR REPLACE FUNCTION reconcile_user_counters() RETURNS INTEGER AS $$
+DECLARE
+    changed INTEGER;
+BEGIN
+    UPDATE "users" u
+    SET "article_count" = t."articles", "follower_count" = t."followers"
+    FROM (
+        SELECT u2."id",
+               COALESCE(a."n", 0) AS "articles",
+               COALESCE(f."n", 0) AS "followers"
+        FROM "users" u2
+        LEFT JOIN (SELECT "author_id", COUNT(*) AS "n" FROM "content" GROUP BY "author_id") a
+            ON a."author_id" = u2."id"
+        LEFT JOIN (SELECT "following_id", COUNT(*) AS "n" FROM "user_follows" GROUP BY "following_id") f
+            ON f."following_id" = u2."id"
+    ) t
+    WHERE u."id" = t."id"
+      AND (u."article_count" <> t."articles" OR u."follower_count" <> t."followers");
+    GET DIAGNOSTICS changed = ROW_COUNT;
+    RETURN changed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION users_article_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "users" SET "article_count" = "article_count" - 1 WHERE "id" = OLD."author_id";
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "users" SET "article_count" = "article_count" + 1 WHERE "id" = NEW."author_id";
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION users_follower_count() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE "users" SET "follower_count" = "follower_count" - 1 WHERE "id" = OLD."following_id";
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        UPDATE "users" SET "follower_count" = "follower_count" + 1 WHERE "id" = NEW."following_id";
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "users_article_count"
+AFTER INSERT OR DELETE ON "content"
+FOR EACH ROW EXECUTE FUNCTION users_article_count();
+
+CREATE TRIGGER "users_article_count_reassign"
+AFTER UPDATE OF "author_id" ON "content"
+FOR EACH ROW WHEN (OLD."author_id" IS DISTINCT FROM NEW."author_id")
+EXECUTE FUNCTION users_article_count();
+
+CREATE TRIGGER "users_follower_count"
+AFTER INSERT OR DELETE ON "user_follows"
+FOR EACH ROW EXECUTE FUNCTION users_follower_count();
+
+CREATE TRIGGER "users_follower_count_reassign"
+AFTER UPDATE OF "following_id" ON "user_follows"
+FOR EACH ROW WHEN (OLD."following_id" IS DISTINCT FROM NEW."following_id")
+EXECUTE FUNCTION users_follower_count();
+
+-- Backfill
+SELECT reconcile_user_counters();
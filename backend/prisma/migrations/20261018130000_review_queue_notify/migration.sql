@@ -0,0 +1,39 @@
+-- Push review-queue changes to the admin portal instead of having it poll.
+-- Whenever a content or stories row enters or leaves a review status
+-- (insert, delete or status change) a NOTIFY is sent on "review_queue" with
+-- a small JSON payload: {"table", "id", "status"}, where "status" is the new
+-- status or null for a delete. Notifications are delivered on commit, and
+-- identical payloads within one transaction are collapsed by Postgres.
+CREATE OR REPLACE FUNCTION notify_review_queue() RETURNS trigger AS $$
+DECLARE
+    pending TEXT[] := ARRAY['REVIEW', 'IN_REVIEW', 'SUBMITTED'];
+    old_status TEXT;
+    new_status TEXT;
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        old_status := OLD."status"::TEXT;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        new_status := NEW."status"::TEXT;
+    END IF;
+    IF old_status IS NOT DISTINCT FROM new_status THEN
+        RETURN NULL;
+    END IF;
+    IF old_status = ANY(pending) OR new_status = ANY(pending) THEN
+        PERFORM pg_notify('review_queue', json_build_object(
+            'table', TG_TABLE_NAME,
+            'id', CASE WHEN TG_OP = 'DELETE' THEN OLD."id" ELSE NEW."id" END,
+            'status', new_status
+        )::TEXT);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "content_review_queue_notify"
+AFTER INSERT OR DELETE OR UPDATE OF "status" ON "content"
+FOR EACH ROW EXECUTE FUNCTION notify_review_queue();
+
+CREATE TRIGGER "stories_review_queue_notify"
+AFTER INSERT OR DELETE OR UPDATE OF "status" ON "stories"
+FOR EACH ROW EXECUTE FUNCTION notify_review_queue();
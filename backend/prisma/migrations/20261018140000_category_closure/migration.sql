@@ -0,0 +1,204 @@
+-- CreateTable
+CREATE TABLE "category_closure" (
+    "ancestor_id" TEXT NOT NULL,
+    "descendant_id" TEXT NOT NULL,
+    "depth" INTEGER NOT NULL,
+
+    CONSTRAINT "category_closure_pkey" PRIMARY KEY ("ancestor_id","descendant_id")
+);
+
+-- CreateTable
+CREATE TABLE "analytics_category_rollups" (
+    "day" DATE NOT NULL,
+    "category_id" TEXT NOT NULL,
+    "content_views" BIGINT NOT NULL DEFAULT 0,
+    "content_engagements" BIGINT NOT NULL DEFAULT 0,
+    "story_views" BIGINT NOT NULL DEFAULT 0,
+    "story_unique_visitors" BIGINT NOT NULL DEFAULT 0,
+    "story_engagements" BIGINT NOT NULL DEFAULT 0,
+
+    CONSTRAINT "analytics_category_rollups_pkey" PRIMARY KEY ("day","category_id")
+);
+
+-- CreateIndex
+CREATE INDEX "category_closure_descendant_id_idx" ON "category_closure"("descendant_id");
+
+-- AddForeignKey
+ALTER TABLE "category_closure" ADD CONSTRAINT "category_closure_ancestor_id_fkey" FOREIGN KEY ("ancestor_id") REFERENCES "categories"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- AddForeignKey
+ALTER TABLE "category_closure" ADD CONSTRAINT "category_closure_descendant_id_fkey" FOREIGN KEY ("descendant_id") REFERENCES "categories"("id") ON DELETE CASCADE ON UPDATE CASCADE;
+
+-- category_closure holds one row per (ancestor, descendant) pair of the
+-- categories.parent_id tree, including each category paired with itself at
+-- depth 0, so "everything under X" is an indexed lookup instead of a
+-- recursive query. The triggers below keep it in step with inserts and
+-- parent_id changes; deletes and id changes cascade through the foreign
+-- keys. rebuild_category_closure() recomputes it from scratch, for the
+-- backfill here and after bulk loads with triggers disabled.
+CREATE OR REPLACE FUNCTION rebuild_category_closure() RETURNS INTEGER AS $$
+DECLARE
+    pairs INTEGER;
+BEGIN
+    DELETE FROM "category_closure";
+    -- The depth bound only guards against a parent_id cycle that predates
+    -- the cycle check in category_closure_move().
+    INSERT INTO "category_closure" ("ancestor_id", "descendant_id", "depth")
+    WITH RECURSIVE tree AS (
+        SELECT "id" AS "ancestor_id", "id" AS "descendant_id", 0 AS "depth"
+        FROM "categories"
+        UNION ALL
+        SELECT t."ancestor_id", c."id", t."depth" + 1
+        FROM tree t
+        JOIN "categories" c ON c."parent_id" = t."descendant_id"
+        WHERE t."depth" < 64
+    )
+    SELECT DISTINCT ON ("ancestor_id", "descendant_id") "ancestor_id", "descendant_id", "depth"
+    FROM tree
+    ORDER BY "ancestor_id", "descendant_id", "depth";
+    GET DIAGNOSTICS pairs = ROW_COUNT;
+    RETURN pairs;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION category_closure_insert() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO "category_closure" ("ancestor_id", "descendant_id", "depth")
+    SELECT NEW."id", NEW."id", 0
+    UNION ALL
+    SELECT "ancestor_id", NEW."id", "depth" + 1
+    FROM "category_closure"
+    WHERE "descendant_id" = NEW."parent_id";
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Moving a category moves its whole subtree: the links from the old
+-- ancestors to every node of the subtree are dropped and the new ancestors
+-- are linked to every node instead. Links inside the subtree are unchanged.
+CREATE OR REPLACE FUNCTION category_closure_move() RETURNS trigger AS $$
+BEGIN
+    IF NEW."parent_id" IS NOT DISTINCT FROM OLD."parent_id" THEN
+        RETURN NULL;
+    END IF;
+    IF EXISTS (
+        SELECT 1 FROM "category_closure"
+        WHERE "ancestor_id" = NEW."id" AND "descendant_id" = NEW."parent_id"
+    ) THEN
+        RAISE EXCEPTION 'category % cannot be moved under its own descendant %', NEW."id", NEW."parent_id";
+    END IF;
+
+    DELETE FROM "category_closure" l
+    USING "category_closure" sub
+    WHERE sub."ancestor_id" = NEW."id"
+      AND l."descendant_id" = sub."descendant_id"
+      AND l."ancestor_id" NOT IN (
+          SELECT "descendant_id" FROM "category_closure" WHERE "ancestor_id" = NEW."id"
+      );
+
+    INSERT INTO "category_closure" ("ancestor_id", "descendant_id", "depth")
+    SELECT a."ancestor_id", sub."descendant_id", a."depth" + sub."depth" + 1
+    FROM "category_closure" a
+    JOIN "category_closure" sub ON sub."ancestor_id" = NEW."id"
+    WHERE a."descendant_id" = NEW."parent_id";
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "category_closure_insert"
+AFTER INSERT ON "categories"
+FOR EACH ROW EXECUTE FUNCTION category_closure_insert();
+
+CREATE TRIGGER "category_closure_move"
+AFTER UPDATE OF "parent_id" ON "categories"
+FOR EACH ROW EXECUTE FUNCTION category_closure_move();
+
+SELECT rebuild_category_closure();
+
+-- analytics_category_rollups is analytics_daily_rollups summed over
+-- authors: one row per day and category instead of one per day, author and
+-- category, so category totals over a date range read a few thousand rows.
+-- refresh_analytics_rollups() now re-sums every day it touched.
+CREATE OR REPLACE FUNCTION refresh_analytics_rollups(restate_days INTEGER DEFAULT 2) RETURNS TIMESTAMP(3) AS $$
+DECLARE
+    hi TIMESTAMP(3) := LOCALTIMESTAMP - INTERVAL '5 seconds';
+    content_lo TIMESTAMP(3);
+    story_lo TIMESTAMP(3);
+    story_from DATE;
+    content_from DATE;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_rollups')) THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT "watermark" INTO content_lo FROM "rollup_watermarks" WHERE "name" = 'content_engagement';
+    SELECT "watermark" INTO story_lo FROM "rollup_watermarks" WHERE "name" = 'story_analytics';
+    content_lo := COALESCE(content_lo, '-infinity');
+    story_lo := COALESCE(story_lo, '-infinity');
+
+    SELECT MIN("created_at")::date INTO content_from
+    FROM "content_engagement"
+    WHERE "created_at" > content_lo AND "created_at" <= hi;
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "content_views", "content_engagements")
+    SELECT e."created_at"::date, c."author_id", c."category_id",
+           COUNT(*) FILTER (WHERE e."engagement_type" = 'VIEW'),
+           COUNT(*) FILTER (WHERE e."engagement_type" <> 'VIEW')
+    FROM "content_engagement" e
+    JOIN "content" c ON c."id" = e."content_id"
+    WHERE e."created_at" > content_lo AND e."created_at" <= hi
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "content_views" = "analytics_daily_rollups"."content_views" + EXCLUDED."content_views",
+        "content_engagements" = "analytics_daily_rollups"."content_engagements" + EXCLUDED."content_engagements";
+
+    SELECT MIN("date") INTO story_from
+    FROM "story_analytics"
+    WHERE "created_at" > story_lo AND "created_at" <= hi;
+    story_from := LEAST(COALESCE(story_from, CURRENT_DATE), CURRENT_DATE - restate_days);
+
+    UPDATE "analytics_daily_rollups"
+    SET "story_views" = 0, "story_unique_visitors" = 0, "story_engagements" = 0
+    WHERE "day" >= story_from
+      AND ("story_views" <> 0 OR "story_unique_visitors" <> 0 OR "story_engagements" <> 0);
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "story_views", "story_unique_visitors", "story_engagements")
+    SELECT sa."date", s."author_id", s."category_id",
+           SUM(sa."views"), SUM(sa."unique_visitors"), SUM(sa."comments" + sa."bookmarks")
+    FROM "story_analytics" sa
+    JOIN "stories" s ON s."id" = sa."story_id"
+    WHERE sa."date" >= story_from
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "story_views" = EXCLUDED."story_views",
+        "story_unique_visitors" = EXCLUDED."story_unique_visitors",
+        "story_engagements" = EXCLUDED."story_engagements";
+
+    -- Every day touched above is re-summed; LEAST ignores a NULL content_from.
+    story_from := LEAST(story_from, content_from);
+    DELETE FROM "analytics_category_rollups" WHERE "day" >= story_from;
+    INSERT INTO "analytics_category_rollups" ("day", "category_id", "content_views", "content_engagements",
+                                              "story_views", "story_unique_visitors", "story_engagements")
+    SELECT "day", "category_id", SUM("content_views"), SUM("content_engagements"),
+           SUM("story_views"), SUM("story_unique_visitors"), SUM("story_engagements")
+    FROM "analytics_daily_rollups"
+    WHERE "day" >= story_from
+    GROUP BY 1, 2;
+
+    INSERT INTO "rollup_watermarks" ("name", "watermark", "refreshed_at")
+    VALUES ('content_engagement', hi, LOCALTIMESTAMP), ('story_analytics', hi, LOCALTIMESTAMP)
+    ON CONFLICT ("name") DO UPDATE SET
+        "watermark" = EXCLUDED."watermark",
+        "refreshed_at" = EXCLUDED."refreshed_at";
+
+    RETURN hi;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill
+INSERT INTO "analytics_category_rollups" ("day", "category_id", "content_views", "content_engagements",
+                                          "story_views", "story_unique_visitors", "story_engagements")
+SELECT "day", "category_id", SUM("content_views"), SUM("content_engagements"),
+       SUM("story_views"), SUM("story_unique_visitors"), SUM("story_engagements")
+FROM "analytics_daily_rollups"
+GROUP BY 1, 2;
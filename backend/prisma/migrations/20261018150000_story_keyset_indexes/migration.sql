@@ -0,0 +1,8 @@
+-- CreateIndex
+CREATE INDEX "stories_created_at_id_idx" ON "stories"("created_at" DESC, "id" DESC);
+
+-- CreateIndex
+CREATE INDEX "stories_status_created_at_id_idx" ON "stories"("status", "created_at" DESC, "id" DESC);
+
+-- CreateIndex
+CREATE INDEX "stories_author_id_created_at_id_idx" ON "stories"("author_id", "created_at" DESC, "id" DESC);
@@ -0,0 +1,43 @@
+-- Indexes behind the admin portal's search over articles, stories and their
+-- authors.
+--
+-- Full text: each content/stories row keeps a stored tsvector of its title
+-- (weight A) and summary/abstract (weight B), GIN-indexed. The 'simple'
+-- configuration lowercases without stemming or stop words, which suits the
+-- mixed Bengali and English text.
+--
+-- Fuzzy matching: pg_trgm GIN indexes on titles and on author names and
+-- emails serve both similarity (%) and substring ILIKE '%...%' matches.
+
+-- CreateExtension
+CREATE EXTENSION IF NOT EXISTS "pg_trgm";
+
+-- AlterTable
+ALTER TABLE "content" ADD COLUMN "search_vector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce("title", '')), 'A')
+    || setweight(to_tsvector('simple', coalesce("summary", '')), 'B')
+) STORED;
+
+-- AlterTable
+ALTER TABLE "stories" ADD COLUMN "search_vector" tsvector GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce("title", '')), 'A')
+    || setweight(to_tsvector('simple', coalesce("abstract", '')), 'B')
+) STORED;
+
+-- CreateIndex
+CREATE INDEX "content_search_vector_idx" ON "content" USING GIN ("search_vector");
+
+-- CreateIndex
+CREATE INDEX "content_title_idx" ON "content" USING GIN ("title" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "stories_search_vector_idx" ON "stories" USING GIN ("search_vector");
+
+-- CreateIndex
+CREATE INDEX "stories_title_idx" ON "stories" USING GIN ("title" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "users_name_idx" ON "users" USING GIN ("name" gin_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "users_email_trgm_idx" ON "users" USING GIN ("email" gin_trgm_ops);
@@ -0,0 +1,6 @@
+-- Pending Review looks up an article's or story's image by its URL
+-- (type_data->>'featuredImage', stories.thumbnail) to find the upload to
+-- thumbnail.
+
+-- CreateIndex
+CREATE INDEX "media_url_idx" ON "media"("url");
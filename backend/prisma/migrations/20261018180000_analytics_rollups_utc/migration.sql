@@ -0,0 +1,82 @@
+-- The rollup columns, like every timestamp(3) column Prisma writes, hold UTC,
+-- but refresh_analytics_rollups() read the clock as LOCALTIMESTAMP and
+-- CURRENT_DATE, which follow the session's TimeZone. On a server not set to
+-- UTC the watermark ran ahead of or behind the events, skipping or recounting
+-- them, and the restated days were off by one around midnight. Same
+-- function, with the clock read in UTC.
+CREATE OR REPLACE FUNCTION refresh_analytics_rollups(restate_days INTEGER DEFAULT 2) RETURNS TIMESTAMP(3) AS $$
+DECLARE
+    hi TIMESTAMP(3) := (now() AT TIME ZONE 'UTC') - INTERVAL '5 seconds';
+    today DATE := (now() AT TIME ZONE 'UTC')::date;
+    content_lo TIMESTAMP(3);
+    story_lo TIMESTAMP(3);
+    story_from DATE;
+    content_from DATE;
+BEGIN
+    IF NOT pg_try_advisory_xact_lock(hashtext('refresh_analytics_rollups')) THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT "watermark" INTO content_lo FROM "rollup_watermarks" WHERE "name" = 'content_engagement';
+    SELECT "watermark" INTO story_lo FROM "rollup_watermarks" WHERE "name" = 'story_analytics';
+    content_lo := COALESCE(content_lo, '-infinity');
+    story_lo := COALESCE(story_lo, '-infinity');
+
+    SELECT MIN("created_at")::date INTO content_from
+    FROM "content_engagement"
+    WHERE "created_at" > content_lo AND "created_at" <= hi;
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "content_views", "content_engagements")
+    SELECT e."created_at"::date, c."author_id", c."category_id",
+           COUNT(*) FILTER (WHERE e."engagement_type" = 'VIEW'),
+           COUNT(*) FILTER (WHERE e."engagement_type" <> 'VIEW')
+    FROM "content_engagement" e
+    JOIN "content" c ON c."id" = e."content_id"
+    WHERE e."created_at" > content_lo AND e."created_at" <= hi
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "content_views" = "analytics_daily_rollups"."content_views" + EXCLUDED."content_views",
+        "content_engagements" = "analytics_daily_rollups"."content_engagements" + EXCLUDED."content_engagements";
+
+    SELECT MIN("date") INTO story_from
+    FROM "story_analytics"
+    WHERE "created_at" > story_lo AND "created_at" <= hi;
+    story_from := LEAST(COALESCE(story_from, today), today - restate_days);
+
+    UPDATE "analytics_daily_rollups"
+    SET "story_views" = 0, "story_unique_visitors" = 0, "story_engagements" = 0
+    WHERE "day" >= story_from
+      AND ("story_views" <> 0 OR "story_unique_visitors" <> 0 OR "story_engagements" <> 0);
+
+    INSERT INTO "analytics_daily_rollups" ("day", "author_id", "category_id", "story_views", "story_unique_visitors", "story_engagements")
+    SELECT sa."date", s."author_id", s."category_id",
+           SUM(sa."views"), SUM(sa."unique_visitors"), SUM(sa."comments" + sa."bookmarks")
+    FROM "story_analytics" sa
+    JOIN "stories" s ON s."id" = sa."story_id"
+    WHERE sa."date" >= story_from
+    GROUP BY 1, 2, 3
+    ON CONFLICT ("day", "author_id", "category_id") DO UPDATE SET
+        "story_views" = EXCLUDED."story_views",
+        "story_unique_visitors" = EXCLUDED."story_unique_visitors",
+        "story_engagements" = EXCLUDED."story_engagements";
+
+    -- Every day touched above is re-summed; LEAST ignores a NULL content_from.
+    story_from := LEAST(story_from, content_from);
+    DELETE FROM "analytics_category_rollups" WHERE "day" >= story_from;
+    INSERT INTO "analytics_category_rollups" ("day", "category_id", "content_views", "content_engagements",
+                                              "story_views", "story_unique_visitors", "story_engagements")
+    SELECT "day", "category_id", SUM("content_views"), SUM("content_engagements"),
+           SUM("story_views"), SUM("story_unique_visitors"), SUM("story_engagements")
+    FROM "analytics_daily_rollups"
+    WHERE "day" >= story_from
+    GROUP BY 1, 2;
+
+    INSERT INTO "rollup_watermarks" ("name", "watermark", "refreshed_at")
+    VALUES ('content_engagement', hi, now() AT TIME ZONE 'UTC'), ('story_analytics', hi, now() AT TIME ZONE 'UTC')
+    ON CONFLICT ("name") DO UPDATE SET
+        "watermark" = EXCLUDED."watermark",
+        "refreshed_at" = EXCLUDED."refreshed_at";
+
+    RETURN hi;
+END;
+$$ LANGUAGE plpgsql;
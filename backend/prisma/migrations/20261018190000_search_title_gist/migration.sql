@@ -0,0 +1,16 @@
+-- Search walks matching titles in word-similarity order (ORDER BY
+-- query <<-> title LIMIT n) so a common term reads only the best n rows.
+-- Only a GiST trigram index can return rows in distance order; it also serves
+-- the <% filter and substring ILIKE, so it replaces the GIN title indexes.
+
+-- DropIndex
+DROP INDEX "content_title_idx";
+
+-- DropIndex
+DROP INDEX "stories_title_idx";
+
+-- CreateIndex
+CREATE INDEX "content_title_idx" ON "content" USING GIST ("title" gist_trgm_ops);
+
+-- CreateIndex
+CREATE INDEX "stories_title_idx" ON "stories" USING GIST ("title" gist_trgm_ops);
@@ -0,0 +1,45 @@
+-- users.article_count counts an author's stories as well as their content,
+-- as the portal lists both. users_article_count() only reads author_id, so
+-- the stories triggers reuse it.
+CREATE OR REPLACE FUNCTION reconcile_user_counters() RETURNS INTEGER AS $$
+DECLARE
+    changed INTEGER;
+BEGIN
+    UPDATE "users" u
+    SET "article_count" = t."articles", "follower_count" = t."followers"
+    FROM (
+        SELECT u2."id",
+               COALESCE(a."n", 0) AS "articles",
+               COALESCE(f."n", 0) AS "followers"
+        FROM "users" u2
+        LEFT JOIN (
+            SELECT "author_id", COUNT(*) AS "n"
+            FROM (
+                SELECT "author_id" FROM "content"
+                UNION ALL
+                SELECT "author_id" FROM "stories"
+            ) w
+            GROUP BY "author_id"
+        ) a
+            ON a."author_id" = u2."id"
+        LEFT JOIN (SELECT "following_id", COUNT(*) AS "n" FROM "user_follows" GROUP BY "following_id") f
+            ON f."following_id" = u2."id"
+    ) t
+    WHERE u."id" = t."id"
+      AND (u."article_count" <> t."articles" OR u."follower_count" <> t."followers");
+    GET DIAGNOSTICS changed = ROW_COUNT;
+    RETURN changed;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER "users_story_count"
+AFTER INSERT OR DELETE ON "stories"
+FOR EACH ROW EXECUTE FUNCTION users_article_count();
+
+CREATE TRIGGER "users_story_count_reassign"
+AFTER UPDATE OF "author_id" ON "stories"
+FOR EACH ROW WHEN (OLD."author_id" IS DISTINCT FROM NEW."author_id")
+EXECUTE FUNCTION users_article_count();
+
+-- Backfill
+SELECT reconcile_user_counters();
@@ -1,8 +1,25 @@
+import functools
+import itertools
+import time
 import streamlit as st
-from datetime import datetime
-import pandas as pd
-from db import get_db_connection
+from datetime import date, datetime, timedelta
+from db import READ_YOUR_WRITES_WINDOW, get_cursor, get_pool, pin_primary, set_budget, start_warm_up
+import export
+import live
+import moderation
+import queries
+import render
+import rollups
+import thumbnails
+import timeseries
+import tracing
+from parallel import OVER_BUDGET, query, run_queries
 import os
+import uuid
+
+# Fill the pool and prepare the Dashboard's statements while the login page
+# renders; only the first run of the process starts it.
+start_warm_up(queries.prepare_dashboard)
 
 st.set_page_config(
     page_title="Admin Portal",
@@ -11,283 +28,26 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# EXACT prototype CSS
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-    
-    /* Global */
-    * {
-        font-family: 'Inter', -apple-system, sans-serif;
-        margin: 0;
-        padding: 0;
-        box-sizing: border-box;
-    }
-    
-    /* Hide Streamlit */
-    #MainMenu, footer, header {visibility: hidden;}
-    .stDeployButton {display: none;}
-    
-    /* App background */
-    .stApp {
-        background: #f8f9fa;
-    }
-    
-    /* Remove ALL default Streamlit padding */
-    .block-container {
-        padding: 0 !important;
-        max-width: 100% !important;
-    }
-    
-    section.main > div {
-        padding: 0 !important;
-    }
-    
-    /* Header */
-    .portal-header {
-        background: white;
-        padding: 20px 40px;
-        border-bottom: 1px solid #e5e7eb;
-        display: flex;
-        justify-content: space-between;
-        align-items: center;
-        margin: 0;
-    }
-    
-    .portal-header h1 {
-        color: #dc2626;
-        font-size: 18px;
-        font-weight: 600;
-        margin: 0;
-    }
-    
-    .user-badge {
-        display: flex;
-        align-items: center;
-        gap: 10px;
-    }
-    
-    .user-avatar {
-        width: 36px;
-        height: 36px;
-        background: #dc2626;
-        color: white;
-        border-radius: 50%;
-        display: flex;
-        align-items: center;
-        justify-content: center;
-        font-weight: 600;
-        font-size: 14px;
-    }
-    
-    .user-name {
-        font-size: 13px;
-        font-weight: 600;
-        color: #111827;
-        line-height: 1.2;
-    }
-    
-    .user-role {
-        font-size: 11px;
-        color: #6b7280;
-        line-height: 1.2;
-    }
-    
-    /* Sidebar */
-    [data-testid="stSidebar"] {
-        background: white;
-        border-right: 1px solid #e5e7eb;
-    }
-    
-    [data-testid="stSidebar"] > div:first-child {
-        background: white;
-        padding: 0;
-    }
-    
-    /* Main content wrapper */
-    .dashboard-container {
-        padding: 32px 40px;
-        background: #f8f9fa;
-    }
-    
-    /* Stats Grid */
-    .stats-grid {
-        display: grid;
-        grid-template-columns: repeat(5, 1fr);
-        gap: 20px;
-        margin-bottom: 32px;
-    }
-    
-    .stat-card {
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 10px;
-        padding: 24px 20px;
-        text-align: center;
-    }
-    
-    .stat-label {
-        font-size: 10px;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.8px;
-        color: #9ca3af;
-        margin-bottom: 12px;
-        display: block;
-    }
-    
-    .stat-value {
-        font-size: 36px;
-        font-weight: 700;
-        color: #111827;
-        line-height: 1;
-    }
-    
-    .stat-value.green { color: #10b981; }
-    .stat-value.yellow { color: #f59e0b; }
-    .stat-value.purple { color: #8b5cf6; }
-    .stat-value.blue { color: #3b82f6; }
-    
-    /* Content Grid */
-    .content-grid {
-        display: grid;
-        grid-template-columns: 1fr 1fr;
-        gap: 24px;
-    }
-    
-    .card {
-        background: white;
-        border: 1px solid #e5e7eb;
-        border-radius: 10px;
-        padding: 28px;
-    }
-    
-    .card h3 {
-        font-size: 17px;
-        font-weight: 600;
-        color: #111827;
-        margin: 0 0 24px 0;
-    }
-    
-    /* Article Item */
-    .article-item {
-        padding: 16px 0;
-        border-bottom: 1px solid #f3f4f6;
-        display: flex;
-        justify-content: space-between;
-        align-items: flex-start;
-    }
-    
-    .article-item:last-child {
-        border-bottom: none;
-        padding-bottom: 0;
-    }
-    
-    .article-item:first-child {
-        padding-top: 0;
-    }
-    
-    .article-content {
-        flex: 1;
-    }
-    
-    .article-title {
-        font-size: 14px;
-        font-weight: 600;
-        color: #111827;
-        margin: 0 0 6px 0;
-        line-height: 1.4;
-    }
-    
-    .article-meta {
-        font-size: 12px;
-        color: #6b7280;
-        line-height: 1.3;
-    }
-    
-    /* Badge */
-    .badge {
-        display: inline-block;
-        padding: 5px 12px;
-        border-radius: 12px;
-        font-size: 10px;
-        font-weight: 600;
-        text-transform: uppercase;
-        letter-spacing: 0.3px;
-        white-space: nowrap;
-    }
-    
-    .badge-published {
-        background: #d1fae5;
-        color: #065f46;
-    }
-    
-    .badge-pending {
-        background: #FFF9C4;
-        color: #F57F17;
-    }
-    
-    /* Top Item */
-    .top-item {
-        padding: 16px 0;
-        border-bottom: 1px solid #f3f4f6;
-    }
-    
-    .top-item:last-child {
-        border-bottom: none;
-        padding-bottom: 0;
-    }
-    
-    .top-item:first-child {
-        padding-top: 0;
-    }
-    
-    .top-title {
-        font-size: 14px;
-        font-weight: 600;
-        color: #111827;
-        margin: 0 0 6px 0;
-        line-height: 1.4;
-    }
-    
-    .top-stats {
-        font-size: 12px;
-        color: #6b7280;
-    }
-    
-    .dot-red {
-        color: #ef4444;
-        font-weight: 600;
-    }
-    
-    .comment-blue {
-        color: #3b82f6;
-    }
-    
-    /* Remove streamlit button styling */
-    .stButton button {
-        width: 100%;
-        border-radius: 6px;
-        border: 1px solid #e5e7eb;
-        background: white;
-        color: #374151;
-        font-weight: 500;
-        padding: 8px 12px;
-        font-size: 14px;
-    }
-    
-    .stButton button:hover {
-        background: #f9fafb;
-        border-color: #d1d5db;
-    }
-    
-    /* Hide extra whitespace */
-    .element-container {
-        margin: 0 !important;
-        padding: 0 !important;
-    }
-</style>
-""", unsafe_allow_html=True)
+if 'page' not in st.session_state:
+    st.session_state.page = "Dashboard"
+
+
+def start_trace(page):
+    """Trace this run while the Performance panel is open, or always when
+    PORTAL_TRACE_LOG is set."""
+    if not (st.session_state.get("perf_panel") or tracing.TRACE_LOG):
+        tracing.clear()
+        return None
+    if "trace_session" not in st.session_state:
+        st.session_state.trace_session = uuid.uuid4().hex[:8]
+    return tracing.start(page, st.session_state.trace_session)
+
+
+start_trace(st.session_state.page)
+
+# EXACT prototype CSS, minified and cached once per process (see portal.css).
+st.markdown(render.stylesheet(), unsafe_allow_html=True)
+tracing.lap("stage", "css")
 
 def check_auth():
     if 'authenticated' not in st.session_state:
@@ -314,116 +74,160 @@ def check_auth():
             st.markdown("</div>", unsafe_allow_html=True)
         st.stop()
 
+def keyset_pages(prefix, filters):
+    """Seek keys of the pages visited so far; starts over when ``filters`` change."""
+    if st.session_state.get(f"{prefix}_filters") != filters:
+        st.session_state[f"{prefix}_filters"] = filters
+        st.session_state[f"{prefix}_keys"] = [None]
+    return st.session_state[f"{prefix}_keys"]
+
+
+def keyset_controls(prefix, page_keys, has_next, next_key):
+    prev_col, page_col, next_col = st.columns([1, 4, 1])
+    with prev_col:
+        # Callbacks run before the fragment reruns, so one click is one run.
+        st.button("← Previous", key=f"{prefix}_prev", disabled=len(page_keys) == 1,
+                  on_click=page_keys.pop)
+    with page_col:
+        st.caption(f"Page {len(page_keys)}")
+    with next_col:
+        st.button("Next →", key=f"{prefix}_next", disabled=not has_next,
+                  on_click=page_keys.append, args=(next_key,))
+
+
+def go(page):
+    st.session_state.page = page
+
+
+def logout():
+    st.session_state.authenticated = False
+
+
+def moderate(ids, status):
+    result = moderation.moderate(ids, status)
+    st.session_state.moderation_result = result
+    # Replicas may not have replayed the change yet; read this session's
+    # pages from the primary for a while.
+    st.session_state.primary_until = time.monotonic() + READ_YOUR_WRITES_WINDOW
+    st.session_state.pending_queue_version = st.session_state.get("pending_queue_version", 0) + 1
+    queue = st.session_state.get("review_queue")
+    if queue is not None:
+        queue.patch({id: status for id in result.changed})
+
+
+PAGES = {}
+
+
+def page_fragment(name):
+    """Register a page as a ``st.fragment``.
+
+    Only the selected page's fragment runs after the shared chrome, and widget
+    interactions inside it rerun just that fragment, not the whole script.
+    The fragment reports the trace itself so the Performance panel also
+    updates on fragment reruns. A page whose queries run over budget, with
+    nothing older to show, gets a warning instead of an error.
+    """
+    def decorator(fn):
+        @st.fragment
+        @functools.wraps(fn)
+        def fragment():
+            if tracing.current() is None:
+                # A fragment rerun skips the script above, including its trace.
+                start_trace(name)
+            try:
+                with pin_primary(time.monotonic() < st.session_state.get("primary_until", 0)):
+                    fn()
+            except OVER_BUDGET:
+                st.warning("The database is slow right now and this page timed out. Try again in a moment.")
+            tracing.lap("page", name)
+            show_trace(tracing.finish())
+        PAGES[name] = fragment
+        return fragment
+    return decorator
+
+
+def stale_notice(data):
+    """Say when ``run_queries`` served some of ``data`` from older results."""
+    if data.stale:
+        as_of = datetime.fromtimestamp(min(data.stale.values()))
+        st.caption(f"⚠️ Stale as of {as_of:%H:%M:%S}: the database is slow, refreshing in the background.")
+
+
+def show_trace(trace):
+    if trace is None or not st.session_state.get("perf_panel"):
+        return
+    with perf_panel.container():
+        st.caption(f"{trace.page}: {trace.total * 1000:.1f} ms total")
+        st.dataframe(
+            [{"stage": kind, "ms": ms} for kind, ms in trace.totals().items()],
+            hide_index=True,
+        )
+        st.dataframe(trace.spans, hide_index=True)
+
+
 check_auth()
+tracing.lap("stage", "auth")
 
 # Header
-st.markdown("""
-<div class='portal-header'>
-    <h1>Admin Portal</h1>
-    <div class='user-badge'>
-        <div class='user-avatar'>A</div>
-        <div>
-            <div class='user-name'>admin</div>
-            <div class='user-role'>Administrator</div>
-        </div>
-    </div>
-</div>
-""", unsafe_allow_html=True)
+st.markdown(render.HEADER, unsafe_allow_html=True)
+tracing.lap("stage", "header")
 
 # Sidebar
 with st.sidebar:
-    if 'page' not in st.session_state:
-        st.session_state.page = "Dashboard"
-    
     st.markdown("<br>", unsafe_allow_html=True)
     
-    if st.button("📊 Dashboard", key="nav_dashboard"):
-        st.session_state.page = "Dashboard"
-        st.rerun()
-    
-    if st.button("📄 All Articles", key="nav_articles"):
-        st.session_state.page = "All Articles"
-        st.rerun()
-    
-    if st.button("⏰ Pending Review", key="nav_pending"):
-        st.session_state.page = "Pending Review"
-        st.rerun()
-    
-    if st.button("👥 Users", key="nav_users"):
-        st.session_state.page = "Users"
-        st.rerun()
-    
-    if st.button("📈 Analytics", key="nav_analytics"):
-        st.session_state.page = "Analytics"
-        st.rerun()
-    
-    if st.button("⚙️ Settings", key="nav_settings"):
-        st.session_state.page = "Settings"
-        st.rerun()
-    
+    st.button("📊 Dashboard", key="nav_dashboard", on_click=go, args=("Dashboard",))
+    st.button("📄 All Articles", key="nav_articles", on_click=go, args=("All Articles",))
+    st.button("⏰ Pending Review", key="nav_pending", on_click=go, args=("Pending Review",))
+    st.button("👥 Users", key="nav_users", on_click=go, args=("Users",))
+    st.button("📈 Analytics", key="nav_analytics", on_click=go, args=("Analytics",))
+    st.button("📤 Export", key="nav_export", on_click=go, args=("Export",))
+    st.button("⚙️ Settings", key="nav_settings", on_click=go, args=("Settings",))
     st.divider()
-    if st.button("Logout"):
-        st.session_state.authenticated = False
-        st.rerun()
+    st.button("Logout", on_click=logout)
 
-page = st.session_state.page
+    st.checkbox("Performance", key="perf_panel")
+    # Filled in by the page fragment, so its reruns can update it in place.
+    perf_panel = st.empty()
+
+tracing.lap("stage", "sidebar")
 
 # Database
 try:
-    conn = get_db_connection()
-    cur = conn.cursor()
+    get_pool()
 except Exception as e:
     st.error(f"Database error: {str(e)}")
     st.stop()
+tracing.lap("stage", "database")
+
 
 # DASHBOARD (FROM FILE 2 - WORKING VERSION)
-if page == "Dashboard":
+@page_fragment("Dashboard")
+def dashboard_page():
     # Get data
-    cur.execute("SELECT COUNT(*) FROM content")
-    total = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM content WHERE status = 'PUBLISHED'")
-    published = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(*) FROM content WHERE status IN ('REVIEW', 'IN_REVIEW', 'SUBMITTED')")
-    pending = cur.fetchone()[0]
-    
-    cur.execute("SELECT COUNT(DISTINCT author_id) FROM content")
-    authors = cur.fetchone()[0]
-    
-    # Build recent articles HTML
-    cur.execute("""
-        SELECT c.title, c.status, u.email, u.name
-        FROM content c
-        JOIN users u ON c.author_id = u.id
-        ORDER BY c.created_at DESC
-        LIMIT 4
-    """)
-    recent = cur.fetchall()
-    
-    recent_html = ""
-    for article in recent:
-        author = article[3] if article[3] else article[2].split('@')[0]
-        recent_html += f"<div class='article-item'><div class='article-content'><div class='article-title'>{article[0]}</div><div class='article-meta'>{author} • যাত্রা-আড্ডা</div></div><span class='badge badge-published'>PUBLISHED</span></div>"
-    
-    # Build top performing HTML
-    top = [
-        ("50,000 Commuters Stranded as Metro Breaks Down", 5621, 89),
-        ("Coaching Center Mafia: The Rs 2,000 Crore Industry", 4892, 127),
-        ("7 Century-Old Sweet Shops Kolkata Has Forgotten", 3245, 56),
-        ("Deshapriyas Park's Revolutionary Eco-Friendly Pandal", 2847, 34)
-    ]
-    
-    top_html = ""
-    for title, views, comments in top:
-        top_html += f"<div class='top-item'><div class='top-title'>{title}</div><div class='top-stats'><span class='dot-red'>●</span> {views:,} views • <span class='comment-blue'>💬</span> {comments}</div></div>"
-    
+    data = run_queries({
+        "stats": query(queries.dashboard_stats),
+        "total_views": query(queries.total_views),
+        "recent": query(queries.recent_articles, 4),
+        "top": query(queries.top_performing, 4),
+    })
+    stale_notice(data)
+    stats = data["stats"]
+    total = stats["total"]
+    published = stats["published"]
+    pending = stats["pending"]
+    authors = stats["authors"]
+    total_views = data["total_views"]
+
+    recent_html = render.recent_items(data["recent"])
+    top_html = render.top_items(data["top"])
+
     # Render everything
     st.markdown(f"""
     <div class='dashboard-container'>
         <div class='stats-grid'>
             <div class='stat-card'>
-                <span class='stat-label'>Total Articles</span>
+                <span class='stat-label'>Articles & Stories</span>
                 <div class='stat-value'>{total}</div>
             </div>
             <div class='stat-card'>
@@ -440,12 +244,12 @@ if page == "Dashboard":
             </div>
             <div class='stat-card'>
                 <span class='stat-label'>Total Views</span>
-                <div class='stat-value blue'>16,605</div>
+                <div class='stat-value blue'>{total_views:,}</div>
             </div>
         </div>
         <div class='content-grid'>
             <div class='card'>
-                <h3>Recent Articles</h3>
+                <h3>Recent Articles &amp; Stories</h3>
                 {recent_html}
             </div>
             <div class='card'>
@@ -456,227 +260,295 @@ if page == "Dashboard":
     </div>
     """, unsafe_allow_html=True)
 
+
 # ALL ARTICLES (FROM FILE 1 - FIXED QUERIES)
-elif page == "All Articles":
-    st.markdown("<div class='dashboard-container'>", unsafe_allow_html=True)
-    
-    cur.execute("""
-        SELECT c.id, c.title, c.status, c.created_at, u.name, u.email
-        FROM content c
-        JOIN users u ON c.author_id = u.id
-        ORDER BY c.created_at DESC
-    """)
-    articles = cur.fetchall()
-    
-    for article in articles:
-        author = article[4] if article[4] else article[5].split('@')[0]
-        date = article[3].strftime('%b %d, %Y') if article[3] else 'N/A'
-        
-        st.markdown(f"""
-        <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 24px; margin-bottom: 16px;'>
-            <div style='display: flex; justify-content: space-between; align-items: start;'>
-                <div style='flex: 1;'>
-                    <div style='font-size: 16px; font-weight: 600; color: #111827; margin-bottom: 8px;'>{article[1]}</div>
-                    <div style='font-size: 13px; color: #6b7280;'>{author} • যাত্রা-আড্ডা • {date}</div>
-                </div>
-                <span class='badge badge-published'>{article[2]}</span>
-            </div>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("</div>", unsafe_allow_html=True)
+@page_fragment("All Articles")
+def articles_page():
+    with get_cursor(readonly=True) as cur:
+        set_budget(cur, "articles")
+        authors = queries.author_options(cur)
+        author_names = dict(authors)
+        search_text = st.text_input("Search", placeholder="Title, summary, author name or email",
+                                    key="articles_search")
+        col1, col2, col3 = st.columns([2, 2, 1])
+        with col1:
+            status_filter = st.selectbox("Status", ("All",) + queries.CONTENT_STATUSES, key="articles_status")
+        with col2:
+            author_filter = st.selectbox(
+                "Author", [None] + [a[0] for a in authors],
+                format_func=lambda a: "All" if a is None else author_names[a],
+                key="articles_author",
+            )
+        with col3:
+            page_size = st.selectbox("Per page", (25, 50, 100, 200), key="articles_page_size")
+
+        if queries.normalize_query(search_text):
+            search_results(cur, search_text, status_filter, author_filter, page_size)
+            return
+
+        # Keyset pagination on (created_at, id).
+        page_keys = keyset_pages("articles", (status_filter, author_filter, page_size))
+
+        rows = queries.iter_articles(
+            cur,
+            page_size + 1,
+            status=None if status_filter == "All" else status_filter,
+            author_id=author_filter,
+            after=page_keys[-1],
+        )
+        try:
+            page_rows = list(itertools.islice(rows, page_size + 1))
+        finally:
+            rows.close()
+        has_next = len(page_rows) > page_size
+        page_rows = page_rows[:page_size]
+        last_key = (page_rows[-1][3], page_rows[-1][0]) if page_rows else None
+
+        with tracing.span("html", "article_cards"):
+            html = render.article_cards(page_rows)
+        with tracing.span("emit", "article_cards"):
+            st.markdown(html, unsafe_allow_html=True)
+
+        keyset_controls("articles", page_keys, has_next, last_key)
+
+
+def search_results(cur, text, status_filter, author_filter, page_size):
+    """Ranked matches for ``text`` under the filters; pages apply to the cached results."""
+    query = queries.normalize_query(text)
+    if len(query) < queries.SEARCH_MIN_LENGTH:
+        st.info(f"Type at least {queries.SEARCH_MIN_LENGTH} characters to search.")
+        return
+    set_budget(cur, "search")
+    rows = queries.search(cur, query, status=None if status_filter == "All" else status_filter,
+                          author_id=author_filter)
+    if not rows:
+        st.info("No matches.")
+        return
+
+    # Pages are offsets into the results.
+    page_keys = keyset_pages("search", (query, status_filter, author_filter, page_size))
+    offset = page_keys[-1] or 0
+    if len(rows) < queries.SEARCH_LIMIT:
+        st.caption(f"{len(rows):,} matches")
+    else:
+        st.caption(f"Best {len(rows):,} matches")
+    with tracing.span("html", "search_cards"):
+        html = render.article_cards(rows[offset:offset + page_size])
+    with tracing.span("emit", "search_cards"):
+        st.markdown(html, unsafe_allow_html=True)
+    keyset_controls("search", page_keys, offset + page_size < len(rows), offset + page_size)
+
 
 # PENDING REVIEW (FROM FILE 1 - FIXED QUERIES)
-elif page == "Pending Review":
-    st.markdown("<div class='dashboard-container'>", unsafe_allow_html=True)
-    
-    cur.execute("""
-        SELECT c.id, c.title, c.summary, u.name, u.email, c.created_at
-        FROM content c
-        JOIN users u ON c.author_id = u.id
-        WHERE c.status IN ('REVIEW', 'IN_REVIEW', 'SUBMITTED')
-        ORDER BY c.created_at DESC
-    """)
-    pending = cur.fetchall()
-    
+@page_fragment("Pending Review")
+def pending_page():
+    col1, col2 = st.columns([4, 1])
+    with col2:
+        limit = st.selectbox("Show", (50, 100, 200, 500), index=2, key="pending_limit")
+    queue = st.session_state.get("review_queue")
+    if queue is None or queue.limit != limit:
+        queue = st.session_state.review_queue = live.ReviewQueue(limit)
+    review_queue(queue)
+
+
+def pending_table_key(queue):
+    """The queue table's widget key. The selection is row indices, so the key
+    changes, clearing it, after a bulk action and whenever the rows are
+    replaced or reordered: a reload after the feed reconnects, a new limit."""
+    return (f"pending_queue_{st.session_state.get('pending_queue_version', 0)}"
+            f"_{queue.limit}_{queue.layout}")
+
+
+@st.fragment(run_every=live.POLL_INTERVAL)
+def review_queue(queue):
+    """The queue itself, rerun every few seconds to pick up feed changes.
+
+    An idle check touches no database; unchanged elements are re-sent as
+    cache references, so it costs little more than the comparison.
+    """
+    feed = live.get_feed()
+    queue.sync(feed)
+    table = st.session_state.get(pending_table_key(queue))
+    if not (table and table.selection.rows):
+        queue.compact(feed)
+
+    result = st.session_state.pop("moderation_result", None)
+    if result is not None:
+        st.success(f"{len(result.changed):,} articles moved to {result.status}.")
+        if result.skipped:
+            st.warning(f"{len(result.skipped):,} skipped: someone else moderated them first.")
+
+    pending = queue.rows
     if not pending:
         st.markdown("""
-        <div style='background: #d1fae5; border: 1px solid #10b981; border-radius: 10px; padding: 32px; text-align: center;'>
-            <div style='font-size: 48px; margin-bottom: 16px;'>🎉</div>
-            <div style='font-size: 18px; font-weight: 600; color: #065f46;'>All caught up!</div>
-            <div style='font-size: 14px; color: #047857; margin-top: 8px;'>No articles pending review</div>
+        <div class='dashboard-container'>
+            <div style='background: #d1fae5; border: 1px solid #10b981; border-radius: 10px; padding: 32px; text-align: center;'>
+                <div style='font-size: 48px; margin-bottom: 16px;'>🎉</div>
+                <div style='font-size: 18px; font-weight: 600; color: #065f46;'>All caught up!</div>
+                <div style='font-size: 14px; color: #047857; margin-top: 8px;'>No articles pending review</div>
+            </div>
         </div>
         """, unsafe_allow_html=True)
-    else:
-        for article in pending:
-            author = article[3] if article[3] else article[4].split('@')[0]
-            date = article[5].strftime('%b %d, %Y') if article[5] else 'N/A'
-            excerpt = article[2][:150] + "..." if article[2] and len(article[2]) > 150 else article[2] or "No summary available"
-            
-            st.markdown(f"""
-            <div style='background: #fffbeb; border: 2px solid #fbbf24; border-radius: 10px; padding: 24px; margin-bottom: 20px;'>
-                <div style='display: flex; gap: 20px;'>
-                    <div style='width: 120px; height: 120px; background: #e5e7eb; border-radius: 8px; flex-shrink: 0;'></div>
-                    <div style='flex: 1;'>
-                        <div style='display: flex; justify-content: space-between; margin-bottom: 8px;'>
-                            <span style='background: #fef3c7; color: #92400e; padding: 4px 10px; border-radius: 12px; font-size: 10px; font-weight: 600; text-transform: uppercase;'>PENDING REVIEW</span>
-                            <span style='color: #6b7280; font-size: 12px;'>{date}</span>
-                        </div>
-                        <h3 style='font-size: 18px; font-weight: 600; margin-bottom: 8px; color: #111827;'>{article[1]}</h3>
-                        <p style='color: #6b7280; font-size: 13px; margin-bottom: 12px;'>{excerpt}</p>
-                        <div style='color: #6b7280; font-size: 12px; margin-bottom: 16px;'>Author: {author}</div>
-                        <div style='display: flex; gap: 10px;'>
-                            <button style='background: #10b981; color: white; border: none; padding: 8px 16px; border-radius: 6px; font-size: 13px; font-weight: 500; cursor: pointer;'>✓ Approve & Publish</button>
-                            <button style='background: #f59e0b; color: white; border: none; padding: 8px 16px; border-radius: 6px; font-size: 13px; font-weight: 500; cursor: pointer;'>Request Changes</button>
-                            <button style='background: #ef4444; color: white; border: none; padding: 8px 16px; border-radius: 6px; font-size: 13px; font-weight: 500; cursor: pointer;'>✗ Reject</button>
-                            <button style='background: white; color: #374151; border: 1px solid #e5e7eb; padding: 8px 16px; border-radius: 6px; font-size: 13px; font-weight: 500; cursor: pointer;'>👁 Preview</button>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
-    
-    st.markdown("</div>", unsafe_allow_html=True)
+        return
+
+    # Cards re-render when the queue changes, or on the fragment's next poll
+    # after one of their own missing thumbnails is made.
+    thumbnailer = thumbnails.get_thumbnailer()
+    version = (id(queue), queue.version)
+    rendered = st.session_state.get("review_queue_rendered")
+    if rendered is None or rendered[0] != version or thumbnailer.ready(rendered[1]):
+        missing = []
+
+        def thumbnail_url(filename):
+            url = thumbnailer.url(filename)
+            if url is None:
+                missing.append(filename)
+            return url
+
+        with tracing.span("html", "pending_cards"):
+            records = [
+                {"Title": row[1], "Type": render.KINDS[row[7]],
+                 "Author": render.display_name(row[3], row[4]),
+                 "Status": row[6], "Submitted": row[5]}
+                for row in pending
+            ]
+            rendered = (version, missing, records, render.pending_cards(pending, thumbnail_url))
+        st.session_state.review_queue_rendered = rendered
+    _, _, records, html = rendered
+
+    total = queue.pending_total()
+    st.caption(f"Showing {sum(row[6] in queries.PENDING_STATUSES for row in pending):,} "
+               f"of {total:,} pending")
+    selection = st.dataframe(records, hide_index=True, on_select="rerun",
+                             selection_mode="multi-row", key=pending_table_key(queue))
+    selected = [pending[i][0] for i in selection.selection.rows
+                if i < len(pending) and pending[i][6] in queries.PENDING_STATUSES]
+
+    for col, action in zip(st.columns(len(moderation.ACTIONS) + 1), moderation.ACTIONS):
+        with col:
+            st.button(
+                f"{action.label} ({len(selected)})" if selected else action.label,
+                key=f"moderate_{action.status}",
+                disabled=not selected,
+                on_click=moderate,
+                args=(selected, action.status),
+            )
+
+    with tracing.span("emit", "pending_cards"):
+        st.markdown(html, unsafe_allow_html=True)
+
 
 # USERS (FROM FILE 1 - FIXED QUERIES)
-elif page == "Users":
-    st.markdown("""
-    <div class='dashboard-container'>
-        <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 24px;'>
-            <h2 style='font-size: 24px; font-weight: 600; margin: 0;'>Users & Authors</h2>
-            <button style='background: #dc2626; color: white; border: none; padding: 10px 20px; border-radius: 6px; font-size: 14px; font-weight: 500; cursor: pointer;'>Add User</button>
-        </div>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    cur.execute("""
-        SELECT u.id, u.email, u.name, u.role,
-               COUNT(DISTINCT c.id) as article_count
-        FROM users u
-        LEFT JOIN content c ON u.id = c.author_id
-        GROUP BY u.id, u.email, u.name, u.role
-        ORDER BY article_count DESC
-    """)
-    users = cur.fetchall()
-    
-    for user in users:
-        initials = user[2][:2].upper() if user[2] else user[1][:2].upper()
-        name = user[2] if user[2] else user[1].split('@')[0]
-        role_colors = {
-            'ADMIN': '#dc2626',
-            'AUTHOR': '#8b5cf6',
-            'EDITOR': '#3b82f6'
-        }
-        color = role_colors.get(user[3], '#6b7280')
-        
-        st.markdown(f"""
-        <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 20px; margin: 0 40px 12px 40px;'>
-            <div style='display: flex; align-items: center; justify-content: space-between;'>
-                <div style='display: flex; align-items: center; gap: 16px;'>
-                    <div style='width: 48px; height: 48px; background: {color}; color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: 600; font-size: 16px;'>{initials}</div>
-                    <div>
-                        <div style='font-size: 15px; font-weight: 600; color: #111827;'>{name}</div>
-                        <div style='font-size: 12px; color: #6b7280;'>{user[1]}</div>
-                    </div>
-                </div>
-                <div style='display: flex; align-items: center; gap: 32px;'>
-                    <div style='text-align: right;'>
-                        <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Role</div>
-                        <div style='font-size: 14px; font-weight: 600; color: #111827;'>{user[3]}</div>
-                    </div>
-                    <div style='text-align: right;'>
-                        <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Articles</div>
-                        <div style='font-size: 14px; font-weight: 600; color: #111827;'>{user[4]}</div>
-                    </div>
-                    <div style='text-align: right;'>
-                        <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Followers</div>
-                        <div style='font-size: 14px; font-weight: 600; color: #111827;'>342</div>
-                    </div>
-                    <button style='background: white; color: #6b7280; border: 1px solid #e5e7eb; padding: 6px 12px; border-radius: 6px; font-size: 13px; cursor: pointer;'>✏️</button>
-                </div>
+@page_fragment("Users")
+def user_list_page():
+    with get_cursor(readonly=True) as cur:
+        set_budget(cur, "users")
+        st.markdown("""
+        <div class='dashboard-container'>
+            <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 24px;'>
+                <h2 style='font-size: 24px; font-weight: 600; margin: 0;'>Users & Authors</h2>
+                <button style='background: #dc2626; color: white; border: none; padding: 10px 20px; border-radius: 6px; font-size: 14px; font-weight: 500; cursor: pointer;'>Add User</button>
             </div>
         </div>
         """, unsafe_allow_html=True)
+    
+        col1, col2 = st.columns([4, 1])
+        with col1:
+            role_filter = st.selectbox("Role", ("All",) + queries.USER_ROLES, key="users_role")
+        with col2:
+            page_size = st.selectbox("Per page", (25, 50, 100, 200), key="users_page_size")
+
+        # Keyset pagination on (article_count, id).
+        page_keys = keyset_pages("users", (role_filter, page_size))
+        users = queries.users_page(
+            cur,
+            page_size + 1,
+            role=None if role_filter == "All" else role_filter,
+            after=page_keys[-1],
+        )
+        has_next = len(users) > page_size
+        users = users[:page_size]
+        last_key = (users[-1][4], users[-1][0]) if users else None
+
+        with tracing.span("html", "user_cards"):
+            html = render.user_cards(users)
+        with tracing.span("emit", "user_cards"):
+            st.markdown(html, unsafe_allow_html=True)
+        keyset_controls("users", page_keys, has_next, last_key)
+
 
 # ANALYTICS - COMPLETE WITH REAL DATA
-elif page == "Analytics":
-    # Get real category data
-    cur.execute("""
-        SELECT 
-            COALESCE(c.name, 'Uncategorized') as category,
-            COUNT(co.id) as article_count
-        FROM categories c
-        LEFT JOIN content co ON co.category_id = c.id
-        WHERE co.status = 'PUBLISHED'
-        GROUP BY c.id, c.name
-        ORDER BY article_count DESC
-        LIMIT 4
-    """)
-    category_data = cur.fetchall()
-    
-    # Calculate percentages for categories
-    if category_data:
-        max_count = category_data[0][1] if category_data[0][1] > 0 else 1
-        categories = [(cat, count, int((count / max_count) * 100)) for cat, count in category_data]
-    else:
-        categories = []
-    
-    # Get real author data
-    cur.execute("""
-        SELECT 
-            COALESCE(u.name, u.email) as author_name,
-            SUBSTRING(COALESCE(u.name, u.email), 1, 2) as initials,
-            COUNT(c.id) as article_count
-        FROM users u
-        LEFT JOIN content c ON u.id = c.author_id
-        WHERE u.role IN ('AUTHOR', 'EDITOR')
-        GROUP BY u.id, u.name, u.email
-        HAVING COUNT(c.id) > 0
-        ORDER BY article_count DESC
-        LIMIT 5
-    """)
-    author_data = cur.fetchall()
-    
-    # Assign colors to authors
-    colors = ['#dc2626', '#8b5cf6', '#3b82f6', '#10b981', '#f59e0b']
-    authors = [
-        (row[0], row[1].upper(), colors[idx % len(colors)], row[2], 0, 0)
-        for idx, row in enumerate(author_data)
-    ]
-    
-    # Build category bars HTML
-    category_html = ""
-    for cat, count, pct in categories:
-        category_html += f"<div style='margin-bottom: 18px;'><div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;'><span style='font-size: 14px; font-weight: 600; color: #111827;'>{cat}</span><span style='font-size: 13px; color: #6b7280;'>{count} articles</span></div><div style='position: relative; width: 100%; height: 28px; background: #f3f4f6; border-radius: 14px; overflow: hidden;'><div style='position: absolute; width: {pct}%; height: 100%; background: linear-gradient(90deg, #dc2626, #8b5cf6);'></div><div style='position: absolute; right: 14px; top: 50%; transform: translateY(-50%); font-size: 11px; font-weight: 700; color: white;'>{pct}%</div></div></div>"
-    
-    # Build author rows HTML
-    author_html = ""
-    for idx, (name, initials, color, articles, views, engagement) in enumerate(authors, 1):
-        border = "border-bottom: 1px solid #f3f4f6;" if idx < len(authors) else ""
-        author_html += f"<div style='display: flex; align-items: center; gap: 16px; padding: 18px 0; {border}'><div style='font-size: 16px; font-weight: 600; color: #9ca3af; width: 32px;'>#{idx}</div><div style='width: 44px; height: 44px; background: {color}; color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: 600; font-size: 15px;'>{initials}</div><div style='flex: 1;'><div style='font-size: 14px; font-weight: 600; color: #111827;'>{name}</div><div style='font-size: 12px; color: #6b7280;'>{articles} articles</div></div><div style='text-align: right; min-width: 100px;'><div style='font-size: 16px; font-weight: 700; color: #111827;'>{views}</div><div style='font-size: 10px; color: #9ca3af;'>TOTAL VIEWS</div></div><div style='text-align: right; min-width: 100px;'><div style='font-size: 16px; font-weight: 700; color: #111827;'>{engagement}</div><div style='font-size: 10px; color: #9ca3af;'>AVG ENGAGEMENT</div></div></div>"
-    
-    # Output everything in ONE call
+@page_fragment("Analytics")
+def analytics_page():
+    rollups.refresh_if_stale()
+    # (id, name) of each category drilled into, outermost first.
+    trail = st.session_state.setdefault("analytics_categories", [])
+    parent_id, parent_name = trail[-1] if trail else (None, None)
+    jobs = {
+        "overview": query(queries.analytics_overview, 30),
+        "categories": query(queries.top_categories, 30, 8, parent_id),
+        "authors": query(queries.top_authors, 30, 5),
+    }
+    if parent_id:
+        jobs["direct"] = query(queries.category_direct_views, parent_id, 30)
+    data = run_queries(jobs)
+    stale_notice(data)
+    overview = data["overview"]
+    categories = data["categories"]
+    category_html = render.category_bars(categories)
+    author_html = render.author_rows(data["authors"])
+
     st.markdown(f"""
-    <div style='padding: 32px 40px; max-width: 1600px; margin: 0 auto;'>
+    <div style='padding: 32px 40px 0; max-width: 1600px; margin: 0 auto;'>
         <h2 style='margin-bottom: 32px; font-size: 28px; font-weight: 600;'>Analytics Overview</h2>
-        <div style='display: grid; grid-template-columns: repeat(3, 1fr); gap: 20px; margin-bottom: 32px;'>
+        <div style='display: grid; grid-template-columns: repeat(3, 1fr); gap: 20px;'>
             <div style='background: #eff6ff; border: 1px solid #bfdbfe; border-radius: 10px; padding: 28px; text-align: center;'>
-                <div style='font-size: 42px; font-weight: 700; color: #3b82f6;'>0</div>
+                <div style='font-size: 42px; font-weight: 700; color: #3b82f6;'>{overview["views"]:,}</div>
                 <div style='font-size: 13px; color: #6b7280; margin-top: 8px;'>Total Views (30 days)</div>
             </div>
             <div style='background: #f0fdf4; border: 1px solid #bbf7d0; border-radius: 10px; padding: 28px; text-align: center;'>
-                <div style='font-size: 42px; font-weight: 700; color: #10b981;'>0</div>
+                <div style='font-size: 42px; font-weight: 700; color: #10b981;'>{overview["engagement_rate"]:.1%}</div>
                 <div style='font-size: 13px; color: #6b7280; margin-top: 8px;'>Avg Engagement</div>
             </div>
             <div style='background: #faf5ff; border: 1px solid #e9d5ff; border-radius: 10px; padding: 28px; text-align: center;'>
-                <div style='font-size: 42px; font-weight: 700; color: #8b5cf6;'>0</div>
+                <div style='font-size: 42px; font-weight: 700; color: #8b5cf6;'>{overview["views_per_article"]:,.1f}</div>
                 <div style='font-size: 13px; color: #6b7280; margin-top: 8px;'>Avg Views per Article</div>
             </div>
         </div>
-        <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 28px; margin-bottom: 24px;'>
-            <div style='font-size: 24px; font-weight: 600; margin-bottom: 24px; color: #111827;'>Top Categories by Views</div>
+    </div>
+    """, unsafe_allow_html=True)
+
+    # Each category's views include its subcategories'; › marks the ones
+    # that can be opened.
+    st.markdown("""
+    <div class='dashboard-container'>
+        <div style='font-size: 24px; font-weight: 600; color: #111827;'>Top Categories by Views</div>
+    </div>
+    """, unsafe_allow_html=True)
+    up_col, trail_col = st.columns([1, 5])
+    with up_col:
+        st.button("← Up", key="analytics_category_up", disabled=not trail, on_click=trail.pop)
+    with trail_col:
+        st.caption(" › ".join(["All categories", *(name for _, name in trail)]))
+    if parent_id:
+        st.caption(f"{data['direct']:,} views filed directly under {parent_name}")
+    if categories:
+        st.markdown(f"""
+        <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 28px; margin-bottom: 12px;'>
             {category_html}
         </div>
+        """, unsafe_allow_html=True)
+    else:
+        st.info("No subcategories.")
+    openable = [(id, name) for id, name, _, has_children in categories if has_children]
+    if openable:
+        for col, (id, name) in zip(st.columns(len(openable)), openable):
+            with col:
+                st.button(f"{name} ›", key=f"analytics_category_{id}",
+                          on_click=trail.append, args=((id, name),))
+
+    st.markdown(f"""
+    <div class='dashboard-container'>
         <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 28px;'>
             <div style='font-size: 24px; font-weight: 600; margin-bottom: 24px; color: #111827;'>Top Authors by Performance</div>
             {author_html}
@@ -684,8 +556,92 @@ elif page == "Analytics":
     </div>
     """, unsafe_allow_html=True)
 
+    st.markdown("""
+    <div class='dashboard-container'>
+        <div style='font-size: 24px; font-weight: 600; color: #111827;'>Story Trends</div>
+    </div>
+    """, unsafe_allow_html=True)
+    today = date.today()
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        period = st.date_input("Date range", value=(today - timedelta(days=29), today),
+                               max_value=today, key="analytics_range")
+    with col2:
+        metric = st.selectbox("Metric", tuple(timeseries.METRICS), key="analytics_metric")
+    with col3:
+        by = st.selectbox("Breakdown", ("total", "category", "author"), format_func=str.title,
+                          key="analytics_by")
+    # While picking a range the widget holds only its first date.
+    start, end = (tuple(period) + (today,))[:2]
+
+    trend = run_queries({"trend": query(queries.story_timeseries, start, end, by)})
+    stale_notice(trend)
+    columns = trend["trend"]
+    with tracing.span("html", "story_trends"):
+        chart = timeseries.series(columns, timeseries.METRICS[metric], start, end)
+    if chart.empty:
+        st.info("No story analytics in this date range.")
+    else:
+        days = timeseries.bucket_days(start, end)
+        st.caption(f"{metric} per {'day' if days == 1 else f'{days} days'}")
+        with tracing.span("emit", "story_trends"):
+            st.line_chart(chart, y_label=metric, height=360)
+
+
+# EXPORT
+@page_fragment("Export")
+def export_page():
+    st.markdown("""
+    <div class='dashboard-container'>
+        <h2 style='font-size: 24px; font-weight: 600; margin: 0;'>Export</h2>
+    </div>
+    """, unsafe_allow_html=True)
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        dataset = st.selectbox("Dataset", tuple(export.DATASETS), format_func=str.title,
+                               key="export_dataset")
+    with col2:
+        format = st.radio("Format", export.FORMATS, format_func=str.upper, horizontal=True,
+                          key="export_format")
+    spec = export.DATASETS[dataset]
+    columns = st.multiselect("Columns", list(spec.columns), default=list(spec.columns),
+                             key=f"export_columns_{dataset}")
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        statuses = st.multiselect("Status" if dataset == "articles" else "Role", spec.statuses,
+                                  placeholder="All", key=f"export_statuses_{dataset}")
+    with col2:
+        created = st.date_input("Created between", value=(), key="export_created")
+    # An unfinished range (one date picked) filters from that date on.
+    since, until = (tuple(created) + (None, None))[:2]
+
+    if st.button("Export", disabled=not columns):
+        path = export.export_path(dataset, format)
+        with st.spinner("Exporting..."), get_cursor(readonly=True) as cur:
+            rows = export.export(cur, path, dataset, format, columns=columns,
+                                 statuses=statuses, since=since, until=until)
+        previous = st.session_state.get("export_file")
+        if previous and os.path.exists(previous[0]):
+            os.remove(previous[0])
+        st.session_state.export_file = (path, format, rows)
+
+    if "export_file" in st.session_state:
+        path, format, rows = st.session_state.export_file
+        if os.path.exists(path):
+            # Read from disk only when clicked, not on every rerun; the file
+            # is deleted once read.
+            st.download_button(
+                f"Download {os.path.basename(path)} ({rows:,} rows)",
+                data=lambda: export.take(path),
+                file_name=os.path.basename(path),
+                mime=export.MIME_TYPES[format],
+            )
+
+
 # SETTINGS
-elif page == "Settings":
+@page_fragment("Settings")
+def settings_page():
     st.markdown("""
     <div class='dashboard-container'>
         <h2 style='margin-bottom: 24px; font-size: 24px; font-weight: 600;'>Settings</h2>
@@ -696,8 +652,9 @@ elif page == "Settings":
     </div>
     """, unsafe_allow_html=True)
 
+page = st.session_state.page
+if page in PAGES:
+    PAGES[page]()
 else:
     st.markdown("<div style='padding: 40px;'><h2>Page not found</h2></div>", unsafe_allow_html=True)
-
-cur.close()
-conn.close()
+    show_trace(tracing.finish())
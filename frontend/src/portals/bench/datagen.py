@@ -0,0 +1,279 @@
+"""Bulk-load synthetic data into a local Postgres for benchmarking the portal.
+
+    python bench/datagen.py --scale 100k --reset
+
+Generates users, categories (two levels), content, stories, user_follows,
+content_engagement and story_analytics sized relative to the number of
+articles, and streams every table in with COPY. Output is deterministic for
+a given ``--seed``. Row-level triggers are disabled during the load and the
+counter caches and rollups they maintain are rebuilt afterwards in one pass.
+
+Only point this at a throwaway database: ``--reset`` truncates every table
+it writes to.
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import psycopg2  # noqa: E402
+
+SCALES = {
+    "1k": 1_000,
+    "100k": 100_000,
+    "1m": 1_000_000,
+}
+
+# Rows buffered per COPY call.
+CHUNK_ROWS = 50_000
+
+TABLES = (
+    "story_analytics", "content_engagement", "user_follows", "stories",
+    "content", "categories", "users",
+)
+
+STATUS_WEIGHTS = (
+    ("PUBLISHED", 70), ("DRAFT", 12), ("SUBMITTED", 5), ("IN_REVIEW", 3),
+    ("REVIEW", 2), ("CHANGES_REQUESTED", 2), ("APPROVED", 2), ("REJECTED", 2),
+    ("ARCHIVED", 2),
+)
+ROLE_WEIGHTS = (("READER", 75), ("AUTHOR", 18), ("EDITOR", 4), ("CREATOR", 2), ("ADMIN", 1))
+ENGAGEMENT_WEIGHTS = (("VIEW", 80), ("LIKE", 10), ("SHARE", 4), ("COMMENT", 4), ("SAVE", 2))
+
+WORDS = (
+    "kolkata metro durga puja pandal coaching sweet shop tram river ghat "
+    "monsoon election market festival heritage street food football college "
+    "theatre library bridge ferry rickshaw bazaar adda fish cricket music"
+).split()
+
+
+class Plan:
+    """Row counts for one scale, all derived from the article count."""
+
+    def __init__(self, articles):
+        self.articles = articles
+        self.users = max(50, articles // 10)
+        self.categories = 48
+        self.stories = max(20, articles // 10)
+        self.follows = self.users * 5
+        self.engagements = articles * 3
+        self.analytics_days = 60
+
+
+def weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def make_id(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def words(rng, n):
+    return " ".join(rng.choice(WORDS) for _ in range(n))
+
+
+def ts(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY ``rows`` (tuples of already-formatted text values) into ``table``."""
+    total = 0
+    buf = io.StringIO()
+    pending = 0
+    column_list = ", ".join(f'"{c}"' for c in columns)
+    sql = f'COPY "{table}" ({column_list}) FROM STDIN'
+    for row in rows:
+        buf.write("\t".join("\\N" if v is None else str(v) for v in row))
+        buf.write("\n")
+        pending += 1
+        if pending == CHUNK_ROWS:
+            buf.seek(0)
+            cur.copy_expert(sql, buf)
+            total += pending
+            buf = io.StringIO()
+            pending = 0
+    if pending:
+        buf.seek(0)
+        cur.copy_expert(sql, buf)
+        total += pending
+    return total
+
+
+def generate(cur, plan, rng, now):
+    user_ids = [make_id(rng) for _ in range(plan.users)]
+    roles = [weighted(rng, ROLE_WEIGHTS) for _ in user_ids]
+    author_ids = [u for u, r in zip(user_ids, roles) if r != "READER"] or user_ids[:1]
+
+    counts = {}
+    counts["users"] = copy_rows(cur, "users", ("id", "email", "name", "role", "created_at", "updated_at"), (
+        (uid, f"user{i}@example.com", f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}",
+         role, ts(now - timedelta(days=rng.randint(0, 1500))), ts(now))
+        for i, (uid, role) in enumerate(zip(user_ids, roles))
+    ))
+
+    roots = [make_id(rng) for _ in range(plan.categories // 6)]
+    category_rows = [(cid, f"Category {i}", f"category-{i}", None) for i, cid in enumerate(roots)]
+    for i in range(len(roots), plan.categories):
+        category_rows.append((make_id(rng), f"Category {i}", f"category-{i}", rng.choice(roots)))
+    category_ids = [row[0] for row in category_rows]
+    counts["categories"] = copy_rows(cur, "categories", ("id", "name", "slug", "parent_id"), category_rows)
+
+    content_ids = []
+
+    def content_rows():
+        for i in range(plan.articles):
+            cid = make_id(rng)
+            content_ids.append(cid)
+            status = weighted(rng, STATUS_WEIGHTS)
+            created = now - timedelta(seconds=rng.randint(0, 3 * 365 * 86400))
+            yield (
+                cid, f"{words(rng, 6).capitalize()} {i}", f"article-{i}", words(rng, 40),
+                rng.choice(category_ids), rng.choice(author_ids), status,
+                ts(created) if status == "PUBLISHED" else None,
+                int(rng.paretovariate(1.2) * 10) if status == "PUBLISHED" else 0,
+                "{}", ts(created), ts(created),
+            )
+
+    counts["content"] = copy_rows(cur, "content", (
+        "id", "title", "slug", "summary", "category_id", "author_id", "status",
+        "publish_date", "views", "type_data", "created_at", "updated_at",
+    ), content_rows())
+
+    story_ids = []
+
+    def story_rows():
+        for i in range(plan.stories):
+            sid = make_id(rng)
+            story_ids.append(sid)
+            status = weighted(rng, STATUS_WEIGHTS)
+            created = now - timedelta(seconds=rng.randint(0, 365 * 86400))
+            yield (
+                sid, f"{words(rng, 5).capitalize()} story {i}", words(rng, 30), "{}",
+                rng.choice(category_ids), status, ts(created) if status == "PUBLISHED" else None,
+                rng.choice(author_ids), f"story-{i}",
+                int(rng.paretovariate(1.2) * 20) if status == "PUBLISHED" else 0,
+                rng.randint(0, 40), ts(created), ts(created),
+            )
+
+    counts["stories"] = copy_rows(cur, "stories", (
+        "id", "title", "abstract", "body", "category_id", "status", "published_at",
+        "author_id", "slug", "view_count", "comment_count", "created_at", "updated_at",
+    ), story_rows())
+
+    def follow_rows():
+        seen = set()
+        for _ in range(plan.follows):
+            pair = (rng.choice(user_ids), rng.choice(author_ids))
+            if pair[0] != pair[1] and pair not in seen:
+                seen.add(pair)
+                yield pair
+
+    counts["user_follows"] = copy_rows(cur, "user_follows", ("follower_id", "following_id"), follow_rows())
+
+    counts["content_engagement"] = copy_rows(cur, "content_engagement", (
+        "id", "content_id", "user_id", "engagement_type", "created_at",
+    ), (
+        (make_id(rng), rng.choice(content_ids), rng.choice(user_ids) if rng.random() < 0.6 else None,
+         weighted(rng, ENGAGEMENT_WEIGHTS), ts(now - timedelta(seconds=rng.randint(0, 90 * 86400))))
+        for _ in range(plan.engagements)
+    ))
+
+    today = now.date()
+
+    def analytics_rows():
+        for sid in story_ids:
+            # Roughly every third day has a snapshot.
+            for day in range(plan.analytics_days):
+                if rng.random() < 1 / 3:
+                    views = rng.randint(0, 500)
+                    yield (
+                        make_id(rng), sid, (today - timedelta(days=day)).isoformat(), views,
+                        int(views * rng.uniform(0.5, 0.9)), round(rng.random(), 3),
+                        rng.randint(0, 10), rng.randint(0, 10),
+                    )
+
+    counts["story_analytics"] = copy_rows(cur, "story_analytics", (
+        "id", "story_id", "date", "views", "unique_visitors", "completion_rate",
+        "comments", "bookmarks",
+    ), analytics_rows())
+    return counts
+
+
+def rebuild_derived(cur):
+    """Recompute what the disabled triggers would have maintained."""
+    cur.execute("SELECT reconcile_user_counters()")
+    cur.execute("DELETE FROM view_counters")
+    cur.execute("""
+        INSERT INTO view_counters (name, shard, value)
+        SELECT 'content_views', 0, COALESCE(SUM(views), 0) FROM content
+        UNION ALL
+        SELECT 'story_views', 0, COALESCE(SUM(view_count), 0) FROM stories
+    """)
+    cur.execute("SELECT rebuild_category_closure()")
+    cur.execute("TRUNCATE analytics_daily_rollups, analytics_category_rollups, rollup_watermarks")
+    cur.execute("SELECT refresh_analytics_rollups(%s)", (60,))
+
+
+def load(dsn, articles, seed=42, reset=False, log=print):
+    plan = Plan(articles)
+    rng = random.Random(seed)
+    # Anchored to midnight so reruns on the same day produce identical data,
+    # while "last 30 days" analytics still land on recent dates.
+    now = datetime.combine(date.today(), datetime.min.time())
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            if reset:
+                cur.execute(f"TRUNCATE {', '.join(TABLES)} CASCADE")
+            for table in TABLES:
+                cur.execute(f'ALTER TABLE "{table}" DISABLE TRIGGER USER')
+            started = time.perf_counter()
+            counts = generate(cur, plan, rng, now)
+            loaded = time.perf_counter() - started
+            for table in TABLES:
+                cur.execute(f'ALTER TABLE "{table}" ENABLE TRIGGER USER')
+        conn.commit()
+        # Separate transaction: the rollup refresh sets its watermark from the
+        # transaction start time, which must come after the loaded rows'.
+        with conn.cursor() as cur:
+            rebuild_derived(cur)
+        conn.commit()
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"VACUUM ANALYZE {', '.join(TABLES)}")
+    finally:
+        conn.close()
+    log(f"loaded {sum(counts.values()):,} rows in {loaded:.1f}s: "
+        + ", ".join(f"{t}={n:,}" for t, n in counts.items()))
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scale", default="1k",
+                        help=f"one of {', '.join(SCALES)} or an article count")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--reset", action="store_true",
+                        help="truncate the generated tables first")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="defaults to DATABASE_URL")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("no --dsn given and DATABASE_URL is not set")
+
+    articles = SCALES.get(args.scale.lower()) or int(args.scale)
+    load(args.dsn, articles, seed=args.seed, reset=args.reset)
+
+
+if __name__ == "__main__":
+    main()
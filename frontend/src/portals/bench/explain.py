@@ -0,0 +1,157 @@
+"""Check the plan of every registered statement for sequential scans.
+
+    python bench/explain.py                       # against DATABASE_URL
+    python bench/explain.py --dsn postgresql://localhost/sekor_bench
+
+Run it against a database loaded with ``datagen.py`` (100k or more), since
+on a near-empty one every scan is sequential. Each statement in
+``statements.REGISTRY`` is prepared and executed a few times with the sample
+parameters below, so the plan cache has settled on a custom or generic plan
+as it would on a pooled connection, then ``EXPLAIN EXECUTE`` is checked.
+Everything runs in one transaction that is rolled back.
+
+Exits non-zero if any plan sequentially scans a table that isn't listed in
+``SEQ_SCAN_OK`` for that statement and has at least ``--min-rows`` rows.
+``tests/test_explain.py`` runs the same check under pytest on a small
+generated dataset.
+"""
+import argparse
+import os
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Postgres weighs a generic plan after five custom ones.
+WARMUP_EXECUTIONS = 5
+
+# Sequential scans that are the intended plan, by statement.
+SEQ_SCAN_OK = {
+    # Counts every row of content and of stories in one pass each.
+    "dashboard_stats": {"content", "stories"},
+    # A 30-day window covers most of the rollups.
+    "analytics_overview": {"analytics_category_rollups"},
+    "top_categories": {"analytics_category_rollups"},
+    "top_authors": {"analytics_daily_rollups"},
+    # Hash-joins every story for its category or author.
+    "story_timeseries": {"stories"},
+}
+
+
+def load_fixtures(cur):
+    """Real keys to fill the sample parameters with."""
+    import queries
+
+    cur.execute("""
+        SELECT created_at, id FROM content
+        ORDER BY created_at DESC, id DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM content) LIMIT 1
+    """)
+    article_key = cur.fetchone()
+    cur.execute("""
+        SELECT article_count, id FROM users
+        ORDER BY article_count DESC, id DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM users) LIMIT 1
+    """)
+    user_key = cur.fetchone()
+    cur.execute("SELECT author_id FROM content GROUP BY 1 ORDER BY COUNT(*) DESC LIMIT 1")
+    author_id = cur.fetchone()[0]
+    cur.execute("""
+        SELECT id FROM content WHERE status = ANY(%s::"ContentStatus"[]) LIMIT 50
+    """, (list(queries.PENDING_STATUSES),))
+    pending_ids = [row[0] for row in cur.fetchall()]
+    cur.execute("SELECT parent_id FROM categories WHERE parent_id IS NOT NULL LIMIT 1")
+    parent_id = cur.fetchone()[0]
+    return article_key, user_key, author_id, pending_ids, parent_id
+
+
+def sample_params(cur):
+    """``{statement name: params}``; filtered variants share their base's."""
+    import queries
+
+    article_key, user_key, author_id, pending_ids, parent_id = load_fixtures(cur)
+    pending = list(queries.PENDING_STATUSES)
+    return {
+        "dashboard_stats": (pending,),
+        "recent_articles": (4,),
+        "top_performing": (4,),
+        "total_views": (),
+        "pending_articles": (pending, 200),
+        "pending_by_id": (pending_ids, pending),
+        "set_status": ("PUBLISHED", pending_ids, pending),
+        "articles_page": (26, "PUBLISHED", author_id, *article_key),
+        "author_options": (list(queries.AUTHOR_ROLES),),
+        "users_page": (26, "AUTHOR", *user_key),
+        "search": ("puja", "%puja%", 200, 500, "PUBLISHED", author_id),
+        "analytics_overview": (30,),
+        "top_categories": (30, parent_id, 8),
+        "category_direct_views": (parent_id, 30),
+        "top_authors": (30, 5),
+        "story_timeseries": (date.today() - timedelta(days=29), date.today(), 8),
+    }
+
+
+def walk(node):
+    yield node
+    for child in node.get("Plans", ()):
+        yield from walk(child)
+
+
+def check(cur, min_rows):
+    """``[(name, total cost, [(table, rows, allowed)])]`` for every statement."""
+    import statements
+
+    params = sample_params(cur)
+    cur.execute("SELECT relname, reltuples FROM pg_class WHERE relkind IN ('r', 'p')")
+    table_rows = dict(cur.fetchall())
+
+    results = []
+    for name in statements.REGISTRY:
+        base = name.split("__")[0]
+        args = params[base]
+        for _ in range(WARMUP_EXECUTIONS):
+            statements.execute(cur, name, args)
+        placeholders = f"({', '.join(['%s'] * len(args))})" if args else ""
+        cur.execute(f"EXPLAIN (FORMAT JSON) EXECUTE {name}{placeholders}", args)
+        plan = cur.fetchone()[0][0]["Plan"]
+        scans = []
+        for node in walk(plan):
+            if node["Node Type"] == "Seq Scan":
+                table = node["Relation Name"]
+                rows = int(table_rows.get(table, 0))
+                allowed = table in SEQ_SCAN_OK.get(base, ()) or rows < min_rows
+                scans.append((table, rows, allowed))
+        results.append((name, plan["Total Cost"], scans))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="defaults to DATABASE_URL")
+    parser.add_argument("--min-rows", type=int, default=1000,
+                        help="ignore sequential scans of tables smaller than this")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("no --dsn given and DATABASE_URL is not set")
+    os.environ["DATABASE_URL"] = args.dsn
+
+    from db import get_cursor
+
+    with get_cursor() as cur:
+        results = check(cur, args.min_rows)
+
+    failed = 0
+    print(f"{'statement':<40}{'cost':>12}  sequential scans")
+    for name, cost, scans in results:
+        notes = ", ".join(f"{table} ({rows:,} rows){'' if ok else ' !'}" for table, rows, ok in scans)
+        print(f"{name:<40}{cost:>12.1f}  {notes or '-'}")
+        failed += not all(ok for _, _, ok in scans)
+    if failed:
+        print(f"\n{failed} statement(s) with unexpected sequential scans (marked !)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
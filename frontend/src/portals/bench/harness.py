@@ -0,0 +1,217 @@
+"""Time every portal page's queries and rendering at several data scales.
+
+    python bench/harness.py --scales 1k,100k --dsn postgresql://localhost/sekor_bench
+    python bench/harness.py --no-load            # measure whatever DATABASE_URL holds
+
+For each scale the database is reset and loaded with ``datagen.py``, then
+each step in ``STEPS`` is run ``--repeat`` times with the query cache cleared
+in between. Results are printed and written as JSON (one file per run, named
+after the commit) so runs can be diffed across commits.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+import datagen  # noqa: E402
+
+RESULTS_DIR = BENCH_DIR / "results"
+
+
+def build_steps(fixtures):
+    """``(page, step, query_fn(cur), render_fn(result) or None)`` for every page."""
+    import export
+    import queries
+    import render
+    import timeseries
+
+    def export_csv(cur, dataset):
+        with open(os.devnull, "wb") as out:
+            return export.write_csv(cur, out, dataset)
+
+    def export_parquet(cur, dataset):
+        with tempfile.TemporaryDirectory() as tmp:
+            return export.write_parquet(cur, os.path.join(tmp, "export.parquet"), dataset)
+
+    def trend(days, by):
+        end = date.today()
+        start = end - timedelta(days=days - 1)
+        return (lambda cur: queries.story_timeseries(cur, start, end, by),
+                lambda columns: timeseries.series(columns, "views", start, end))
+
+    deep_article = fixtures["deep_article_key"]
+    deep_user = fixtures["deep_user_key"]
+    return [
+        ("dashboard", "stats", queries.dashboard_stats, None),
+        ("dashboard", "total_views", queries.total_views, None),
+        ("dashboard", "recent", lambda cur: queries.recent_articles(cur, 4), render.recent_items),
+        ("dashboard", "top", lambda cur: queries.top_performing(cur, 4), render.top_items),
+        ("all_articles", "author_options", queries.author_options, None),
+        ("all_articles", "first_page",
+         lambda cur: list(queries.iter_articles(cur, 51)), render.article_cards),
+        ("all_articles", "deep_page",
+         lambda cur: list(queries.iter_articles(cur, 51, after=deep_article)), render.article_cards),
+        ("all_articles", "published_page",
+         lambda cur: list(queries.iter_articles(cur, 51, status="PUBLISHED")), render.article_cards),
+        ("all_articles", "search_word",
+         lambda cur: queries.search(cur, "puja"), render.article_cards),
+        ("all_articles", "search_fuzzy",
+         lambda cur: queries.search(cur, "kolkta bazar"), render.article_cards),
+        ("pending", "queue", lambda cur: queries.pending_articles(cur, 200), render.pending_cards),
+        ("users", "first_page", lambda cur: queries.users_page(cur, 26), render.user_cards),
+        ("users", "deep_page", lambda cur: queries.users_page(cur, 26, after=deep_user), render.user_cards),
+        ("users", "authors_page", lambda cur: queries.users_page(cur, 26, role="AUTHOR"), render.user_cards),
+        ("analytics", "overview", lambda cur: queries.analytics_overview(cur, 30), None),
+        ("analytics", "categories", lambda cur: queries.top_categories(cur, 30, 8), render.category_bars),
+        ("analytics", "authors", lambda cur: queries.top_authors(cur, 30, 5), render.author_rows),
+        ("analytics", "trend_7d", *trend(7, "category")),
+        ("analytics", "trend_2y", *trend(730, "category")),
+        ("export", "articles_csv", lambda cur: export_csv(cur, "articles"), None),
+        ("export", "articles_parquet", lambda cur: export_parquet(cur, "articles"), None),
+        ("export", "users_csv", lambda cur: export_csv(cur, "users"), None),
+    ]
+
+
+def load_fixtures(cur):
+    """Seek keys half-way through the big lists, for the deep-page steps."""
+    cur.execute("""
+        SELECT created_at, id FROM content
+        ORDER BY created_at DESC, id DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM content) LIMIT 1
+    """)
+    deep_article_key = cur.fetchone()
+    cur.execute("""
+        SELECT article_count, id FROM users
+        ORDER BY article_count DESC, id DESC
+        OFFSET (SELECT COUNT(*) / 2 FROM users) LIMIT 1
+    """)
+    deep_user_key = cur.fetchone()
+    return {"deep_article_key": deep_article_key, "deep_user_key": deep_user_key}
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "runs": len(samples),
+        "min_ms": round(ordered[0] * 1e3, 3),
+        "median_ms": round(statistics.median(ordered) * 1e3, 3),
+        "p95_ms": round(p95 * 1e3, 3),
+        "max_ms": round(ordered[-1] * 1e3, 3),
+    }
+
+
+def measure(repeat):
+    from cache import query_cache
+    from db import get_cursor
+
+    with get_cursor() as cur:
+        fixtures = load_fixtures(cur)
+
+    timings = []
+    for page, step, query_fn, render_fn in build_steps(fixtures):
+        query_samples, render_samples = [], []
+        result = None
+        for _ in range(repeat):
+            query_cache.invalidate()
+            with get_cursor() as cur:
+                t0 = time.perf_counter()
+                result = query_fn(cur)
+                query_samples.append(time.perf_counter() - t0)
+            if render_fn is not None:
+                t0 = time.perf_counter()
+                render_fn(result)
+                render_samples.append(time.perf_counter() - t0)
+        rows = len(result) if isinstance(result, list) else 1
+        timings.append({"page": page, "step": step, "kind": "query", "rows": rows,
+                        **summarize(query_samples)})
+        if render_samples:
+            timings.append({"page": page, "step": step, "kind": "render", "rows": rows,
+                            **summarize(render_samples)})
+    return timings
+
+
+def git_info():
+    def git(*args):
+        try:
+            return subprocess.run(("git", *args), cwd=BENCH_DIR, capture_output=True,
+                                  text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--", "."))}
+
+
+def server_version():
+    from db import get_cursor
+    with get_cursor() as cur:
+        cur.execute("SHOW server_version")
+        return cur.fetchone()[0]
+
+
+def print_timings(label, timings):
+    print(f"\n== {label}")
+    print(f"{'page':<14}{'step':<18}{'kind':<8}{'rows':>6}{'median ms':>12}{'p95 ms':>10}")
+    for t in timings:
+        print(f"{t['page']:<14}{t['step']:<18}{t['kind']:<8}{t['rows']:>6}"
+              f"{t['median_ms']:>12.2f}{t['p95_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", default="1k,100k",
+                        help=f"comma-separated, each one of {', '.join(datagen.SCALES)} or an article count")
+    parser.add_argument("--no-load", action="store_true",
+                        help="benchmark the database as it is instead of loading each scale")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="defaults to DATABASE_URL; the database is truncated unless --no-load")
+    parser.add_argument("--output", type=Path,
+                        help="JSON results file (default: bench/results/<time>-<commit>.json)")
+    args = parser.parse_args()
+    if not args.dsn:
+        parser.error("no --dsn given and DATABASE_URL is not set")
+    # db.py reads DATABASE_URL when it opens connections.
+    os.environ["DATABASE_URL"] = args.dsn
+
+    scales = ["current"] if args.no_load else [s.strip() for s in args.scales.split(",") if s.strip()]
+    info = git_info()
+    report = {
+        **info,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "postgres": server_version(),
+        "repeat": args.repeat,
+        "scales": {},
+    }
+    for scale in scales:
+        rows = None
+        if scale != "current":
+            articles = datagen.SCALES.get(scale.lower()) or int(scale)
+            rows = datagen.load(args.dsn, articles, seed=args.seed, reset=True)
+        timings = measure(args.repeat)
+        print_timings(scale, timings)
+        report["scales"][scale] = {"rows": rows, "timings": timings}
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{(info['commit'] or 'nogit')[:10]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2, default=str) + "\n")
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,441 @@
+"""Drive many concurrent admin sessions through the portal and time every rerun.
+
+    python bench/loadtest.py --concurrency 1,5,10,25 --duration 30
+    python bench/loadtest.py --url http://portal-1:8501 --flow reviewer --think 0.5
+
+Each simulated session is a headless client speaking the portal's own
+websocket protocol (Streamlit's protobuf messages over ``websockets``, both
+installed with Streamlit): it loads the app, logs in, then repeats a scripted
+flow of clicks and inputs for ``--duration`` seconds. A rerun is timed from
+the message that requests it to the ``script_finished`` that ends it, so the
+numbers include queueing for the server's script threads and the database
+pool, which is what falls apart first under load.
+
+Like a browser, a session also reruns every fragment the server asked to
+rerun on a timer (``st.fragment(run_every=...)``, such as the Pending Review
+queue's poll) for as long as it is on the page, between and during its
+steps. These reruns are timed as the ``poll`` step; they are not in a
+level's headline numbers, which cover the flow's steps, but their errors are.
+A session sends one rerun at a time, so a poll due mid-step waits for the
+step to finish, where a browser would send it at once.
+
+Without ``--url`` a portal is started with ``streamlit run app.py`` on a free
+port against ``--dsn`` for the length of the run. For each concurrency level
+the report gives reruns per second, p50/p95/p99 latency overall and per
+step, errors, and the database's client connections (peak and mean, all and
+active) sampled from ``pg_stat_activity``. Results are printed and written
+as JSON alongside ``harness.py``'s.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PORTAL_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from harness import RESULTS_DIR, git_info  # noqa: E402
+
+# Steps are ("click", widget) or ("input", widget, value), where a widget is
+# its key or, for unkeyed ones, its label. Sessions log in first, then repeat
+# their flow.
+FLOWS = {
+    "editor": [
+        ("dashboard", ("click", "nav_dashboard")),
+        ("articles", ("click", "nav_articles")),
+        ("articles_next", ("click", "articles_next")),
+        ("pending", ("click", "nav_pending")),
+    ],
+    "reviewer": [
+        ("pending", ("click", "nav_pending")),
+        ("dashboard", ("click", "nav_dashboard")),
+        ("analytics", ("click", "nav_analytics")),
+    ],
+    "search": [
+        ("articles", ("click", "nav_articles")),
+        ("search", ("input", "articles_search", "puja")),
+        ("search_next", ("click", "search_next")),
+        ("clear_search", ("input", "articles_search", "")),
+    ],
+}
+
+CONNECTIONS_SQL = """
+    SELECT COUNT(*), COUNT(*) FILTER (WHERE state = 'active')
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+      AND backend_type = 'client backend'
+      AND pid <> pg_backend_pid()
+"""
+
+
+class RerunError(Exception):
+    pass
+
+
+class Session:
+    """One browser tab's worth of the Streamlit websocket protocol."""
+
+    def __init__(self, url):
+        self.url = url
+        self.ws = None
+        self.widgets = {}    # widget id -> WidgetState sent with every rerun
+        self.elements = {}   # key or label -> (element type, widget id, fragment id)
+        self.auto_reruns = {}  # fragment id -> (seconds between reruns, next one due)
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        import websockets
+
+        self.ws = await websockets.connect(self.url, subprotocols=["streamlit"], max_size=None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+
+    async def rerun(self, fragment_id="", trigger=None, auto=False):
+        """Request a rerun and wait for it to finish; returns its duration in seconds."""
+        async with self._lock:
+            return await self._rerun(fragment_id, trigger, auto)
+
+    async def _rerun(self, fragment_id, trigger, auto):
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        request = msg.rerun_script
+        request.fragment_id = fragment_id
+        request.is_auto_rerun = auto
+        for state in self.widgets.values():
+            request.widget_states.widgets.add().CopyFrom(state)
+        if trigger is not None:
+            pressed = request.widget_states.widgets.add()
+            pressed.id = trigger
+            pressed.trigger_value = True
+
+        started = time.perf_counter()
+        await self.ws.send(msg.SerializeToString())
+        errors = []
+        while True:
+            fm = ForwardMsg()
+            fm.ParseFromString(await self.ws.recv())
+            kind = fm.WhichOneof("type")
+            if kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                self._element(fm.delta.new_element, fm.delta.fragment_id, errors)
+            elif kind == "new_session" and not fm.new_session.fragment_ids_this_run:
+                # A full rerun: only the fragments it registers again keep polling.
+                self.auto_reruns.clear()
+            elif kind == "auto_rerun":
+                interval = fm.auto_rerun.interval
+                self.auto_reruns[fm.auto_rerun.fragment_id] = (interval, time.monotonic() + interval)
+            elif kind == "stop_auto_rerun":
+                for stopped in fm.stop_auto_rerun.fragment_ids:
+                    self.auto_reruns.pop(stopped, None)
+            elif kind == "script_finished":
+                # A script that calls st.rerun() finishes early and runs again.
+                if fm.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                    break
+        elapsed = time.perf_counter() - started
+        if errors:
+            raise RerunError(errors[0])
+        return elapsed
+
+    def _element(self, element, fragment_id, errors):
+        kind = element.WhichOneof("type")
+        if kind == "exception":
+            errors.append(element.exception.message)
+            return
+        widget = getattr(element, kind)
+        widget_id = getattr(widget, "id", "")
+        if not widget_id.startswith("$$ID-"):
+            return
+        entry = (kind, widget_id, fragment_id)
+        self.elements[getattr(widget, "label", "")] = entry
+        # Keyed widget ids end in "-<key>"; unkeyed ones in "-None".
+        key = widget_id.split("-", 2)[-1]
+        if key != "None":
+            self.elements[key] = entry
+
+    async def click(self, widget):
+        _, widget_id, fragment_id = self._find(widget)
+        return await self.rerun(fragment_id, trigger=widget_id)
+
+    async def input(self, widget, value):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        _, widget_id, fragment_id = self._find(widget)
+        state = WidgetState(id=widget_id, string_value=value)
+        self.widgets[widget_id] = state
+        return await self.rerun(fragment_id)
+
+    async def step(self, action):
+        verb, *args = action
+        return await getattr(self, verb)(*args)
+
+    def _find(self, widget):
+        try:
+            return self.elements[widget]
+        except KeyError:
+            raise RerunError(f"no widget {widget!r} on the page") from None
+
+
+async def poll(session, deadline, samples, errors):
+    """Rerun the session's ``run_every`` fragments when they are due, as the
+    browser's timers would, until ``deadline``."""
+    while time.monotonic() < deadline:
+        for fragment_id, entry in list(session.auto_reruns.items()):
+            interval, due = entry
+            if interval <= 0 or time.monotonic() < due:
+                continue
+            try:
+                samples["poll"].append(await session.rerun(fragment_id, auto=True))
+            except RerunError as e:
+                errors["poll"].append(str(e))
+            # Due again an interval after the last one, as with setInterval,
+            # unless the rerun stopped or re-registered it.
+            if session.auto_reruns.get(fragment_id) == entry:
+                session.auto_reruns[fragment_id] = (interval, due + interval)
+        await asyncio.sleep(0.05)
+
+
+async def run_session(url, flow, credentials, deadline, think, samples, errors):
+    session = Session(url)
+    poller = None
+    try:
+        await session.connect()
+        samples["load"].append(await session.rerun())
+        username, password = credentials
+        await session.input("Username", username)
+        await session.input("Password", password)
+        samples["login"].append(await session.click("Login"))
+        poller = asyncio.create_task(poll(session, deadline, samples, errors))
+        while time.monotonic() < deadline:
+            for name, action in flow:
+                try:
+                    samples[name].append(await session.step(action))
+                except RerunError as e:
+                    errors[name].append(str(e))
+                if think:
+                    await asyncio.sleep(think)
+                if time.monotonic() >= deadline:
+                    break
+    except (RerunError, OSError) as e:
+        errors["session"].append(str(e))
+    finally:
+        if poller is not None:
+            poller.cancel()
+            await asyncio.gather(poller, return_exceptions=True)
+        await session.close()
+
+
+class ConnectionSampler(threading.Thread):
+    """Samples the database's client connections every ``interval`` seconds."""
+
+    def __init__(self, dsn, interval=0.25):
+        super().__init__(name="loadtest-pg-sampler", daemon=True)
+        self.dsn = dsn
+        self.interval = interval
+        self.samples = []
+        self._done = threading.Event()
+
+    def run(self):
+        import psycopg2
+
+        conn = psycopg2.connect(self.dsn)
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                while not self._done.wait(self.interval):
+                    cur.execute(CONNECTIONS_SQL)
+                    self.samples.append(cur.fetchone())
+        finally:
+            conn.close()
+
+    def stop(self):
+        self._done.set()
+        self.join()
+        if not self.samples:
+            return None
+        total = [s[0] for s in self.samples]
+        active = [s[1] for s in self.samples]
+        return {
+            "peak": max(total),
+            "mean": round(sum(total) / len(total), 1),
+            "active_peak": max(active),
+            "active_mean": round(sum(active) / len(active), 1),
+        }
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an ascending list."""
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    if not ordered:
+        return {"reruns": 0}
+    return {
+        "reruns": len(ordered),
+        "p50_ms": round(percentile(ordered, 50) * 1e3, 1),
+        "p95_ms": round(percentile(ordered, 95) * 1e3, 1),
+        "p99_ms": round(percentile(ordered, 99) * 1e3, 1),
+        "max_ms": round(ordered[-1] * 1e3, 1),
+    }
+
+
+async def run_level(url, flow, sessions, duration, think, credentials, ramp):
+    samples, errors = defaultdict(list), defaultdict(list)
+    started = time.monotonic()
+    deadline = started + ramp + duration
+
+    async def delayed(i):
+        await asyncio.sleep(ramp * i / sessions)
+        await run_session(url, flow, credentials, deadline, think, samples, errors)
+
+    await asyncio.gather(*(delayed(i) for i in range(sessions)))
+    return samples, errors, time.monotonic() - started
+
+
+def measure_level(args, url, sessions):
+    sampler = ConnectionSampler(args.dsn) if args.dsn else None
+    if sampler:
+        sampler.start()
+    samples, errors, elapsed = asyncio.run(run_level(
+        url, FLOWS[args.flow], sessions, args.duration, args.think,
+        (args.username, args.password), args.ramp,
+    ))
+    connections = sampler.stop() if sampler else None
+
+    flow_samples = [s for name, _ in FLOWS[args.flow] for s in samples[name]]
+    return {
+        "sessions": sessions,
+        "seconds": round(elapsed, 1),
+        "throughput": round(len(flow_samples) / elapsed, 1),
+        **summarize(flow_samples),
+        "errors": sum(len(e) for e in errors.values()),
+        "error_examples": {name: e[:3] for name, e in errors.items()},
+        "steps": {name: summarize(s) for name, s in samples.items()},
+        "db_connections": connections,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_portal(dsn, port, timeout=60):
+    """``streamlit run app.py`` on ``port``; returns the process once it is healthy."""
+    env = {**os.environ, "DATABASE_URL": dsn}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", "app.py",
+         "--server.headless=true", f"--server.port={port}",
+         "--server.fileWatcherType=none", "--browser.gatherUsageStats=false"],
+        cwd=PORTAL_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    health = f"http://127.0.0.1:{port}/_stcore/health"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"portal exited: {proc.stderr.read().decode(errors='replace')}")
+        try:
+            with urllib.request.urlopen(health, timeout=1) as response:
+                if response.status == 200:
+                    return proc
+        except OSError:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError(f"portal not healthy after {timeout}s")
+
+
+def print_level(level):
+    db = level["db_connections"] or {}
+    print(f"{level['sessions']:>8}{level['reruns']:>8}{level['errors']:>8}{level['throughput']:>10.1f}"
+          f"{level.get('p50_ms', 0):>9.0f}{level.get('p95_ms', 0):>9.0f}{level.get('p99_ms', 0):>9.0f}"
+          f"{db.get('peak', '-'):>8}{db.get('mean', '-'):>8}{db.get('active_peak', '-'):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="a running portal, e.g. http://localhost:8501 "
+                                      "(default: start one for the run)")
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="defaults to DATABASE_URL; used to start the portal and "
+                             "to sample connections")
+    parser.add_argument("--concurrency", default="1,5,10,25",
+                        help="comma-separated numbers of concurrent sessions")
+    parser.add_argument("--flow", choices=sorted(FLOWS), default="editor")
+    parser.add_argument("--duration", type=float, default=30,
+                        help="seconds each level runs its flows, after the ramp-up")
+    parser.add_argument("--ramp", type=float, default=2,
+                        help="seconds over which a level's sessions connect")
+    parser.add_argument("--think", type=float, default=0,
+                        help="seconds a session waits between steps")
+    parser.add_argument("--username", default=os.getenv("ADMIN_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.getenv("ADMIN_PASSWORD", "admin123"))
+    parser.add_argument("--output", type=Path,
+                        help="JSON results file (default: bench/results/<time>-<commit>-load.json)")
+    args = parser.parse_args()
+    if not args.url and not args.dsn:
+        parser.error("no --url to test and no --dsn (or DATABASE_URL) to start the portal with")
+    levels = [int(n) for n in args.concurrency.split(",") if n.strip()]
+
+    portal = None
+    if args.url:
+        base = args.url.rstrip("/")
+    else:
+        port = free_port()
+        portal = start_portal(args.dsn, port)
+        base = f"http://127.0.0.1:{port}"
+    url = base.replace("http", "ws", 1) + "/_stcore/stream"
+
+    info = git_info()
+    report = {
+        **info,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "url": base,
+        "flow": args.flow,
+        "duration": args.duration,
+        "think": args.think,
+        "levels": [],
+    }
+    print(f"flow {args.flow}: {' -> '.join(name for name, _ in FLOWS[args.flow])}")
+    print(f"{'sessions':>8}{'reruns':>8}{'errors':>8}{'reruns/s':>10}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'db peak':>8}{'mean':>8}{'active':>8}")
+    try:
+        for sessions in levels:
+            level = measure_level(args, url, sessions)
+            print_level(level)
+            report["levels"].append(level)
+    finally:
+        if portal is not None:
+            portal.terminate()
+            portal.wait()
+
+    for level in report["levels"]:
+        for name, examples in level["error_examples"].items():
+            print(f"{level['sessions']} sessions, {name}: {examples[0]}")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{(info['commit'] or 'nogit')[:10]}-load.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nwrote {output}")
+
+
+if __name__ == "__main__":
+    main()
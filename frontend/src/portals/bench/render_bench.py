@@ -0,0 +1,114 @@
+"""Micro-benchmark: one st.markdown per row vs one batched element per page.
+
+    python bench/render_bench.py --rows 2000
+
+"Before" is the per-row f-string + st.markdown the list pages used to do,
+"after" is render.article_cards() emitted once. Both are timed twice: the
+string building alone, and the whole script run under Streamlit's AppTest,
+which includes building and serialising every element delta.
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import render  # noqa: E402
+
+
+def make_rows(n):
+    start = datetime(2025, 1, 1)
+    return [
+        (f"id-{i}", f"Article {i} <with> & markup", "PUBLISHED",
+         start + timedelta(hours=i), f"Author {i % 50}", f"author{i % 50}@example.com",
+         "content")
+        for i in range(n)
+    ]
+
+
+def per_row_html(rows):
+    """The pre-render.py card markup, one string per row."""
+    out = []
+    for article in rows:
+        author = article[4] if article[4] else article[5].split('@')[0]
+        date = article[3].strftime('%b %d, %Y') if article[3] else 'N/A'
+        out.append(f"""
+        <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 24px; margin-bottom: 16px;'>
+            <div style='display: flex; justify-content: space-between; align-items: start;'>
+                <div style='flex: 1;'>
+                    <div style='font-size: 16px; font-weight: 600; color: #111827; margin-bottom: 8px;'>{article[1]}</div>
+                    <div style='font-size: 13px; color: #6b7280;'>{author} • যাত্রা-আড্ডা • {date}</div>
+                </div>
+                <span class='badge badge-published'>{article[2]}</span>
+            </div>
+        </div>
+        """)
+    return out
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+PER_ROW_SCRIPT = """
+import streamlit as st
+import render_bench
+for html in render_bench.per_row_html(render_bench.make_rows({n})):
+    st.markdown(html, unsafe_allow_html=True)
+"""
+
+BATCHED_SCRIPT = """
+import streamlit as st
+import render, render_bench
+st.markdown(render.article_cards(render_bench.make_rows({n})), unsafe_allow_html=True)
+"""
+
+
+def run_script(source, n, repeat):
+    from streamlit.testing.v1 import AppTest
+
+    def once():
+        at = AppTest.from_string(source.format(n=n), default_timeout=600)
+        at.run()
+        return len(at.markdown)
+
+    elements = once()
+    return best_of(once, repeat), elements
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-streamlit", action="store_true",
+                        help="only time string building, skip the AppTest runs")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(Path(__file__).resolve().parent))
+    rows = make_rows(args.rows)
+    n = args.rows
+
+    def report(label, seconds, elements=None):
+        extra = f"  ({elements} elements)" if elements is not None else ""
+        print(f"{label:<28} {seconds * 1e3:9.2f} ms  {seconds / n * 1e6:8.2f} us/row{extra}")
+
+    print(f"rows={n} repeat={args.repeat}")
+    report("html, per row", best_of(lambda: per_row_html(rows), args.repeat))
+    report("html, batched", best_of(lambda: render.article_cards(rows), args.repeat))
+
+    if not args.no_streamlit:
+        seconds, elements = run_script(PER_ROW_SCRIPT, n, args.repeat)
+        report("streamlit, per row", seconds, elements)
+        seconds, elements = run_script(BATCHED_SCRIPT, n, args.repeat)
+        report("streamlit, batched", seconds, elements)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Profile a cold start of the portal, stage by stage and import by import.
+
+    python bench/startup.py                       # against DATABASE_URL
+    python bench/startup.py --serve --budget 2
+
+The startup runs in a fresh interpreter under ``-X importtime``, in the
+order ``app.py`` does it: each module ``app.py`` imports, then loading the
+config, building the stylesheet, warming the pool (``db.warm_up``, as
+``start_warm_up`` does on the first run) and the Dashboard's queries. The
+report gives each stage's time and the heaviest top-level imports.
+
+With ``--serve`` it also starts ``streamlit run app.py`` as ``loadtest.py``
+does and times what a new replica takes before it serves a page: until the
+server is healthy, the first script run (the login page) and the first
+Dashboard after logging in, then the same two for a second session.
+
+Exits non-zero if a module in ``LAZY`` was imported at startup, or the
+startup (or, with ``--serve``, the replica's time to its first Dashboard)
+took longer than ``--budget`` seconds. Results are printed and written as
+JSON alongside ``harness.py``'s.
+"""
+import argparse
+import ast
+import importlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+PORTAL_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+# Heavy modules only the pages that need them may import.
+LAZY = ("pandas", "numpy", "pyarrow", "redis", "PIL")
+
+# "import time: self [us] | cumulative | imported package"
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def app_imports():
+    """The modules ``app.py`` imports at the top level, in order."""
+    tree = ast.parse((PORTAL_DIR / "app.py").read_text(encoding="utf-8"))
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            modules.append(node.module)
+    return modules
+
+
+def run_stages():
+    """Run the startup in this process; ``{"stages": [(name, seconds)], "loaded": [...]}``."""
+    sys.path.insert(0, str(PORTAL_DIR))
+    stages = []
+
+    def timed(name, fn, *args):
+        started = time.perf_counter()
+        result = fn(*args)
+        stages.append((name, time.perf_counter() - started))
+        return result
+
+    for module in app_imports():
+        if module not in sys.modules:
+            timed(f"import {module}", importlib.import_module, module)
+    import db
+    import queries
+    import render
+    from parallel import query, run_queries
+
+    timed("config", db.load_config)
+    timed("css", render.stylesheet)
+    timed("pool", db.warm_up, queries.prepare_dashboard)
+    timed("dashboard", run_queries, {
+        "stats": query(queries.dashboard_stats),
+        "total_views": query(queries.total_views),
+        "recent": query(queries.recent_articles, 4),
+        "top": query(queries.top_performing, 4),
+    })
+    return {"stages": stages, "loaded": [m for m in LAZY if m in sys.modules]}
+
+
+def profile(dsn, top):
+    """Run ``run_stages`` in a fresh interpreter and add its heaviest imports."""
+    # A shared query cache could already hold the Dashboard.
+    env = {**os.environ, "DATABASE_URL": dsn, "PORTAL_CACHE_URL": ""}
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", __file__, "--stages"],
+        cwd=PORTAL_DIR, env=env, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if proc.returncode:
+        raise RuntimeError(f"startup failed:\n{proc.stderr[-4000:]}")
+    result = json.loads(proc.stdout.splitlines()[-1])
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        # Top-level entries only; their cumulative time covers everything below.
+        if match and not match[3]:
+            imports.append((match[4], int(match[2]) / 1e6))
+    imports.sort(key=lambda item: item[1], reverse=True)
+    return {
+        "process": elapsed,
+        "total": sum(seconds for _, seconds in result["stages"]),
+        "stages": result["stages"],
+        "imports": imports[:top],
+        "loaded": result["loaded"],
+    }
+
+
+async def first_pages(url, credentials):
+    """Seconds to the login page and to the Dashboard after logging in."""
+    from loadtest import Session
+
+    session = Session(url)
+    try:
+        await session.connect()
+        login = await session.rerun()
+        username, password = credentials
+        await session.input("Username", username)
+        await session.input("Password", password)
+        dashboard = await session.click("Login")
+    finally:
+        await session.close()
+    return login, dashboard
+
+
+def serve(dsn, credentials):
+    """Time a new ``streamlit run`` to healthy, then two sessions' first pages."""
+    import asyncio
+
+    from loadtest import free_port, start_portal
+
+    port = free_port()
+    started = time.perf_counter()
+    portal = start_portal(dsn, port)
+    healthy = time.perf_counter() - started
+    url = f"ws://127.0.0.1:{port}/_stcore/stream"
+    try:
+        login, dashboard = asyncio.run(first_pages(url, credentials))
+        warm_login, warm_dashboard = asyncio.run(first_pages(url, credentials))
+    finally:
+        portal.terminate()
+        portal.wait()
+    return {
+        "healthy": healthy,
+        "login": login,
+        "dashboard": dashboard,
+        "ready": healthy + login + dashboard,
+        "warm_login": warm_login,
+        "warm_dashboard": warm_dashboard,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dsn", default=os.getenv("DATABASE_URL"),
+                        help="defaults to DATABASE_URL")
+    parser.add_argument("--serve", action="store_true",
+                        help="also time a streamlit server to its first Dashboard")
+    parser.add_argument("--budget", type=float, default=2.0,
+                        help="seconds the startup may take")
+    parser.add_argument("--top", type=int, default=12, help="heaviest imports to list")
+    parser.add_argument("--username", default=os.getenv("ADMIN_USERNAME", "admin"))
+    parser.add_argument("--password", default=os.getenv("ADMIN_PASSWORD", "admin123"))
+    parser.add_argument("--output", type=Path,
+                        help="JSON results file (default: bench/results/<time>-<commit>-startup.json)")
+    parser.add_argument("--stages", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.stages:
+        print(json.dumps(run_stages()))
+        return
+    if not args.dsn:
+        parser.error("no --dsn given and DATABASE_URL is not set")
+
+    # Not at the top: the --stages process must import only what app.py does.
+    from harness import RESULTS_DIR, git_info
+
+    info = git_info()
+    report = {
+        **info,
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "budget": args.budget,
+        "startup": profile(args.dsn, args.top),
+    }
+    startup = report["startup"]
+    print(f"{'stage':<32}{'ms':>10}")
+    for name, seconds in startup["stages"]:
+        print(f"{name:<32}{seconds * 1000:>10.1f}")
+    print(f"{'total':<32}{startup['total'] * 1000:>10.1f}")
+    print(f"{'(interpreter and all)':<32}{startup['process'] * 1000:>10.1f}")
+    print(f"\n{'heaviest imports':<32}{'ms':>10}")
+    for module, seconds in startup["imports"]:
+        print(f"{module:<32}{seconds * 1000:>10.1f}")
+
+    failures = []
+    if startup["loaded"]:
+        failures.append(f"imported at startup: {', '.join(startup['loaded'])}")
+    if startup["total"] > args.budget:
+        failures.append(f"startup took {startup['total']:.2f}s")
+
+    if args.serve:
+        report["serve"] = served = serve(args.dsn, (args.username, args.password))
+        print(f"\n{'streamlit run':<32}{'ms':>10}")
+        for name, seconds in served.items():
+            print(f"{name:<32}{seconds * 1000:>10.1f}")
+        if served["ready"] > args.budget:
+            failures.append(f"first Dashboard after {served['ready']:.2f}s")
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+        output = RESULTS_DIR / f"{stamp}-{(info['commit'] or 'nogit')[:10]}-startup.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2) + "\n")
+    print(f"\nwrote {output}")
+
+    if failures:
+        print(f"\nover budget ({args.budget:.1f}s): " + "; ".join(failures))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,443 @@
+"""Query result caches.
+
+``query_cache`` is process-local by default. Set ``PORTAL_CACHE_URL`` to
+share it between portal replicas behind a load balancer:
+
+    PORTAL_CACHE_URL=sqlite:////var/cache/portal/cache.db   # replicas on one host
+    PORTAL_CACHE_URL=redis://cache-host:6379/0             # anywhere
+
+Shared caches version their keys per namespace, so ``invalidate()`` is one
+counter bump seen by every replica, and single-flight locks make sure only
+one replica recomputes a missing entry while the others wait for it.
+"""
+import collections
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+# Returned by lookups that found nothing, since None is a valid cached value.
+MISSING = object()
+
+
+class TTLCache:
+    """Process-wide keyed cache whose entries expire after a per-entry TTL.
+
+    Keys are tuples whose first element is a namespace (``"dashboard"``,
+    ``"pending"``, ...). ``invalidate(namespace)`` drops every entry in that
+    namespace, which is how write paths such as moderation actions make the
+    next read go back to the database.
+
+    Holds at most ``max_entries`` entries, dropping the least recently used
+    past that, and every ``EVICT_EVERY`` sets drops the expired ones, so
+    keys that are never read again (one-off searches) don't pile up.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(self, default_ttl=5.0, max_entries=1_000, clock=time.monotonic):
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # key -> (expires_at, value), oldest use first
+        self._sets = 0
+        self._hooks = []
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        with self._lock:
+            now = self._clock()
+            self._entries[key] = (now + ttl, value)
+            self._entries.move_to_end(key)
+            self._sets += 1
+            if self._sets % self.EVICT_EVERY == 0:
+                for k in [k for k, (expires_at, _) in self._entries.items() if expires_at <= now]:
+                    del self._entries[k]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader, ttl=None):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = loader()
+            self.set(key, value, ttl)
+        return value
+
+    def invalidate(self, *namespaces):
+        """Drop every entry in the given namespaces, or everything if none given."""
+        with self._lock:
+            if namespaces:
+                for key in [k for k in self._entries if k[0] in namespaces]:
+                    del self._entries[key]
+            else:
+                self._entries.clear()
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(namespaces)
+
+    def on_invalidate(self, hook):
+        """Register ``hook(namespaces)`` to run after every invalidation."""
+        with self._lock:
+            self._hooks.append(hook)
+        return hook
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class SharedCache:
+    """Base for caches shared between processes; same interface as ``TTLCache``.
+
+    An entry lives under ``<prefix>:<namespace>:<epoch>.<version>:<hash>``,
+    where the version is a per-namespace counter and the epoch a global one.
+    ``invalidate()`` bumps them instead of deleting anything: old entries
+    become unreachable and age out through TTL or LRU eviction.
+
+    ``get_or_load`` is single-flight. The first caller to miss takes a lock
+    on the key and loads; others poll for the value until ``lock_timeout``,
+    after which they load it themselves.
+
+    Subclasses implement ``_get``, ``_set``, ``_versions``, ``_bump``,
+    ``_acquire`` and ``_release``.
+    """
+
+    def __init__(self, default_ttl=5.0, prefix="portal", lock_timeout=10.0, poll_interval=0.05,
+                 clock=time.time):
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+        self._clock = clock
+        self._hooks = []
+        self._hooks_lock = threading.Lock()
+
+    def _key(self, key):
+        namespace = key[0]
+        epoch, version = self._versions(namespace)
+        digest = hashlib.sha1(repr(key[1:]).encode()).hexdigest()
+        return f"{self.prefix}:{namespace}:{epoch}.{version}:{digest}"
+
+    def get(self, key, default=None):
+        data = self._get(self._key(key))
+        return default if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        self._set(self._key(key), pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                  self.default_ttl if ttl is None else ttl)
+
+    def get_or_load(self, key, loader, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        # Resolve the version once: a value loaded before an invalidation is
+        # stored under the old version, where no later reader looks.
+        full_key = self._key(key)
+        data = self._get(full_key)
+        if data is not None:
+            return pickle.loads(data)
+
+        token = uuid.uuid4().hex
+        deadline = self._clock() + self.lock_timeout
+        while not self._acquire(full_key, token, self.lock_timeout):
+            if self._clock() >= deadline:
+                # The holder is stuck or gone; don't wait forever.
+                return loader()
+            time.sleep(self.poll_interval)
+            data = self._get(full_key)
+            if data is not None:
+                return pickle.loads(data)
+        try:
+            value = loader()
+            self._set(full_key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ttl)
+            return value
+        finally:
+            self._release(full_key, token)
+
+    def invalidate(self, *namespaces):
+        """Bump the given namespaces' versions, or the global epoch if none given."""
+        self._bump(namespaces or ("*",))
+        with self._hooks_lock:
+            hooks = list(self._hooks)
+        for hook in hooks:
+            hook(namespaces)
+
+    def on_invalidate(self, hook):
+        """Register ``hook(namespaces)`` to run after every invalidation."""
+        with self._hooks_lock:
+            self._hooks.append(hook)
+        return hook
+
+
+class SQLiteCache(SharedCache):
+    """Shared cache in an SQLite file, for replicas on one host.
+
+    Holds at most ``max_entries`` entries: past that, every ``EVICT_EVERY``
+    sets drop expired entries and then the least recently used ones.
+    """
+
+    EVICT_EVERY = 64
+
+    def __init__(self, path, max_entries=10_000, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._sets = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._conn() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY, value BLOB NOT NULL,
+                    expires_at REAL NOT NULL, used_at REAL NOT NULL);
+                CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at);
+                CREATE TABLE IF NOT EXISTS versions (
+                    namespace TEXT PRIMARY KEY, version INTEGER NOT NULL);
+                CREATE TABLE IF NOT EXISTS locks (
+                    key TEXT PRIMARY KEY, token TEXT NOT NULL, expires_at REAL NOT NULL);
+            """)
+
+    def _conn(self):
+        # sqlite3 connections can't be shared between threads.
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.lock_timeout, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _get(self, key):
+        now = self._clock()
+        conn = self._conn()
+        row = conn.execute("SELECT value, expires_at, used_at FROM entries WHERE key = ?",
+                           (key,)).fetchone()
+        if row is None or row[1] <= now:
+            return None
+        if now - row[2] > 1.0:
+            # LRU order only needs to be roughly right; don't write on every hit.
+            conn.execute("UPDATE entries SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def _set(self, key, data, ttl):
+        now = self._clock()
+        conn = self._conn()
+        conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", (key, data, now + ttl, now))
+        self._sets += 1
+        if self._sets % self.EVICT_EVERY == 0:
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+            excess = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute("""
+                    DELETE FROM entries WHERE key IN (
+                        SELECT key FROM entries ORDER BY used_at LIMIT ?)
+                """, (excess,))
+            conn.execute("DELETE FROM locks WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _versions(self, namespace):
+        rows = dict(self._conn().execute(
+            "SELECT namespace, version FROM versions WHERE namespace IN ('*', ?)", (namespace,)))
+        return rows.get("*", 0), rows.get(namespace, 0)
+
+    def _bump(self, namespaces):
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.executemany("""
+                INSERT INTO versions VALUES (?, 1)
+                ON CONFLICT (namespace) DO UPDATE SET version = version + 1
+            """, [(ns,) for ns in namespaces])
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _acquire(self, key, token, ttl):
+        now = self._clock()
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM locks WHERE key = ? AND expires_at <= ?", (key, now))
+            acquired = conn.execute("INSERT OR IGNORE INTO locks VALUES (?, ?, ?)",
+                                    (key, token, now + ttl)).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return acquired
+
+    def _release(self, key, token):
+        self._conn().execute("DELETE FROM locks WHERE key = ? AND token = ?", (key, token))
+
+    def __len__(self):
+        return self._conn().execute("SELECT COUNT(*) FROM entries WHERE expires_at > ?",
+                                    (self._clock(),)).fetchone()[0]
+
+
+class RedisCache(SharedCache):
+    """Shared cache in Redis (or anything speaking its protocol).
+
+    Entries expire through Redis TTLs. Size-bounded LRU eviction is the
+    server's job: run it with ``maxmemory`` and ``maxmemory-policy
+    allkeys-lru``; a warning is logged at startup if it isn't.
+    """
+
+    # Delete the lock only if we still hold it.
+    _RELEASE = """
+        if redis.call("get", KEYS[1]) == ARGV[1] then
+            return redis.call("del", KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, url, **kwargs):
+        super().__init__(**kwargs)
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._release_script = self._redis.register_script(self._RELEASE)
+        try:
+            policy = self._redis.config_get("maxmemory-policy").get("maxmemory-policy")
+        except redis.RedisError:
+            policy = None   # CONFIG is often disabled on managed Redis
+        if policy is not None and not policy.startswith("allkeys-"):
+            logger.warning("redis maxmemory-policy is %s; cache entries are only evicted by TTL "
+                           "(use allkeys-lru to bound the cache by size)", policy)
+
+    def _get(self, key):
+        return self._redis.get(key)
+
+    def _set(self, key, data, ttl):
+        self._redis.set(key, data, px=max(1, int(ttl * 1000)))
+
+    def _versions(self, namespace):
+        epoch, version = self._redis.mget(f"{self.prefix}:version:*", f"{self.prefix}:version:{namespace}")
+        return int(epoch or 0), int(version or 0)
+
+    def _bump(self, namespaces):
+        pipe = self._redis.pipeline()
+        for namespace in namespaces:
+            pipe.incr(f"{self.prefix}:version:{namespace}")
+        pipe.execute()
+
+    def _acquire(self, key, token, ttl):
+        return bool(self._redis.set(f"{key}:lock", token, nx=True, px=int(ttl * 1000)))
+
+    def _release(self, key, token):
+        self._release_script(keys=[f"{key}:lock"], args=[token])
+
+    def __len__(self):
+        return sum(1 for key in self._redis.scan_iter(f"{self.prefix}:*", count=1000)
+                   if b":version:" not in key and not key.endswith(b":lock"))
+
+
+def cache_from_url(url):
+    """``TTLCache`` for an empty URL or ``memory://``, else a shared cache.
+
+    ``PORTAL_CACHE_MAX_ENTRIES`` bounds either; in memory it defaults lower,
+    since the entries are held in every replica's own heap.
+    """
+    if not url or url.startswith("memory:"):
+        return TTLCache(max_entries=int(os.getenv("PORTAL_CACHE_MAX_ENTRIES", "1000")))
+    options = {
+        "lock_timeout": float(os.getenv("PORTAL_CACHE_LOCK_TIMEOUT", "10")),
+        "prefix": os.getenv("PORTAL_CACHE_PREFIX", "portal"),
+    }
+    if url.startswith("sqlite:///"):
+        return SQLiteCache(url[len("sqlite:///"):],
+                           max_entries=int(os.getenv("PORTAL_CACHE_MAX_ENTRIES", "10000")), **options)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCache(url, **options)
+    raise ValueError(f"unsupported PORTAL_CACHE_URL {url!r}")
+
+
+query_cache = cache_from_url(os.getenv("PORTAL_CACHE_URL"))
+
+
+def cached(namespace, ttl=None, stale_ttl=None):
+    """Cache a ``fn(cur, *args)`` query helper in ``query_cache``.
+
+    The cursor is not part of the key; the remaining positional and keyword
+    arguments are, so they must be hashable.
+
+    With ``stale_ttl``, every successful load is also kept as the last good
+    value for that long, outside ``namespace`` so invalidations leave it be.
+    ``run_queries`` serves it when the query runs out of time. Only the latest
+    load of each function is kept, so a date range or category picked once
+    doesn't hold its results for the whole ``stale_ttl``.
+    """
+    def decorator(fn):
+        def key(args, kwargs):
+            return (namespace, fn.__name__, args, tuple(sorted(kwargs.items())))
+
+        def load(cur, args, kwargs):
+            with tracing.label(fn.__name__):
+                value = fn(cur, *args, **kwargs)
+            if stale_ttl:
+                query_cache.set(("last_good", namespace, fn.__name__),
+                                (key(args, kwargs), value, time.time()), stale_ttl)
+            return value
+
+        @functools.wraps(fn)
+        def wrapper(cur, *args, **kwargs):
+            return query_cache.get_or_load(key(args, kwargs), lambda: load(cur, args, kwargs), ttl)
+
+        def peek(*args, **kwargs):
+            """The cached value for these arguments, or ``MISSING``."""
+            return query_cache.get(key(args, kwargs), MISSING)
+
+        def last_good(*args, **kwargs):
+            """``(value, loaded_at)`` from the last successful load, or ``MISSING``
+            if that was for other arguments."""
+            if not stale_ttl:
+                return MISSING
+            found = query_cache.get(("last_good", namespace, fn.__name__), MISSING)
+            if found is MISSING or found[0] != key(args, kwargs):
+                return MISSING
+            return found[1:]
+
+        wrapper.namespace = namespace
+        wrapper.peek = peek
+        wrapper.last_good = last_good
+        return wrapper
+    return decorator
+
+
+def invalidate_dashboard():
+    query_cache.invalidate("dashboard")
+
+
+def invalidate_moderation():
+    """Called after a content status change; every count derived from status is stale,
+    as are the statuses in cached search results."""
+    query_cache.invalidate("dashboard", "pending", "search")
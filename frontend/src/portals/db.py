@@ -1,23 +1,573 @@
+import contextvars
+import itertools
+import logging
 import psycopg2
+import psycopg2.errors
 import os
-from dotenv import load_dotenv
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
 
-# Get the directory where db.py is located
-current_dir = Path(__file__).parent
+import tracing
 
-# Load .env from the same directory as db.py
-env_path = current_dir / '.env'
-load_dotenv(dotenv_path=env_path)
+# The .env next to db.py, for local runs.
+ENV_PATH = Path(__file__).parent / '.env'
+
+
+def load_config(path=ENV_PATH):
+    """Load ``path`` into the environment if it exists.
+
+    Deployments set the environment directly and ship no ``.env``, so they
+    skip importing python-dotenv at all.
+    """
+    if path.exists():
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=path)
+
+
+# Once per process, before the settings below are read.
+load_config()
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _env_float(name, default):
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def _env_seconds(name):
+    """``{"key": seconds}`` from a ``"key=seconds,..."`` variable."""
+    pairs = (item.split("=", 1) for item in os.getenv(name, "").split(",") if item.strip())
+    return {key.strip(): float(value) for key, value in pairs}
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_db_connection(dsn=None, **options):
+    """Open a brand new connection. Pages should use ``get_cursor()`` instead.
+
+    Connects to the primary (``DATABASE_URL``) unless ``dsn`` is given. A
+    ``dsn`` (a replica) gives up after ``DB_REPLICA_CONNECT_TIMEOUT`` seconds
+    unless it sets its own ``connect_timeout``, so an unreachable replica is
+    marked down instead of holding a thread for the OS's TCP timeout.
+    ``options`` are further libpq connection parameters.
+    """
+    database_url = dsn or os.getenv("DATABASE_URL")
 
-def get_db_connection():
-    database_url = os.getenv("DATABASE_URL")
-    
-    # Debug: print to verify it's loaded
     if not database_url:
         raise ValueError("DATABASE_URL not found in .env file!")
-    
-    print(f"Connecting to: {database_url[:30]}...")  # Print first 30 chars for debugging
-    
-    return psycopg2.connect(database_url)
 
+    if dsn and "connect_timeout" not in psycopg2.extensions.parse_dsn(dsn):
+        options.setdefault("connect_timeout", max(1, round(REPLICA_CONNECT_TIMEOUT)))
+    return psycopg2.connect(database_url, cursor_factory=tracing.TracedCursor, **options)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded, thread-safe pool of psycopg2 connections.
+
+    Connections are handed out LIFO so the warmest ones get reused, pinged
+    before checkout if they have been idle for a while, and recycled once
+    they are older than ``max_lifetime`` seconds.
+    """
+
+    def __init__(self, connect, min_size=1, max_size=10, max_lifetime=1800.0,
+                 timeout=10.0, health_check_after=30.0):
+        if max_size < 1 or min_size > max_size:
+            raise ValueError("pool sizes must satisfy 0 <= min_size <= max_size, max_size >= 1")
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()      # (conn, created_at, last_used)
+        self._created = {}        # id(conn) -> created_at, for every live conn
+        self._pending = 0         # slots reserved by in-flight connects
+        self._closed = False
+
+        for _ in range(min_size):
+            conn = self._new_connection()
+            self._idle.append((conn, self._created[id(conn)], time.monotonic()))
+
+    # -- internals ---------------------------------------------------------
+
+    def _new_connection(self):
+        conn = self._connect()
+        self._created[id(conn)] = time.monotonic()
+        return conn
+
+    def _discard(self, conn):
+        self._created.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, created_at, now):
+        return self.max_lifetime and now - created_at > self.max_lifetime
+
+    def _healthy(self, conn, last_used, now):
+        if conn.closed:
+            return False
+        if now - last_used < self.health_check_after:
+            return True
+        return self._ping(conn)
+
+    def _ping(self, conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    # -- public API --------------------------------------------------------
+
+    @property
+    def size(self):
+        with self._cond:
+            return len(self._created) + self._pending
+
+    @property
+    def idle(self):
+        with self._cond:
+            return len(self._idle)
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("connection pool is closed")
+                    if self._idle:
+                        conn, created_at, last_used = self._idle.pop()
+                        break
+                    if len(self._created) + self._pending < self.max_size:
+                        # Reserve the slot, connect outside the lock.
+                        self._pending += 1
+                        conn = None
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"no database connection available after {self.timeout:.1f}s "
+                            f"(pool max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._pending -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self._pending -= 1
+                    self._created[id(conn)] = time.monotonic()
+                return conn
+
+            now = time.monotonic()
+            if not self._expired(created_at, now) and self._healthy(conn, last_used, now):
+                return conn
+            with self._cond:
+                self._discard(conn)
+                self._cond.notify()
+
+    def alive(self, conn):
+        """Whether ``conn`` survived an ``OperationalError``: its transaction
+        rolls back and it still answers a query."""
+        if conn.closed:
+            return False
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return self._ping(conn)
+
+    def putconn(self, conn, discard=False):
+        if not conn.closed and not discard:
+            try:
+                # Never hand out a connection with an open transaction.
+                conn.rollback()
+            except psycopg2.Error:
+                discard = True
+        with self._cond:
+            created_at = self._created.get(id(conn))
+            now = time.monotonic()
+            if (discard or self._closed or conn.closed or created_at is None
+                    or self._expired(created_at, now)):
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, now))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.getconn()
+        broken = False
+        try:
+            yield conn
+        except psycopg2.errors.QueryCanceled:
+            # A statement timeout or cancel(); putconn rolls it back.
+            raise
+        except psycopg2.OperationalError:
+            broken = not self.alive(conn)
+            raise
+        finally:
+            self.putconn(conn, discard=broken or conn.closed)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _, _ = self._idle.pop()
+                self._discard(conn)
+            self._cond.notify_all()
+
+
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def get_pool(dsn=None):
+    """Return the process-wide pool for ``dsn`` (the primary by default),
+    creating it on first use.
+
+    Streamlit re-executes ``app.py`` on every rerun but keeps imported modules,
+    so the pools live here and are shared by every session in the server process.
+    """
+    pool = _pools.get(dsn)
+    if pool is None:
+        with _pool_lock:
+            pool = _pools.get(dsn)
+            if pool is None:
+                pool = _pools[dsn] = ConnectionPool(
+                    lambda: get_db_connection(dsn),
+                    min_size=_env_int("DB_POOL_MIN_SIZE", 1),
+                    max_size=_env_int("DB_POOL_MAX_SIZE", 10),
+                    max_lifetime=_env_float("DB_POOL_MAX_LIFETIME", 1800.0),
+                    timeout=_env_float("DB_POOL_TIMEOUT", 10.0),
+                    health_check_after=_env_float("DB_POOL_HEALTH_CHECK_AFTER", 30.0),
+                )
+    return pool
+
+
+# -- statement budgets -------------------------------------------------------
+
+# Seconds a statement may run before Postgres cancels it, per query class:
+# a cached helper's namespace, or the page for the uncached list queries.
+# DB_QUERY_BUDGETS overrides entries ("analytics=8,search=1.5"); classes not
+# listed get DB_QUERY_TIMEOUT.
+DEFAULT_BUDGET = _env_float("DB_QUERY_TIMEOUT", 10.0)
+
+QUERY_BUDGETS = {
+    "dashboard": 2.0,
+    "pending": 2.0,
+    "articles": 3.0,
+    "search": 3.0,
+    "users": 3.0,
+    "analytics": 5.0,
+    **_env_seconds("DB_QUERY_BUDGETS"),
+}
+
+
+def query_budget(query_class):
+    return QUERY_BUDGETS.get(query_class, DEFAULT_BUDGET)
+
+
+def set_budget(cur, query_class=None, seconds=None):
+    """Limit every statement for the rest of ``cur``'s transaction to ``seconds``,
+    or to ``query_class``'s budget. Over budget raises ``QueryCanceled``."""
+    if seconds is None:
+        seconds = query_budget(query_class)
+    # SET LOCAL lasts until the pool rolls the connection back on return;
+    # 0 would mean no limit at all.
+    cur.execute("SET LOCAL statement_timeout = %s", (max(1, int(seconds * 1000)),))
+
+
+# -- read replicas -----------------------------------------------------------
+
+# Seconds of replay lag after which a replica stops receiving reads.
+REPLICA_MAX_LAG = _env_float("DB_REPLICA_MAX_LAG", 10.0)
+
+# Seconds a replica connection attempt may take (libpq counts whole seconds).
+REPLICA_CONNECT_TIMEOUT = _env_float("DB_REPLICA_CONNECT_TIMEOUT", 3.0)
+
+# Seconds a session keeps reading from the primary after it writes. Any
+# replica still in rotation by then is within REPLICA_MAX_LAG.
+READ_YOUR_WRITES_WINDOW = _env_float("DB_READ_YOUR_WRITES_WINDOW", REPLICA_MAX_LAG)
+
+# 0 when the replica has replayed everything it received; otherwise the age
+# of the last replayed transaction. Not a replica at all (e.g. a second
+# local instance): 0.
+_LAG_SQL = """
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+
+class ReplicaRouter:
+    """Chooses a replica for each read-only checkout.
+
+    ``strategy`` is ``"round_robin"`` or ``"least_lag"``. Each replica's lag
+    is sampled every ``check_interval`` seconds by a background thread of its
+    own, so ``choose()`` only reads the last samples and a replica that hangs
+    never holds up a page. A replica that is unreachable, not sampled yet,
+    or lags more than ``max_lag`` seconds, is skipped until its next sample.
+    With no replica eligible, ``choose()`` returns ``None`` and the read goes
+    to the primary.
+    """
+
+    def __init__(self, dsns, strategy="round_robin", max_lag=REPLICA_MAX_LAG,
+                 check_interval=5.0, pool_for=get_pool, clock=time.monotonic):
+        if strategy not in ("round_robin", "least_lag"):
+            raise ValueError(f"unknown replica strategy {strategy!r}")
+        self.dsns = list(dsns)
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self._pool_for = pool_for
+        self._clock = clock
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._lag = {}            # dsn -> (sampled_at, lag seconds; inf if down)
+        self._samplers = []
+        self._stop = threading.Event()
+
+    def start(self):
+        """Start the samplers, once; ``choose()`` calls this on first use."""
+        with self._lock:
+            if self._samplers:
+                return self
+            for dsn in self.dsns:
+                thread = threading.Thread(target=self._run, args=(dsn,),
+                                          name="portal-replica-lag", daemon=True)
+                self._samplers.append(thread)
+                thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self, dsn):
+        while not self._stop.is_set():
+            self.refresh(dsn)
+            self._stop.wait(self.check_interval)
+
+    def refresh(self, dsn):
+        """Sample ``dsn``'s lag now, on the calling thread."""
+        lag = self._sample(dsn)
+        with self._lock:
+            self._lag[dsn] = (self._clock(), lag)
+        return lag
+
+    def lag(self, dsn):
+        """Last sampled lag of ``dsn``; infinite if it hasn't been sampled
+        lately, e.g. its sampler is stuck connecting."""
+        with self._lock:
+            sampled_at, lag = self._lag.get(dsn, (None, float("inf")))
+        stale_after = 2 * self.check_interval + REPLICA_CONNECT_TIMEOUT
+        if sampled_at is None or self._clock() - sampled_at > stale_after:
+            return float("inf")
+        return lag
+
+    def _sample(self, dsn):
+        try:
+            with self._pool_for(dsn).connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(_LAG_SQL)
+                    return float(cur.fetchone()[0])
+        except (psycopg2.Error, PoolTimeout):
+            logger.warning("replica %s unavailable, reading from the primary", _redact(dsn))
+            return float("inf")
+
+    def mark_down(self, dsn):
+        """Skip ``dsn`` until its next sample, e.g. after a failed checkout."""
+        with self._lock:
+            self._lag[dsn] = (self._clock(), float("inf"))
+
+    def choose(self):
+        self.start()
+        eligible = [(lag, dsn) for dsn in self.dsns if (lag := self.lag(dsn)) <= self.max_lag]
+        if not eligible:
+            return None
+        if self.strategy == "least_lag":
+            return min(eligible)[1]
+        return eligible[next(self._turn) % len(eligible)][1]
+
+
+def _redact(dsn):
+    """``dsn`` without its password, for logs."""
+    params = psycopg2.extensions.parse_dsn(dsn)
+    params.pop("password", None)
+    return psycopg2.extensions.make_dsn(**params)
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """The process-wide ``ReplicaRouter``, or ``None`` without ``DATABASE_REPLICA_URLS``."""
+    global _router
+    if _router is None:
+        dsns = [u.strip() for u in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+        if not dsns:
+            return None
+        with _router_lock:
+            if _router is None:
+                _router = ReplicaRouter(
+                    dsns,
+                    strategy=os.getenv("DB_REPLICA_STRATEGY", "round_robin"),
+                    check_interval=_env_float("DB_REPLICA_LAG_CHECK_INTERVAL", 5.0),
+                )
+    return _router
+
+
+_pinned = contextvars.ContextVar("db_pinned_to_primary", default=False)
+
+
+@contextmanager
+def pin_primary(active=True):
+    """Send every read in this block (and the queries it fans out) to the primary.
+
+    For read-your-writes: wrap the reads that follow a write so they can't
+    land on a replica that hasn't replayed it yet.
+    """
+    token = _pinned.set(_pinned.get() or active)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+@contextmanager
+def get_connection(readonly=False):
+    """Check out a pooled connection.
+
+    ``readonly`` checkouts go to a replica when ``DATABASE_REPLICA_URLS`` is
+    set, no ``pin_primary()`` is active and a replica is within
+    ``DB_REPLICA_MAX_LAG``; everything else goes to the primary.
+    """
+    router = get_router() if readonly and not _pinned.get() else None
+    dsn = router.choose() if router else None
+    t0 = time.perf_counter()
+    if dsn is not None:
+        try:
+            pool = get_pool(dsn)
+            conn = pool.getconn()
+        except (psycopg2.OperationalError, PoolTimeout):
+            router.mark_down(dsn)
+            dsn = None
+    if dsn is None:
+        pool = get_pool()
+        conn = pool.getconn()
+    tracing.record("checkout", "replica" if dsn else "primary", time.perf_counter() - t0)
+    broken = False
+    try:
+        yield conn
+    except psycopg2.errors.QueryCanceled:
+        # A statement timeout; the connection itself is fine.
+        raise
+    except psycopg2.OperationalError:
+        broken = not pool.alive(conn)
+        raise
+    finally:
+        pool.putconn(conn, discard=broken or conn.closed)
+
+
+@contextmanager
+def get_cursor(commit=False, readonly=False):
+    """Check out a pooled connection and yield a cursor on it.
+
+    The transaction is rolled back on exit unless ``commit`` is set, so read
+    paths never leave a connection idle-in-transaction. ``readonly`` allows
+    the read to be served by a replica (see ``get_connection``).
+    """
+    with get_connection(readonly=readonly and not commit) as conn:
+        cur = conn.cursor()
+        try:
+            yield cur
+            if commit:
+                conn.commit()
+        finally:
+            cur.close()
+
+
+# -- warm-up -----------------------------------------------------------------
+
+_warm_up_thread = None
+_warm_up_lock = threading.Lock()
+
+
+def warm_up(prepare=None):
+    """Open every pool's ``DB_POOL_MIN_SIZE`` connections, primary and
+    replicas, and sample the replicas' lag.
+
+    ``prepare(cur)`` runs on each of those connections, e.g. to prepare the
+    landing page's statements. A replica that can't be reached is logged and
+    skipped; the primary's errors are raised.
+    """
+    router = get_router()
+    for dsn in [None, *(router.dsns if router else ())]:
+        try:
+            pool = get_pool(dsn)
+            conns = [pool.getconn() for _ in range(pool.min_size)]
+        except (psycopg2.OperationalError, PoolTimeout):
+            if dsn is None:
+                raise
+            logger.warning("replica %s unavailable during warm-up", _redact(dsn))
+            continue
+        try:
+            if prepare is not None:
+                for conn in conns:
+                    with conn.cursor() as cur:
+                        prepare(cur)
+        finally:
+            for conn in conns:
+                pool.putconn(conn)
+        if dsn is not None:
+            router.refresh(dsn)
+
+
+def start_warm_up(prepare=None):
+    """Run ``warm_up`` on a background thread, once per process.
+
+    Streamlit has no hook for server start, so the portal calls this at the
+    top of its first script run: the pool fills while the login page renders
+    instead of when the first page needs it.
+    """
+    global _warm_up_thread
+    with _warm_up_lock:
+        if _warm_up_thread is not None:
+            return _warm_up_thread
+
+        def run():
+            try:
+                warm_up(prepare)
+            except Exception:
+                logger.warning("database warm-up failed", exc_info=True)
+
+        _warm_up_thread = threading.Thread(target=run, name="portal-warm-up", daemon=True)
+        _warm_up_thread.start()
+    return _warm_up_thread
@@ -0,0 +1,259 @@
+"""Stream full dumps of articles and users out of Postgres as CSV or Parquet.
+
+Rows never pass through Python one at a time. ``COPY (SELECT ...) TO STDOUT``
+streams CSV straight into the output file; for Parquet, pyarrow parses that
+same stream in fixed-size blocks and appends each block as a row group. Memory
+stays flat however many rows are exported.
+
+From the portal's Export page, or from a shell::
+
+    python export.py articles -o articles.parquet --status PUBLISHED --since 2026-01-01
+    python export.py users --columns id,email,role > users.csv
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+
+import queries
+from db import get_cursor
+
+FORMATS = ("csv", "parquet")
+MIME_TYPES = {"csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+# Where the portal writes exports before they are downloaded.
+EXPORT_DIR = os.getenv("EXPORT_DIR") or os.path.join(tempfile.gettempdir(), "portal-exports")
+# Seconds an export that was never downloaded is kept.
+EXPORT_MAX_AGE = float(os.getenv("EXPORT_MAX_AGE", "3600"))
+
+# Bytes of CSV pyarrow parses per Parquet row group; bounds the memory used.
+PARQUET_BLOCK_SIZE = int(os.getenv("EXPORT_PARQUET_BLOCK_SIZE", str(8 << 20)))
+
+
+class Dataset(NamedTuple):
+    source: str         # FROM clause
+    columns: dict       # name -> (SQL expression, pyarrow type name)
+    status_column: str  # filtered by ``statuses``
+    status_type: str
+    statuses: tuple
+    date_column: str    # filtered by ``since`` / ``until``
+
+
+DATASETS = {
+    "articles": Dataset(
+        source="content c JOIN users u ON u.id = c.author_id",
+        columns={
+            "id": ("c.id", "string"),
+            "title": ("c.title", "string"),
+            "slug": ("c.slug", "string"),
+            "status": ("c.status", "string"),
+            "type": ("c.type", "string"),
+            "author_id": ("c.author_id", "string"),
+            "author_name": ("u.name", "string"),
+            "author_email": ("u.email", "string"),
+            "category_id": ("c.category_id", "string"),
+            "views": ("c.views", "int64"),
+            "publish_date": ("c.publish_date", "timestamp"),
+            "created_at": ("c.created_at", "timestamp"),
+            "updated_at": ("c.updated_at", "timestamp"),
+        },
+        status_column="c.status",
+        status_type='"ContentStatus"',
+        statuses=queries.CONTENT_STATUSES,
+        date_column="c.created_at",
+    ),
+    "users": Dataset(
+        source="users u",
+        columns={
+            "id": ("u.id", "string"),
+            "email": ("u.email", "string"),
+            "name": ("u.name", "string"),
+            "role": ("u.role", "string"),
+            "status": ("u.status", "string"),
+            "article_count": ("u.article_count", "int64"),
+            "follower_count": ("u.follower_count", "int64"),
+            "last_login": ("u.last_login", "timestamp"),
+            "created_at": ("u.created_at", "timestamp"),
+        },
+        status_column="u.role",
+        status_type='"Role"',
+        statuses=queries.USER_ROLES,
+        date_column="u.created_at",
+    ),
+}
+
+
+def select_sql(cur, dataset, columns=None, statuses=None, since=None, until=None):
+    """The export query with its filters inlined, since COPY takes no parameters.
+
+    ``statuses`` are content statuses for articles and roles for users.
+    ``since`` and ``until`` are inclusive dates on ``created_at``.
+    """
+    spec = DATASETS[dataset]
+    columns = list(columns or spec.columns)
+    unknown = [c for c in columns if c not in spec.columns]
+    if unknown:
+        raise ValueError(f"unknown {dataset} columns: {', '.join(unknown)}")
+
+    where, params = [], []
+    if statuses:
+        where.append(f"{spec.status_column} = ANY(%s::{spec.status_type}[])")
+        params.append(list(statuses))
+    if since:
+        where.append(f"{spec.date_column} >= %s")
+        params.append(since)
+    if until:
+        where.append(f"{spec.date_column} < %s")
+        params.append(until + timedelta(days=1))
+
+    sql = "SELECT " + ", ".join(f"{spec.columns[c][0]} AS {c}" for c in columns)
+    sql += f" FROM {spec.source}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return cur.mogrify(sql, params).decode()
+
+
+def write_csv(cur, out, dataset, **filters):
+    """Stream the export as CSV with a header row into binary file ``out``.
+
+    Returns the number of rows written.
+    """
+    select = select_sql(cur, dataset, **filters)
+    cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", out)
+    return cur.rowcount
+
+
+def write_parquet(cur, path, dataset, columns=None, **filters):
+    """Stream the export into a Parquet file at ``path``.
+
+    COPY writes CSV into a pipe on this thread while a reader thread parses it
+    with pyarrow and appends each block to the file. Returns the row count.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    spec = DATASETS[dataset]
+    columns = list(columns or spec.columns)
+    types = {"string": pa.string(), "int64": pa.int64(), "timestamp": pa.timestamp("ms")}
+    schema = pa.schema([(c, types[spec.columns[c][1]]) for c in columns])
+    select = select_sql(cur, dataset, columns=columns, **filters)
+
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def convert():
+        try:
+            with open(read_fd, "rb") as source:
+                reader = pa_csv.open_csv(
+                    source,
+                    read_options=pa_csv.ReadOptions(block_size=PARQUET_BLOCK_SIZE),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=schema,
+                        # COPY writes NULL unquoted and '' quoted.
+                        strings_can_be_null=True,
+                        quoted_strings_can_be_null=False,
+                    ),
+                )
+                with pq.ParquetWriter(path, schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+        except Exception as e:
+            errors.append(e)
+
+    converter = threading.Thread(target=convert, name="portal-export", daemon=True)
+    converter.start()
+    try:
+        with open(write_fd, "wb") as sink:
+            cur.copy_expert(f"COPY ({select}) TO STDOUT WITH (FORMAT csv, HEADER true)", sink)
+    except BrokenPipeError:
+        # The converter stopped reading; its error is the one worth raising.
+        pass
+    finally:
+        converter.join()
+    if errors:
+        raise errors[0]
+    return cur.rowcount
+
+
+def export(cur, path, dataset, format="csv", **filters):
+    """Write the export to ``path`` in ``format`` and return the row count."""
+    if format == "parquet":
+        return write_parquet(cur, path, dataset, **filters)
+    with open(path, "wb") as out:
+        return write_csv(cur, out, dataset, **filters)
+
+
+def sweep(max_age=EXPORT_MAX_AGE):
+    """Delete portal exports older than ``max_age`` seconds, left behind by
+    sessions that ended without downloading them."""
+    cutoff = time.time() - max_age
+    try:
+        entries = list(os.scandir(EXPORT_DIR))
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass  # another replica got there first
+
+
+def take(path):
+    """The export's bytes, deleting the file; the download is served from
+    memory after that."""
+    with open(path, "rb") as f:
+        data = f.read()
+    os.remove(path)
+    return data
+
+
+def export_path(dataset, format):
+    """A fresh file name in ``EXPORT_DIR`` for a portal export; old ones are
+    swept first."""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    sweep()
+    return os.path.join(EXPORT_DIR, f"{dataset}-{datetime.now():%Y%m%d-%H%M%S-%f}.{format}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export articles or users as CSV or Parquet.")
+    parser.add_argument("dataset", choices=sorted(DATASETS))
+    parser.add_argument("-o", "--output", metavar="PATH",
+                        help="output file; CSV goes to stdout if omitted")
+    parser.add_argument("--format", choices=FORMATS,
+                        help="defaults to the output file's extension, else csv")
+    parser.add_argument("--columns", help="comma-separated; defaults to all")
+    parser.add_argument("--status", action="append", default=[],
+                        help="content status (articles) or role (users); repeatable")
+    parser.add_argument("--since", type=date.fromisoformat, help="created on or after YYYY-MM-DD")
+    parser.add_argument("--until", type=date.fromisoformat, help="created on or before YYYY-MM-DD")
+    args = parser.parse_args()
+
+    format = args.format or ("parquet" if (args.output or "").endswith(".parquet") else "csv")
+    if format == "parquet" and not args.output:
+        parser.error("--format parquet needs --output")
+    filters = {
+        "columns": args.columns.split(",") if args.columns else None,
+        "statuses": args.status,
+        "since": args.since,
+        "until": args.until,
+    }
+
+    started = time.monotonic()
+    with get_cursor(readonly=True) as cur:
+        if args.output:
+            rows = export(cur, args.output, args.dataset, format, **filters)
+        else:
+            rows = write_csv(cur, sys.stdout.buffer, args.dataset, **filters)
+    print(f"exported {rows:,} {args.dataset} in {time.monotonic() - started:.1f}s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""Live review queue fed by Postgres LISTEN/NOTIFY.
+
+The ``review_queue_notify`` triggers (see the Prisma migration of the same
+name) NOTIFY whenever an article or story enters or leaves review. Each
+server process keeps one ``ReviewFeed``: a background thread holding a
+single LISTEN connection that appends every notification to a bounded,
+sequence-numbered log. Sessions don't get a connection of their own; each
+open Pending Review page holds a ``ReviewQueue`` that remembers the last
+sequence number it applied and patches its rows from the log. When the
+queue is idle, checking for updates is a comparison of two integers.
+"""
+import functools
+import json
+import logging
+import os
+import select
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
+
+import psycopg2
+from psycopg2.errors import QueryCanceled
+
+import queries
+from cache import MISSING, query_cache
+from db import PoolTimeout, get_cursor, get_db_connection, set_budget
+
+CHANNEL = "review_queue"
+
+# Seconds between an open Pending Review page's checks of the feed.
+POLL_INTERVAL = float(os.getenv("REVIEW_FEED_POLL_INTERVAL", "2"))
+LOG_SIZE = int(os.getenv("REVIEW_FEED_LOG_SIZE", "5000"))
+RECONNECT_DELAY = 5.0
+
+# The listener is idle for long stretches, where a connection dropped by a
+# NAT, proxy or failover would go unnoticed: TCP keepalives and a query after
+# every quiet RECONNECT_DELAY make such a drop an error within ~15 seconds.
+LISTEN_OPTIONS = {
+    "keepalives": 1,
+    "keepalives_idle": 5,
+    "keepalives_interval": 5,
+    "keepalives_count": 2,
+    "tcp_user_timeout": 15000,
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Change(NamedTuple):
+    seq: int
+    table: str
+    id: str
+    status: Optional[str]  # None once the row is deleted
+
+
+class ReviewFeed:
+    """Process-wide log of review-queue changes, filled by one LISTEN thread.
+
+    A session that is behind by more than ``log_size`` changes, or that synced
+    before the listener last (re)connected and so may have missed some, is
+    told to reload instead of patching.
+    """
+
+    def __init__(self, connect=functools.partial(get_db_connection, **LISTEN_OPTIONS),
+                 channel=CHANNEL, log_size=LOG_SIZE):
+        self._connect = connect
+        self.channel = channel
+        self._lock = threading.Lock()
+        self._log = deque(maxlen=log_size)
+        self._seq = 0
+        self._floor = 0   # changes after this seq are all in the log
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="portal-review-feed", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def changes_since(self, seq):
+        """``(changes, latest_seq)`` after ``seq``, or ``(None, latest_seq)``
+        if the log can't tell and the caller must reload."""
+        with self._lock:
+            latest = self._seq
+            if seq < self._floor or (self._log and self._log[0].seq > seq + 1):
+                return None, latest
+            return [c for c in self._log if c.seq > seq], latest
+
+    def _append(self, payloads):
+        # Invalidate first: a reader that sees the new seq must not get counts
+        # cached from before the change, whichever process made it.
+        query_cache.invalidate("dashboard", "pending")
+        with self._lock:
+            for payload in payloads:
+                self._seq += 1
+                self._log.append(Change(self._seq, payload["table"], payload["id"], payload["status"]))
+
+    def _reset(self):
+        query_cache.invalidate("dashboard", "pending")
+        with self._lock:
+            self._seq += 1
+            self._floor = self._seq
+            self._log.clear()
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {self.channel}")
+                # Anything sent before LISTEN was missed; readers reload.
+                self._reset()
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], RECONNECT_DELAY) == ([], [], []):
+                        # Quiet: check the connection is still there. A dead
+                        # one raises here and is replaced like any failure.
+                        cur.execute("SELECT 1")
+                    else:
+                        conn.poll()
+                    if conn.notifies:
+                        payloads = [json.loads(n.payload) for n in conn.notifies]
+                        conn.notifies.clear()
+                        self._append(payloads)
+            except (psycopg2.Error, OSError, ValueError):
+                logger.exception("review feed listener failed; reconnecting in %.0fs", RECONNECT_DELAY)
+                # Changes may be missed until then; have queues reload meanwhile.
+                self._reset()
+                self._stop.wait(RECONNECT_DELAY)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+
+
+_feed = None
+_feed_lock = threading.Lock()
+
+
+def get_feed():
+    """The process-wide feed, listening from the first call on."""
+    global _feed
+    if _feed is None:
+        with _feed_lock:
+            if _feed is None:
+                _feed = ReviewFeed().start()
+    return _feed
+
+
+class ReviewQueue:
+    """One session's page of the review queue, patched from a ``ReviewFeed``.
+
+    Patches never reorder the rows an editor may have selected: a row that
+    leaves review keeps its place with its new status, and new submissions
+    are appended. ``compact()`` drops the former and sorts the latter in once
+    nothing is selected.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.rows = None      # see queries.pending_articles
+        self.seq = -1
+        self.version = 0      # bumped whenever ``rows`` change
+        self.layout = 0       # bumped whenever rows move, so indices into ``rows`` go stale
+        self._complete = False
+        self._total = None    # pending count, as of feed seq ``_total_seq``
+        self._total_seq = None
+
+    def reload(self, feed):
+        seq = feed.seq
+        with get_cursor() as cur:
+            set_budget(cur, "pending")
+            rows = queries.pending_articles(cur, self.limit)
+        self.rows = list(rows)
+        self._complete = len(rows) < self.limit
+        self.seq = seq
+        self.version += 1
+        self.layout += 1
+
+    def sync(self, feed):
+        """Apply the feed's changes since the last sync; reload if it can't."""
+        if self.rows is None:
+            return self.reload(feed)
+        if feed.seq == self.seq:
+            return
+        changes, latest = feed.changes_since(self.seq)
+        if changes is None:
+            return self.reload(feed)
+        # Ids are UUIDs, unique across ``content`` and ``stories``.
+        statuses = {c.id: c.status for c in changes}
+        self.seq = latest
+        if statuses:
+            self.patch(statuses)
+
+    def patch(self, statuses):
+        """Apply ``{id: new status}``, fetching rows that entered review."""
+        index = {row[0]: i for i, row in enumerate(self.rows)}
+        arrived = []
+        for id, status in statuses.items():
+            if id in index:
+                row = self.rows[index[id]]
+                self.rows[index[id]] = (*row[:6], status, *row[7:])
+            elif status in queries.PENDING_STATUSES:
+                arrived.append(id)
+        if arrived:
+            with get_cursor() as cur:
+                set_budget(cur, "pending")
+                self.rows.extend(queries.pending_by_id(cur, arrived))
+        self.version += 1
+
+    def pending_total(self):
+        """Everything awaiting review, not just this page; counted again only
+        once the feed has moved, so an idle queue runs no query for it."""
+        if self._total is not None and self._total_seq == self.seq:
+            return self._total
+        stats = queries.dashboard_stats.peek()
+        if stats is MISSING:
+            try:
+                with get_cursor(readonly=True) as cur:
+                    set_budget(cur, "dashboard")
+                    stats = queries.dashboard_stats(cur)
+            except (QueryCanceled, PoolTimeout):
+                found = queries.dashboard_stats.last_good()
+                if found is MISSING and self._total is None:
+                    raise
+                # Try again after the next change rather than every poll.
+                stats = found[0] if found is not MISSING else {"pending": self._total}
+        self._total, self._total_seq = stats["pending"], self.seq
+        return self._total
+
+    def compact(self, feed):
+        """Drop rows that left review and put new ones in order."""
+        pending = [row for row in self.rows if row[6] in queries.PENDING_STATUSES]
+        if len(pending) < len(self.rows) and not self._complete and len(pending) < self.limit:
+            # Rows past the limit were never loaded; refill the page.
+            return self.reload(feed)
+        pending.sort(key=lambda row: (row[5], row[0]), reverse=True)
+        if len(pending) > self.limit:
+            pending = pending[:self.limit]
+            self._complete = False
+        if pending != self.rows:
+            self.rows = pending
+            self.version += 1
+            self.layout += 1
@@ -0,0 +1,53 @@
+"""Bulk moderation of the review queue.
+
+A whole selection is moved in one transaction by one set-based ``UPDATE``.
+Concurrency is optimistic: only rows still in a review status are changed, so
+an article or story another editor has already published or rejected in the
+meantime is left as they set it and reported back as skipped.
+"""
+from typing import NamedTuple
+
+import queries
+from cache import invalidate_moderation
+from db import get_cursor
+from statements import execute
+
+
+class Action(NamedTuple):
+    label: str
+    status: str
+
+
+ACTIONS = (
+    Action("✓ Approve & Publish", "PUBLISHED"),
+    Action("Request Changes", "CHANGES_REQUESTED"),
+    Action("✗ Reject", "REJECTED"),
+)
+
+
+class Result(NamedTuple):
+    status: str
+    changed: list   # ids moved to ``status``
+    skipped: list   # ids that had already left the review queue
+
+
+def set_status(cur, ids, status):
+    """Move the ``ids`` still awaiting review to ``status``; returns the ids changed.
+
+    ``ids`` may mix articles and stories; both tables are updated in one statement.
+    """
+    execute(cur, "set_status", (status, list(ids), list(queries.PENDING_STATUSES)))
+    return [row[0] for row in cur.fetchall()]
+
+
+def moderate(ids, status):
+    """Apply ``status`` to a selection in one transaction and invalidate the
+    counts and queue derived from content status."""
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return Result(status, [], [])
+    with get_cursor(commit=True) as cur:
+        changed = set_status(cur, ids, status)
+    invalidate_moderation()
+    done = set(changed)
+    return Result(status, changed, [i for i in ids if i not in done])
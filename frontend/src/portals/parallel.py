@@ -0,0 +1,275 @@
+"""Run a page's independent read queries concurrently.
+
+Pages declare their queries up front::
+
+    data = run_queries({
+        "stats": query(queries.dashboard_stats),
+        "recent": query(queries.recent_articles, 4),
+    })
+
+Every query helper takes a cursor as its first argument. Each one runs on its
+own pooled connection in a shared thread pool, so the page waits roughly as
+long as its slowest query instead of the sum of all of them. Cached helpers
+(see ``cache.cached``) that already hold a fresh value are answered inline
+without checking out a connection.
+
+Each query runs under its class's budget (``db.QUERY_BUDGETS``), counted
+from when it starts running rather than from when it was queued. One that
+runs over falls back to its last good value, when it keeps one, so the page
+still renders; the caller finds it in ``Results.stale`` and a single
+background worker refreshes it.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, NamedTuple, Optional
+
+from psycopg2.errors import QueryCanceled
+
+import tracing
+from cache import MISSING
+from db import PoolTimeout, get_cursor, get_pool, query_budget, set_budget
+
+# Queries run at once across all sessions; unset, as many as the pool has
+# connections, so no query waits on a thread while a connection sits idle.
+MAX_WORKERS = int(os.getenv("DB_PARALLEL_QUERIES") or 0) or None
+# Seconds a background refresh of a stale result may take.
+REFRESH_TIMEOUT = float(os.getenv("DB_REFRESH_TIMEOUT", "60"))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryTimeout(Exception):
+    """Raised when a query did not finish within its timeout."""
+
+
+# Failures that a last good result can stand in for.
+OVER_BUDGET = (QueryCanceled, QueryTimeout, PoolTimeout)
+
+
+class Query(NamedTuple):
+    fn: Callable
+    args: tuple
+    kwargs: dict
+    timeout: Optional[float]
+
+
+def query(fn, *args, timeout=None, **kwargs):
+    """Declare ``fn(cur, *args, **kwargs)`` for ``run_queries``."""
+    return Query(fn, args, kwargs, timeout)
+
+
+class Results(dict):
+    """``{name: result}`` from ``run_queries``.
+
+    ``stale`` maps the names that were served from their last good value,
+    because the query ran over budget, to when that value was loaded.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.stale = {}
+
+
+_executor = None
+_refresher = None
+_executor_lock = threading.Lock()
+_refreshing = set()
+
+
+def _workers():
+    return MAX_WORKERS or get_pool().max_size
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix="portal-query")
+    return _executor
+
+
+def _get_refresher():
+    # One worker: however slow the database is, refreshes hold one connection.
+    global _refresher
+    if _refresher is None:
+        with _executor_lock:
+            if _refresher is None:
+                _refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="portal-refresh")
+    return _refresher
+
+
+def _budget(spec, timeout):
+    """Seconds ``spec`` may run: its own timeout, the caller's, or its class budget."""
+    return spec.timeout or timeout or query_budget(getattr(spec.fn, "namespace", None))
+
+
+def _run(spec, timeout, task=None):
+    if task is not None:
+        task.dequeued = time.monotonic()
+    with get_cursor(readonly=True) as cur:
+        if task is not None:
+            task.start(cur.connection)
+        try:
+            set_budget(cur, seconds=timeout)
+            with tracing.label(getattr(spec.fn, "__name__", "query")):
+                return spec.fn(cur, *spec.args, **spec.kwargs)
+        finally:
+            if task is not None:
+                task.finish()
+
+
+class _Task:
+    """One query submitted by ``run_queries``: when a worker took it up, when
+    it started running on a connection, and that connection while it runs,
+    so it can be cancelled past its deadline."""
+
+    def __init__(self, spec, budget):
+        self.spec = spec
+        self.budget = budget
+        self.submitted = time.monotonic()
+        self.dequeued = None
+        self.started = None
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def start(self, conn):
+        with self._lock:
+            self._conn = conn
+            self.started = time.monotonic()
+
+    def finish(self):
+        with self._lock:
+            self._conn = None
+
+    def cancel(self):
+        """Cancel the running statement; the connection goes back to the pool
+        only after ``finish``, so this never reaches another query's."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.cancel()
+
+
+def _peek(spec):
+    peek = getattr(spec.fn, "peek", None)
+    return peek(*spec.args, **spec.kwargs) if peek else MISSING
+
+
+def _refresh(key, spec):
+    try:
+        _run(spec, REFRESH_TIMEOUT)
+    except Exception:
+        logger.warning("background refresh of %s failed", getattr(spec.fn, "__name__", "query"),
+                       exc_info=True)
+    finally:
+        with _executor_lock:
+            _refreshing.discard(key)
+
+
+def _serve_stale(name, spec, error, results):
+    """Put ``spec``'s last good value in ``results`` and refresh it in the
+    background; False if there is none."""
+    last_good = getattr(spec.fn, "last_good", None)
+    found = last_good(*spec.args, **spec.kwargs) if last_good else MISSING
+    if found is MISSING:
+        return False
+    results[name], results.stale[name] = found
+    logger.warning("query %r over budget (%s); serving the result from %.0fs ago",
+                   name, error.__class__.__name__, time.time() - found[1])
+    key = (spec.fn, spec.args, tuple(sorted(spec.kwargs.items())))
+    with _executor_lock:
+        if key in _refreshing:
+            return True
+        _refreshing.add(key)
+    _get_refresher().submit(_refresh, key, spec)
+    return True
+
+
+def run_queries(specs, timeout=None):
+    """Run ``{name: query(...)}`` and return ``Results`` (a dict of ``{name: result}``).
+
+    Each query is limited to its own ``timeout``, else ``timeout``, else its
+    class budget (see ``db.QUERY_BUDGETS``), counted from when it starts
+    running and enforced both server-side via ``statement_timeout`` and while
+    waiting here, where it is cancelled once over. A query that runs over, or
+    can't get a connection, is answered with its last good value if it keeps
+    one (see ``cache.cached``), listed in ``Results.stale``, and refreshed in
+    the background. Otherwise the first error is raised once all have settled.
+    """
+    results = Results()
+    pending = {}
+    for name, spec in specs.items():
+        value = _peek(spec)
+        if value is not MISSING:
+            results[name] = value
+        else:
+            pending[name] = spec
+
+    failures = {}
+    if _workers() <= 1 or len(pending) <= 1:
+        for name, spec in pending.items():
+            try:
+                results[name] = _run(spec, _budget(spec, timeout))
+            except OVER_BUDGET as e:
+                failures[name] = e
+    else:
+        executor = _get_executor()
+        tasks = {name: _Task(spec, _budget(spec, timeout)) for name, spec in pending.items()}
+        # Run each query in a copy of this context so the active trace follows it.
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, _run, task.spec, task.budget, task)
+            for name, task in tasks.items()
+        }
+        # Waiting for a worker, then for a connection, are each bounded by
+        # the pool's checkout timeout; the budget starts once the query runs.
+        queue_timeout = get_pool().timeout
+        running = dict(futures)
+        while running:
+            now = time.monotonic()
+            deadlines = {}
+            for name, future in list(running.items()):
+                task = tasks[name]
+                if future.done():
+                    del running[name]
+                elif task.started is None:
+                    waiting_since = task.submitted if task.dequeued is None else task.dequeued
+                    deadlines[name] = waiting_since + queue_timeout + 1.0
+                    # Once a worker has it, its checkout raises PoolTimeout itself.
+                    if now >= deadlines[name] and (task.dequeued is not None or future.cancel()):
+                        del running[name]
+                        failures[name] = PoolTimeout(
+                            f"query {name!r} did not start within {now - task.submitted:.1f}s")
+                else:
+                    # A little slack over the server-side timeout for the round trip.
+                    deadlines[name] = task.started + task.budget + 1.0
+                    if now >= deadlines[name]:
+                        task.cancel()
+                        del running[name]
+                        failures[name] = QueryTimeout(
+                            f"query {name!r} did not finish within {now - task.started:.1f}s")
+            if running:
+                wait([running[name] for name in running], return_when=FIRST_COMPLETED,
+                     timeout=max(0.0, min(deadlines[name] for name in running) - now))
+
+        for name, future in futures.items():
+            if name in failures:
+                continue
+            if future.exception() is not None:
+                failures[name] = future.exception()
+            else:
+                results[name] = future.result()
+
+    error = None
+    for name, exc in failures.items():
+        if not (isinstance(exc, OVER_BUDGET) and _serve_stale(name, pending[name], exc, results)):
+            error = error or exc
+    if error is not None:
+        raise error
+    out = Results()
+    out.update((name, results[name]) for name in specs)
+    out.stale = results.stale
+    return out
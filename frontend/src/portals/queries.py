@@ -0,0 +1,226 @@
+import os
+import re
+import uuid
+
+from cache import cached
+from statements import execute, inline, prepare, variant
+
+# Statuses that put a piece of content in the editors' review queue.
+PENDING_STATUSES = ('REVIEW', 'IN_REVIEW', 'SUBMITTED')
+
+# Statuses an article can be filtered by on the All Articles page.
+CONTENT_STATUSES = (
+    'DRAFT', 'REVIEW', 'SUBMITTED', 'IN_REVIEW', 'CHANGES_REQUESTED',
+    'APPROVED', 'REJECTED', 'SCHEDULED', 'PUBLISHED', 'ARCHIVED',
+)
+
+USER_ROLES = ('READER', 'AUTHOR', 'EDITOR', 'ADMIN', 'CREATOR')
+
+# Roles that can own content, used to build the author filter.
+AUTHOR_ROLES = ('AUTHOR', 'EDITOR', 'ADMIN', 'CREATOR')
+
+DASHBOARD_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "5"))
+ANALYTICS_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+SEARCH_TTL = float(os.getenv("SEARCH_CACHE_TTL", "60"))
+# How long the last good Dashboard and Analytics results are kept to show,
+# marked stale, when their queries run over budget.
+STALE_TTL = float(os.getenv("STALE_CACHE_TTL", "86400"))
+
+# Ranked matches kept per search; pages are slices of these.
+SEARCH_LIMIT = int(os.getenv("SEARCH_RESULT_LIMIT", "200"))
+# Matches each index contributes to the ranking (see the "search" statement).
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "500"))
+# Shorter queries have no trigrams to look up.
+SEARCH_MIN_LENGTH = 3
+
+_LIKE_SPECIAL = re.compile(r"([\\%_])")
+
+# Rows pulled per network round trip from server-side cursors.
+CURSOR_ITERSIZE = int(os.getenv("DB_CURSOR_ITERSIZE", "200"))
+
+
+def prepare_dashboard(cur):
+    """Prepare the Dashboard's statements, the first page after login."""
+    prepare(cur, "dashboard_stats", "recent_articles", "top_performing", "total_views")
+
+
+@cached("dashboard", ttl=DASHBOARD_TTL, stale_ttl=STALE_TTL)
+def dashboard_stats(cur):
+    """Headline counts for the Dashboard in one scan each of ``content`` and
+    ``stories``; every count covers both, as the review queue lists both."""
+    execute(cur, "dashboard_stats", (list(PENDING_STATUSES),))
+    total, published, pending, authors = cur.fetchone()
+    return {
+        "total": total,
+        "published": published,
+        "pending": pending,
+        "authors": authors,
+    }
+
+
+@cached("dashboard", ttl=DASHBOARD_TTL, stale_ttl=STALE_TTL)
+def recent_articles(cur, limit=4):
+    execute(cur, "recent_articles", (limit,))
+    return cur.fetchall()
+
+
+@cached("dashboard", ttl=DASHBOARD_TTL, stale_ttl=STALE_TTL)
+def top_performing(cur, limit=4):
+    """Most-viewed published articles and stories as ``(title, views, comments)``.
+
+    Each side is a top-K walk of its ``(status, views DESC)`` index; only the
+    2 * ``limit`` candidate rows are merged and have their comments counted.
+    """
+    execute(cur, "top_performing", (limit,))
+    return cur.fetchall()
+
+
+@cached("dashboard", ttl=DASHBOARD_TTL, stale_ttl=STALE_TTL)
+def total_views(cur):
+    """All-time views across content and stories, from the trigger-maintained counters."""
+    execute(cur, "total_views")
+    return cur.fetchone()[0]
+
+
+def pending_articles(cur, limit):
+    """The newest ``limit`` articles and stories awaiting review as
+    ``(id, title, summary, name, email, created_at, status, kind, image)``,
+    where ``kind`` is the source table, ``"content"`` or ``"stories"``, and
+    ``image`` the file name of the upload to thumbnail, or ``None``.
+
+    Not cached: the Pending Review page keeps it current from the review
+    feed (see ``live.py``) and only reloads when the feed can't patch it.
+    """
+    execute(cur, "pending_articles", (list(PENDING_STATUSES), limit))
+    return cur.fetchall()
+
+
+def pending_by_id(cur, ids):
+    """``pending_articles`` rows for those of ``ids`` (from either table) still awaiting review."""
+    execute(cur, "pending_by_id", (list(ids), list(PENDING_STATUSES)))
+    return cur.fetchall()
+
+
+@cached("users", ttl=60)
+def author_options(cur):
+    execute(cur, "author_options", (list(AUTHOR_ROLES),))
+    return cur.fetchall()
+
+
+def users_page(cur, limit, role=None, after=None):
+    """One keyset page of users, most articles first.
+
+    Counts come from the ``users.article_count`` / ``follower_count`` counter
+    cache, and ``after`` is the ``(article_count, id)`` of the previous page's
+    last row, so a page reads ``limit`` index entries regardless of how many
+    users or articles exist.
+    """
+    filters = [f for f, on in (("role", role), ("after", after)) if on]
+    execute(cur, variant("users_page", filters), (limit, role, *(after or (None, None))))
+    return cur.fetchall()
+
+
+def iter_articles(cur, limit, status=None, author_id=None, after=None):
+    """Stream one keyset page of articles and stories, newest first, as
+    ``(id, title, status, created_at, name, email, kind)``.
+
+    ``after`` is the ``(created_at, id)`` of the last row of the previous page;
+    the seek predicate and ``ORDER BY`` match the ``(created_at, id)`` indexes
+    of both ``content`` and ``stories``, and each side stops after ``limit``
+    rows before the two are merged, so a page costs O(limit) however deep the
+    user has paged.
+    Rows come from a named (server-side) cursor, ``CURSOR_ITERSIZE`` at a time,
+    which is why this is the one page query not run as a prepared statement.
+    """
+    filters = [f for f, on in (("status", status), ("author", author_id), ("after", after)) if on]
+    sql = inline(cur, variant("articles_page", filters),
+                 (limit, status, author_id, *(after or (None, None))))
+
+    named = cur.connection.cursor(name=f"articles_{uuid.uuid4().hex[:12]}")
+    named.itersize = CURSOR_ITERSIZE
+    try:
+        named.execute(sql)
+        yield from named
+    finally:
+        named.close()
+
+
+def normalize_query(text):
+    """``text`` lowercased with whitespace collapsed; searches are cached under this."""
+    return " ".join((text or "").lower().split())
+
+
+def search(cur, text, limit=SEARCH_LIMIT, status=None, author_id=None):
+    """The best ``limit`` articles and stories for ``text``, ranked, as
+    ``iter_articles`` rows followed by the author id.
+
+    Matches titles and summaries by full text, titles by trigram similarity,
+    and authors by name or email, among rows with ``status`` and by
+    ``author_id`` when given. Every spelling of a query that normalizes the
+    same shares one cached result.
+    """
+    query = normalize_query(text)
+    if len(query) < SEARCH_MIN_LENGTH:
+        return []
+    return _search(cur, query, limit, status, author_id)
+
+
+@cached("search", ttl=SEARCH_TTL)
+def _search(cur, query, limit, status, author_id):
+    pattern = "%" + _LIKE_SPECIAL.sub(r"\\\1", query) + "%"
+    filters = [f for f, on in (("status", status), ("author", author_id)) if on]
+    execute(cur, variant("search", filters), (query, pattern, limit, SEARCH_CANDIDATES, status, author_id))
+    return cur.fetchall()
+
+
+@cached("analytics", ttl=ANALYTICS_TTL, stale_ttl=STALE_TTL)
+def analytics_overview(cur, days=30):
+    """Views, engagement rate and views per published item over the last ``days`` days."""
+    execute(cur, "analytics_overview", (days,))
+    views, engagements, published = cur.fetchone()
+    return {
+        "views": views,
+        "engagement_rate": engagements / views if views else 0.0,
+        "views_per_article": views / published if published else 0.0,
+    }
+
+
+@cached("analytics", ttl=ANALYTICS_TTL, stale_ttl=STALE_TTL)
+def top_categories(cur, days=30, limit=4, parent=None):
+    """The most-viewed categories over the last ``days`` days as
+    ``(id, name, views, has_children)``.
+
+    Lists the top-level categories, or the children of ``parent``; each
+    one's views include all of its descendants'.
+    """
+    level = "children" if parent else "roots"
+    execute(cur, variant("top_categories", [level]), (days, parent, limit))
+    return cur.fetchall()
+
+
+@cached("analytics", ttl=ANALYTICS_TTL, stale_ttl=STALE_TTL)
+def category_direct_views(cur, category_id, days=30):
+    """Views over the last ``days`` days of items filed directly under ``category_id``."""
+    execute(cur, "category_direct_views", (category_id, days))
+    return cur.fetchone()[0]
+
+
+@cached("analytics", ttl=ANALYTICS_TTL, stale_ttl=STALE_TTL)
+def top_authors(cur, days=30, limit=5):
+    """``(name, email, articles, views, engagement_rate)`` for the top authors by views."""
+    execute(cur, "top_authors", (days, limit))
+    return cur.fetchall()
+
+
+@cached("analytics", ttl=ANALYTICS_TTL, stale_ttl=STALE_TTL)
+def story_timeseries(cur, start, end, by="total", top=8):
+    """Daily story metrics from ``start`` to ``end`` (inclusive dates), per series.
+
+    ``by`` is ``"total"``, ``"category"`` or ``"author"``; the ``top`` series
+    with the most views keep their name and the rest are summed as ``Other``.
+    Returns parallel lists ``{"day", "label", "views", "visitors", "completed"}``,
+    where ``completed`` is the view-weighted sum of completion rates.
+    """
+    execute(cur, variant("story_timeseries", [by]), (start, end, top))
+    row = cur.fetchone()
+    return dict(zip(("day", "label", "views", "visitors", "completed"), (col or [] for col in row)))
@@ -0,0 +1,331 @@
+"""HTML builders for the list pages.
+
+Each card template is compiled once at import: whitespace between tags is
+collapsed and the bound ``str.format`` is kept, so rendering a row is a single
+C-level format call. A whole page of rows is joined into one string and sent
+to the browser as one ``st.markdown`` element instead of one per row.
+"""
+import functools
+import re
+from html import escape
+from pathlib import Path
+
+STYLESHEET = Path(__file__).with_name("portal.css")
+
+_BETWEEN_TAGS = re.compile(r">\s+<")
+_LEADING_WS = re.compile(r"\n\s*")
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_WS = re.compile(r"\s*([{};,>])\s*|\s+")
+
+
+class Template:
+    """A precompiled HTML snippet with ``{field}`` placeholders.
+
+    Every field is HTML-escaped unless it is listed in ``raw`` (for values the
+    caller has already built as markup, or trusted ones like colours).
+    """
+
+    def __init__(self, source, raw=()):
+        compact = _LEADING_WS.sub("", _BETWEEN_TAGS.sub("><", source.strip()))
+        self.source = compact
+        self._format = compact.format
+        self._raw = frozenset(raw)
+
+    def render(self, **fields):
+        raw = self._raw
+        return self._format(**{
+            k: (v if k in raw else escape(str(v), quote=True))
+            for k, v in fields.items()
+        })
+
+
+ARTICLE_CARD = Template("""
+    <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 24px; margin-bottom: 16px;'>
+        <div style='display: flex; justify-content: space-between; align-items: start;'>
+            <div style='flex: 1;'>
+                <div style='font-size: 16px; font-weight: 600; color: #111827; margin-bottom: 8px;'>{title}</div>
+                <div style='font-size: 13px; color: #6b7280;'>{kind} • {author} • যাত্রা-আড্ডা • {date}</div>
+            </div>
+            <span class='badge {badge}'>{status}</span>
+        </div>
+    </div>
+""")
+
+PENDING_CARD = Template("""
+    <div style='background: #fffbeb; border: 2px solid #fbbf24; border-radius: 10px; padding: 24px; margin-bottom: 20px;'>
+        <div style='display: flex; gap: 20px;'>
+            {thumbnail}
+            <div style='flex: 1;'>
+                <div style='display: flex; justify-content: space-between; margin-bottom: 8px;'>
+                    <span style='background: #fef3c7; color: #92400e; padding: 4px 10px; border-radius: 12px; font-size: 10px; font-weight: 600; text-transform: uppercase;'>PENDING REVIEW · {kind}</span>
+                    <span style='color: #6b7280; font-size: 12px;'>{date}</span>
+                </div>
+                <h3 style='font-size: 18px; font-weight: 600; margin-bottom: 8px; color: #111827;'>{title}</h3>
+                <p style='color: #6b7280; font-size: 13px; margin-bottom: 12px;'>{excerpt}</p>
+                <div style='color: #6b7280; font-size: 12px;'>Author: {author}</div>
+            </div>
+        </div>
+    </div>
+""", raw=("thumbnail",))
+
+THUMBNAIL = Template("""
+    <img src='{url}' alt='' width='120' height='120' loading='lazy' decoding='async'
+         style='width: 120px; height: 120px; object-fit: cover; border-radius: 8px; flex-shrink: 0;'>
+""")
+
+THUMBNAIL_PLACEHOLDER = "<div style='width: 120px; height: 120px; background: #e5e7eb; border-radius: 8px; flex-shrink: 0;'></div>"
+
+USER_CARD = Template("""
+    <div style='background: white; border: 1px solid #e5e7eb; border-radius: 10px; padding: 20px; margin: 0 40px 12px 40px;'>
+        <div style='display: flex; align-items: center; justify-content: space-between;'>
+            <div style='display: flex; align-items: center; gap: 16px;'>
+                <div style='width: 48px; height: 48px; background: {color}; color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: 600; font-size: 16px;'>{initials}</div>
+                <div>
+                    <div style='font-size: 15px; font-weight: 600; color: #111827;'>{name}</div>
+                    <div style='font-size: 12px; color: #6b7280;'>{email}</div>
+                </div>
+            </div>
+            <div style='display: flex; align-items: center; gap: 32px;'>
+                <div style='text-align: right;'>
+                    <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Role</div>
+                    <div style='font-size: 14px; font-weight: 600; color: #111827;'>{role}</div>
+                </div>
+                <div style='text-align: right;'>
+                    <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Articles</div>
+                    <div style='font-size: 14px; font-weight: 600; color: #111827;'>{articles}</div>
+                </div>
+                <div style='text-align: right;'>
+                    <div style='font-size: 11px; color: #9ca3af; text-transform: uppercase; letter-spacing: 0.5px;'>Followers</div>
+                    <div style='font-size: 14px; font-weight: 600; color: #111827;'>{followers}</div>
+                </div>
+                <button style='background: white; color: #6b7280; border: 1px solid #e5e7eb; padding: 6px 12px; border-radius: 6px; font-size: 13px; cursor: pointer;'>✏️</button>
+            </div>
+        </div>
+    </div>
+""", raw=("color",))
+
+RECENT_ITEM = Template("""
+    <div class='article-item'>
+        <div class='article-content'>
+            <div class='article-title'>{title}</div>
+            <div class='article-meta'>{author} • যাত্রা-আড্ডা</div>
+        </div>
+        <span class='badge {badge}'>{status}</span>
+    </div>
+""")
+
+TOP_ITEM = Template("""
+    <div class='top-item'>
+        <div class='top-title'>{title}</div>
+        <div class='top-stats'><span class='dot-red'>●</span> {views} views • <span class='comment-blue'>💬</span> {comments}</div>
+    </div>
+""")
+
+CATEGORY_BAR = Template("""
+    <div style='margin-bottom: 18px;'>
+        <div style='display: flex; justify-content: space-between; align-items: center; margin-bottom: 8px;'>
+            <span style='font-size: 14px; font-weight: 600; color: #111827;'>{name}</span>
+            <span style='font-size: 13px; color: #6b7280;'>{views} views</span>
+        </div>
+        <div style='position: relative; width: 100%; height: 28px; background: #f3f4f6; border-radius: 14px; overflow: hidden;'>
+            <div style='position: absolute; width: {pct}%; height: 100%; background: linear-gradient(90deg, #dc2626, #8b5cf6);'></div>
+            <div style='position: absolute; right: 14px; top: 50%; transform: translateY(-50%); font-size: 11px; font-weight: 700; color: white;'>{pct}%</div>
+        </div>
+    </div>
+""")
+
+AUTHOR_ROW = Template("""
+    <div style='display: flex; align-items: center; gap: 16px; padding: 18px 0; {border}'>
+        <div style='font-size: 16px; font-weight: 600; color: #9ca3af; width: 32px;'>#{rank}</div>
+        <div style='width: 44px; height: 44px; background: {color}; color: white; border-radius: 50%; display: flex; align-items: center; justify-content: center; font-weight: 600; font-size: 15px;'>{initials}</div>
+        <div style='flex: 1;'>
+            <div style='font-size: 14px; font-weight: 600; color: #111827;'>{name}</div>
+            <div style='font-size: 12px; color: #6b7280;'>{articles} articles</div>
+        </div>
+        <div style='text-align: right; min-width: 100px;'>
+            <div style='font-size: 16px; font-weight: 700; color: #111827;'>{views}</div>
+            <div style='font-size: 10px; color: #9ca3af;'>TOTAL VIEWS</div>
+        </div>
+        <div style='text-align: right; min-width: 100px;'>
+            <div style='font-size: 16px; font-weight: 700; color: #111827;'>{engagement}</div>
+            <div style='font-size: 10px; color: #9ca3af;'>AVG ENGAGEMENT</div>
+        </div>
+    </div>
+""", raw=("border", "color"))
+
+HEADER = Template("""
+    <div class='portal-header'>
+        <h1>Admin Portal</h1>
+        <div class='user-badge'>
+            <div class='user-avatar'>A</div>
+            <div>
+                <div class='user-name'>admin</div>
+                <div class='user-role'>Administrator</div>
+            </div>
+        </div>
+    </div>
+""").source
+
+AUTHOR_COLORS = ['#dc2626', '#8b5cf6', '#3b82f6', '#10b981', '#f59e0b']
+
+ROLE_COLORS = {
+    'ADMIN': '#dc2626',
+    'AUTHOR': '#8b5cf6',
+    'EDITOR': '#3b82f6'
+}
+
+STATUS_BADGES = {
+    'PUBLISHED': 'badge-published',
+    'REVIEW': 'badge-pending',
+    'IN_REVIEW': 'badge-pending',
+    'SUBMITTED': 'badge-pending',
+}
+
+# Source table -> label, for the feeds that mix articles and stories.
+KINDS = {
+    'content': 'Article',
+    'stories': 'Story',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def stylesheet():
+    """``portal.css`` as one minified ``<style>`` element, read once per process."""
+    css = _CSS_COMMENT.sub("", STYLESHEET.read_text(encoding="utf-8"))
+    css = _CSS_WS.sub(lambda m: m.group(1) or " ", css).strip()
+    return f"<style>{css}</style>"
+
+
+def display_name(name, email):
+    return name if name else email.split('@')[0]
+
+
+def format_date(value):
+    return value.strftime('%b %d, %Y') if value else 'N/A'
+
+
+def excerpt(summary, length=150):
+    if summary and len(summary) > length:
+        return summary[:length] + "..."
+    return summary or "No summary available"
+
+
+def page(cards, wrapper="dashboard-container"):
+    """Join a page of rendered cards into the markup for one element."""
+    if wrapper is None:
+        return f"<div>{''.join(cards)}</div>"
+    return f"<div class='{wrapper}'>{''.join(cards)}</div>"
+
+
+def recent_items(rows):
+    """Rows of ``(title, status, email, name)``."""
+    render = RECENT_ITEM.render
+    return "".join(
+        render(
+            title=row[0],
+            author=display_name(row[3], row[2]),
+            status=row[1],
+            badge=STATUS_BADGES.get(row[1], 'badge-published'),
+        )
+        for row in rows
+    )
+
+
+def top_items(rows):
+    """Rows of ``(title, views, comments)``."""
+    render = TOP_ITEM.render
+    return "".join(
+        render(title=row[0], views=f"{row[1]:,}", comments=row[2])
+        for row in rows
+    )
+
+
+def category_bars(rows):
+    """Rows of ``(id, name, views, has_children)``, widest bar first."""
+    top = max((row[2] for row in rows), default=0) or 1
+    render = CATEGORY_BAR.render
+    return "".join(
+        render(name=f"{row[1]} ›" if row[3] else row[1], views=f"{row[2]:,}",
+               pct=int(row[2] / top * 100))
+        for row in rows
+    )
+
+
+def author_rows(rows):
+    """Rows of ``(name, email, articles, views, engagement_rate)``."""
+    render = AUTHOR_ROW.render
+    last = len(rows)
+    return "".join(
+        render(
+            rank=rank,
+            border="border-bottom: 1px solid #f3f4f6;" if rank < last else "",
+            color=AUTHOR_COLORS[(rank - 1) % len(AUTHOR_COLORS)],
+            initials=(row[0] or row[1])[:2].upper(),
+            name=display_name(row[0], row[1]),
+            articles=row[2],
+            views=f"{row[3]:,}",
+            engagement=f"{(row[4] or 0):.1%}",
+        )
+        for rank, row in enumerate(rows, 1)
+    )
+
+
+def article_cards(rows):
+    """Rows of ``(id, title, status, created_at, name, email, kind)``."""
+    render = ARTICLE_CARD.render
+    return page(
+        render(
+            title=row[1],
+            kind=KINDS.get(row[6], 'Article'),
+            author=display_name(row[4], row[5]),
+            date=format_date(row[3]),
+            status=row[2],
+            badge=STATUS_BADGES.get(row[2], 'badge-published'),
+        )
+        for row in rows
+    )
+
+
+def pending_cards(rows, thumbnail_url=None):
+    """Rows of ``(id, title, summary, name, email, created_at, status, kind, image)``.
+
+    ``thumbnail_url(image)`` gives the URL of a row's thumbnail, or ``None``
+    for the grey placeholder.
+    """
+    render = PENDING_CARD.render
+
+    def thumbnail(image):
+        url = image and thumbnail_url and thumbnail_url(image)
+        return THUMBNAIL.render(url=url) if url else THUMBNAIL_PLACEHOLDER
+
+    return page(
+        render(
+            thumbnail=thumbnail(row[8]),
+            title=row[1],
+            kind=KINDS.get(row[7], 'Article'),
+            excerpt=excerpt(row[2]),
+            author=display_name(row[3], row[4]),
+            date=format_date(row[5]),
+        )
+        for row in rows
+    )
+
+
+def user_cards(rows):
+    """Rows of ``(id, email, name, role, article_count, follower_count)``."""
+    render = USER_CARD.render
+    return page(
+        (
+            render(
+                color=ROLE_COLORS.get(row[3], '#6b7280'),
+                initials=(row[2] or row[1])[:2].upper(),
+                name=display_name(row[2], row[1]),
+                email=row[1],
+                role=row[3],
+                articles=f"{row[4]:,}",
+                followers=f"{row[5]:,}",
+            )
+            for row in rows
+        ),
+        wrapper=None,
+    )
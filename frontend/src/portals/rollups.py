@@ -0,0 +1,111 @@
+"""Refresh job for the analytics rollup tables.
+
+The rollups are built by the ``refresh_analytics_rollups()`` database
+function (see the ``analytics_rollups`` Prisma migration). Each call only
+reads engagement rows newer than the stored watermark, so refreshing is cheap
+whether it runs from cron::
+
+    python rollups.py --every 60
+
+or lazily from the Analytics page through ``refresh_if_stale()``, which
+runs it on a background thread so no page waits on the write.
+"""
+import argparse
+import logging
+import os
+import threading
+import time
+
+from cache import query_cache
+from db import get_cursor, set_budget
+
+REFRESH_INTERVAL = float(os.getenv("ROLLUP_REFRESH_INTERVAL", "60"))
+RESTATE_DAYS = int(os.getenv("ROLLUP_RESTATE_DAYS", "2"))
+# Seconds one refresh may run before the database cancels it.
+REFRESH_TIMEOUT = float(os.getenv("ROLLUP_REFRESH_TIMEOUT", "30"))
+# After a failure the next lazy refresh waits twice as long as the last
+# one did, up to this many seconds.
+MAX_BACKOFF = float(os.getenv("ROLLUP_MAX_BACKOFF", "900"))
+
+logger = logging.getLogger(__name__)
+
+_next_refresh = 0.0
+_failures = 0
+_refresh_lock = threading.Lock()
+
+
+def refresh(cur, restate_days=RESTATE_DAYS, timeout=REFRESH_TIMEOUT):
+    """Run one incremental refresh in the caller's transaction, within
+    ``timeout`` seconds.
+
+    Returns the new watermark, or ``None`` if another session holds the
+    refresh lock.
+    """
+    set_budget(cur, seconds=timeout)
+    cur.execute("SELECT refresh_analytics_rollups(%s)", (restate_days,))
+    return cur.fetchone()[0]
+
+
+def refresh_if_stale(max_age=REFRESH_INTERVAL):
+    """Start a background refresh if none ran in the last ``max_age`` seconds
+    in this process; True if one was started.
+
+    Callers never wait: they keep reading the rollups as they are, and the
+    refresh invalidates the ``analytics`` cache once it commits. A failed
+    refresh is retried after ``max_age``, then twice that, and so on up to
+    ``MAX_BACKOFF``, rather than on every page view.
+    """
+    if time.monotonic() < _next_refresh:
+        return False
+    if not _refresh_lock.acquire(blocking=False):
+        return False
+    try:
+        threading.Thread(target=_refresh, args=(max_age,), name="portal-rollups", daemon=True).start()
+    except BaseException:
+        _refresh_lock.release()
+        raise
+    return True
+
+
+def _refresh(max_age):
+    global _next_refresh, _failures
+    try:
+        with get_cursor(commit=True) as cur:
+            watermark = refresh(cur)
+        _failures = 0
+        if watermark is not None:
+            query_cache.invalidate("analytics")
+    except Exception:
+        _failures += 1
+        logger.warning("rollup refresh failed (%d in a row)", _failures, exc_info=True)
+    finally:
+        _next_refresh = time.monotonic() + min(max_age * 2 ** _failures, max(max_age, MAX_BACKOFF))
+        _refresh_lock.release()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh the analytics rollup tables.")
+    parser.add_argument("--every", type=float, metavar="SECONDS",
+                        help="keep running, refreshing every SECONDS")
+    parser.add_argument("--restate-days", type=int, default=RESTATE_DAYS,
+                        help="recompute story_analytics columns for this many recent days")
+    parser.add_argument("--timeout", type=float, default=REFRESH_TIMEOUT,
+                        help="seconds one refresh may run")
+    args = parser.parse_args()
+
+    while True:
+        started = time.monotonic()
+        with get_cursor(commit=True) as cur:
+            watermark = refresh(cur, args.restate_days, args.timeout)
+        elapsed = time.monotonic() - started
+        if watermark is None:
+            print("another refresh is in progress, skipped")
+        else:
+            print(f"rollups refreshed up to {watermark:%Y-%m-%d %H:%M:%S} in {elapsed * 1000:.0f} ms")
+        if not args.every:
+            break
+        time.sleep(max(0.0, args.every - elapsed))
+
+
+if __name__ == "__main__":
+    main()
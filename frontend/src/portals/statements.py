@@ -0,0 +1,461 @@
+"""Registry of the portal's SQL, run as server-side prepared statements.
+
+Every statement is registered here under a name, with ``$n`` placeholders
+and declared parameter types::
+
+    execute(cur, "recent_articles", (4,))
+
+The first execution on a pooled connection sends ``PREPARE``; later ones
+send only ``EXECUTE name(...)``, so Postgres parses and plans each statement
+once per connection instead of on every rerun. Prepared statements outlive
+transactions, so the pool's rollback on return doesn't drop them.
+
+Statements with optional filters are registered once per combination of
+filters (see ``register_filtered``) rather than with ``$n IS NULL OR ...``
+predicates, so every variant keeps a plan that can use its index.
+
+``python bench/explain.py`` checks every registered plan for sequential scans.
+"""
+import itertools
+import re
+import threading
+import weakref
+from typing import NamedTuple
+
+
+class Statement(NamedTuple):
+    name: str
+    sql: str      # with $1, $2, ... placeholders
+    types: tuple  # Postgres type of each placeholder
+
+
+REGISTRY = {}
+
+_PLACEHOLDER = re.compile(r"\$(\d+)")
+
+
+def register(name, sql, types=()):
+    if name in REGISTRY:
+        raise ValueError(f"statement {name!r} is already registered")
+    REGISTRY[name] = Statement(name, sql, tuple(types))
+    return name
+
+
+def variant(name, filters):
+    """The registered name of ``name`` with the given filters applied."""
+    return "__".join((name, *filters))
+
+
+def register_filtered(name, sql, types, filters):
+    """Register ``sql`` once per subset of ``filters``.
+
+    ``sql`` has a ``{where}`` slot, or ``{and_where}`` after a ``WHERE`` of
+    its own, and ``filters`` maps each optional filter to its predicate. All
+    variants take the same parameters; the ones a variant doesn't use are
+    passed as ``None`` and ignored.
+    """
+    for n in range(len(filters) + 1):
+        for used in itertools.combinations(filters, n):
+            clauses = [filters[f] for f in used]
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            and_where = "".join(f" AND {c}" for c in clauses)
+            register(variant(name, used), sql.format(where=where, and_where=and_where), types)
+
+
+# connection -> names prepared on it. Weak, so discarded connections drop out.
+_prepared = weakref.WeakKeyDictionary()
+_prepared_lock = threading.Lock()
+
+
+def prepare(cur, *names):
+    """Prepare the registered statements ``names`` on ``cur``'s connection,
+    skipping any it already has."""
+    with _prepared_lock:
+        prepared = _prepared.setdefault(cur.connection, set())
+    for name in names:
+        if name not in prepared:
+            stmt = REGISTRY[name]
+            types = f"({', '.join(stmt.types)})" if stmt.types else ""
+            cur.execute(f"PREPARE {name}{types} AS {stmt.sql}")
+            prepared.add(name)
+
+
+def execute(cur, name, params=()):
+    """Execute registered statement ``name`` on ``cur``, preparing it on the
+    cursor's connection first if needed. Fetch results from ``cur`` as usual."""
+    prepare(cur, name)
+    if params:
+        cur.execute(f"EXECUTE {name}({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+def inline(cur, name, params=()):
+    """The statement's SQL with ``params`` bound client-side.
+
+    For the places Postgres can't take ``EXECUTE``: ``DECLARE ... CURSOR``
+    for server-side cursors, and ``COPY``. Planned on every call.
+    """
+    stmt = REGISTRY[name]
+    sql = _PLACEHOLDER.sub(lambda m: f"%({m[1]})s::{stmt.types[int(m[1]) - 1]}",
+                           stmt.sql.replace("%", "%%"))
+    return cur.mogrify(sql, {str(i): v for i, v in enumerate(params, 1)}).decode()
+
+
+# -- Dashboard ---------------------------------------------------------------
+
+register("dashboard_stats", """
+    SELECT COUNT(*),
+           COUNT(*) FILTER (WHERE status = 'PUBLISHED'),
+           COUNT(*) FILTER (WHERE status = ANY($1::"ContentStatus"[])),
+           COUNT(DISTINCT author_id)
+    FROM (
+        SELECT status, author_id FROM content
+        UNION ALL
+        SELECT status, author_id FROM stories
+    ) items
+""", ["text[]"])
+
+register("recent_articles", """
+    SELECT recent.title, recent.status, u.email, u.name
+    FROM (
+        (SELECT c.title, c.status, c.author_id, c.created_at
+         FROM content c
+         ORDER BY c.created_at DESC
+         LIMIT $1)
+        UNION ALL
+        (SELECT s.title, s.status, s.author_id, s.created_at
+         FROM stories s
+         ORDER BY s.created_at DESC
+         LIMIT $1)
+    ) recent
+    JOIN users u ON recent.author_id = u.id
+    ORDER BY recent.created_at DESC
+    LIMIT $1
+""", ["int"])
+
+register("top_performing", """
+    SELECT title, views, comments
+    FROM (
+        (SELECT c.title, c.views,
+                (SELECT COUNT(*) FROM comments cm WHERE cm.content_id = c.id) AS comments
+         FROM content c
+         WHERE c.status = 'PUBLISHED'
+         ORDER BY c.views DESC
+         LIMIT $1)
+        UNION ALL
+        (SELECT s.title, s.view_count, s.comment_count
+         FROM stories s
+         WHERE s.status = 'PUBLISHED'
+         ORDER BY s.view_count DESC
+         LIMIT $1)
+    ) top
+    ORDER BY views DESC
+    LIMIT $1
+""", ["int"])
+
+register("total_views", """
+    SELECT COALESCE(SUM(value), 0)::bigint
+    FROM view_counters
+    WHERE name IN ('content_views', 'story_views')
+""")
+
+# -- Review queue and articles ----------------------------------------------
+#
+# Legacy articles live in ``content`` and creator-portal stories in
+# ``stories``; both are keyed by UUID, so an id names one row in either. The
+# lists below read the two tables as one feed, newest first: each side walks
+# its own ``(..., created_at DESC, id DESC)`` index for at most ``LIMIT`` rows
+# and only those two short runs are merged, so a page costs O(page size)
+# however large either table is. Every row ends with the table it came from.
+
+# The upload a Pending Review card shows as its thumbnail: an article's
+# featured image, else nothing; a story's thumbnail, else its first image.
+_CONTENT_IMAGE = """
+    (SELECT m.filename FROM media m
+     WHERE m.url = t.type_data->>'featuredImage' AND m.type = 'IMAGE'
+     LIMIT 1)
+"""
+
+_STORY_IMAGE = """
+    COALESCE(
+        (SELECT m.filename FROM media m
+         WHERE m.url = t.thumbnail AND m.type = 'IMAGE'
+         LIMIT 1),
+        (SELECT m.filename FROM story_media sm
+         JOIN media m ON m.id = sm.media_id
+         WHERE sm.story_id = t.id AND m.type = 'IMAGE'
+         ORDER BY sm."order"
+         LIMIT 1))
+"""
+
+register("pending_articles", f"""
+    SELECT id, title, summary, name, email, created_at, status, kind, image
+    FROM (
+        (SELECT t.id, t.title, t.summary, u.name, u.email, t.created_at, t.status,
+                'content' AS kind, {_CONTENT_IMAGE} AS image
+         FROM content t
+         JOIN users u ON t.author_id = u.id
+         WHERE t.status = ANY($1::"ContentStatus"[])
+         ORDER BY t.created_at DESC, t.id DESC
+         LIMIT $2)
+        UNION ALL
+        (SELECT t.id, t.title, t.abstract, u.name, u.email, t.created_at, t.status,
+                'stories', {_STORY_IMAGE}
+         FROM stories t
+         JOIN users u ON t.author_id = u.id
+         WHERE t.status = ANY($1::"ContentStatus"[])
+         ORDER BY t.created_at DESC, t.id DESC
+         LIMIT $2)
+    ) queue
+    ORDER BY created_at DESC, id DESC
+    LIMIT $2
+""", ["text[]", "int"])
+
+register("pending_by_id", f"""
+    SELECT id, title, summary, name, email, created_at, status, kind, image
+    FROM (
+        SELECT t.id, t.title, t.summary, u.name, u.email, t.created_at, t.status,
+               'content' AS kind, {_CONTENT_IMAGE} AS image
+        FROM content t
+        JOIN users u ON t.author_id = u.id
+        WHERE t.id = ANY($1)
+          AND t.status = ANY($2::"ContentStatus"[])
+        UNION ALL
+        SELECT t.id, t.title, t.abstract, u.name, u.email, t.created_at, t.status,
+               'stories', {_STORY_IMAGE}
+        FROM stories t
+        JOIN users u ON t.author_id = u.id
+        WHERE t.id = ANY($1)
+          AND t.status = ANY($2::"ContentStatus"[])
+    ) found
+    ORDER BY created_at DESC, id DESC
+""", ["text[]", "text[]"])
+
+register("set_status", """
+    WITH changed_content AS (
+        UPDATE content
+        SET status = $1::"ContentStatus",
+            publish_date = CASE WHEN $1 = 'PUBLISHED'
+                                THEN COALESCE(publish_date, now() AT TIME ZONE 'UTC')
+                                ELSE publish_date END,
+            updated_at = now() AT TIME ZONE 'UTC'
+        WHERE id = ANY($2)
+          AND status = ANY($3::"ContentStatus"[])
+        RETURNING id
+    ), changed_stories AS (
+        UPDATE stories
+        SET status = $1::"ContentStatus",
+            published_at = CASE WHEN $1 = 'PUBLISHED'
+                                THEN COALESCE(published_at, now() AT TIME ZONE 'UTC')
+                                ELSE published_at END,
+            reviewed_at = now() AT TIME ZONE 'UTC',
+            updated_at = now() AT TIME ZONE 'UTC'
+        WHERE id = ANY($2)
+          AND status = ANY($3::"ContentStatus"[])
+        RETURNING id
+    )
+    SELECT id FROM changed_content
+    UNION ALL
+    SELECT id FROM changed_stories
+""", ["text", "text[]", "text[]"])
+
+register_filtered("articles_page", """
+    SELECT id, title, status, created_at, name, email, kind
+    FROM (
+        (SELECT t.id, t.title, t.status, t.created_at, u.name, u.email, 'content' AS kind
+         FROM content t
+         JOIN users u ON t.author_id = u.id
+         {where}
+         ORDER BY t.created_at DESC, t.id DESC
+         LIMIT $1)
+        UNION ALL
+        (SELECT t.id, t.title, t.status, t.created_at, u.name, u.email, 'stories'
+         FROM stories t
+         JOIN users u ON t.author_id = u.id
+         {where}
+         ORDER BY t.created_at DESC, t.id DESC
+         LIMIT $1)
+    ) feed
+    ORDER BY created_at DESC, id DESC
+    LIMIT $1
+""", ["int", "text", "text", "timestamp", "text"], {
+    "status": 't.status = $2::"ContentStatus"',
+    "author": "t.author_id = $3",
+    "after": "(t.created_at, t.id) < ($4, $5)",
+})
+
+# -- Search ------------------------------------------------------------------
+
+def _search_hits(table):
+    """Candidate rows of ``table`` for the search below, with their rank."""
+    return f"""
+        SELECT t.id, t.title, t.status, t.created_at, u.name, u.email, '{table}' AS kind,
+               t.author_id,
+               ts_rank(t.search_vector, q.tsq)
+                 + word_similarity($1, t.title)
+                 + 0.5 * similarity(u.name, $1) AS rank
+        FROM (
+            (SELECT t.id FROM {table} t, q
+             WHERE t.search_vector @@ q.tsq{{and_where}}
+             ORDER BY ts_rank(t.search_vector, q.tsq) DESC LIMIT $4)
+            UNION
+            (SELECT t.id FROM {table} t
+             WHERE $1 <% t.title{{and_where}}
+             ORDER BY $1 <<-> t.title LIMIT $4)
+            UNION
+            (SELECT t.id FROM {table} t
+             JOIN authors a ON a.id = t.author_id{{and_where}}
+             ORDER BY a.rank DESC, t.created_at DESC LIMIT $4)
+        ) hit
+        JOIN {table} t ON t.id = hit.id
+        JOIN users u ON u.id = t.author_id
+        CROSS JOIN q"""
+
+
+# $1 is the normalized query, $2 the same as an escaped ILIKE substring
+# pattern. Candidates come from three sources, each cut to its $4 most
+# relevant before they are merged: full-text matches on the stored
+# title/summary vector (GIN) by ts_rank; titles containing a word close to
+# the query, walked in word-similarity order straight off the GiST trigram
+# index, so that branch stops after $4 rows however common the term; and the
+# newest work of the authors whose name or email matches best. The status
+# and author filters apply inside every source, before its cut. The best $3
+# candidates are returned as articles_page rows plus the author id.
+register_filtered("search", f"""
+    WITH q AS (
+        SELECT websearch_to_tsquery('simple', $1) AS tsq
+    ), authors AS (
+        SELECT id, similarity(name, $1) AS rank FROM users
+        WHERE name % $1 OR name ILIKE $2 OR email ILIKE $2
+        ORDER BY rank DESC
+        LIMIT $4
+    ), ranked AS ({_search_hits("content")}
+        UNION ALL{_search_hits("stories")}
+    )
+    SELECT id, title, status, created_at, name, email, kind, author_id
+    FROM ranked
+    ORDER BY rank DESC, created_at DESC, id DESC
+    LIMIT $3
+""", ["text", "text", "int", "int", "text", "text"], {
+    "status": 't.status = $5::"ContentStatus"',
+    "author": "t.author_id = $6",
+})
+
+# -- Users -------------------------------------------------------------------
+
+register("author_options", """
+    SELECT id, COALESCE(NULLIF(name, ''), email)
+    FROM users
+    WHERE role = ANY($1::"Role"[])
+    ORDER BY 2
+""", ["text[]"])
+
+register_filtered("users_page", """
+    SELECT id, email, name, role, article_count, follower_count
+    FROM users
+    {where}
+    ORDER BY article_count DESC, id DESC
+    LIMIT $1
+""", ["int", "text", "int", "text"], {
+    "role": 'role = $2::"Role"',
+    "after": "(article_count, id) < ($3, $4)",
+})
+
+# -- Analytics ---------------------------------------------------------------
+
+register("analytics_overview", """
+    SELECT COALESCE(SUM(r.content_views + r.story_views), 0)::bigint,
+           COALESCE(SUM(r.content_engagements + r.story_engagements), 0)::bigint,
+           (SELECT COUNT(*) FROM content WHERE status = 'PUBLISHED')
+             + (SELECT COUNT(*) FROM stories WHERE status = 'PUBLISHED')
+    FROM analytics_category_rollups r
+    WHERE r.day > (now() AT TIME ZONE 'UTC')::date - $1
+""", ["int"])
+
+# Categories at one level of the tree (the roots, or the children of $2),
+# each with the views of everything beneath it: the window is summed per
+# category first, then every category's sum is added to each of its
+# ancestors through the closure table.
+for _level, _where in (("roots", "c.parent_id IS NULL"), ("children", "c.parent_id = $2")):
+    register(variant("top_categories", [_level]), f"""
+        SELECT c.id, c.name, COALESCE(SUM(r.views), 0)::bigint AS views,
+               EXISTS (SELECT 1 FROM categories k WHERE k.parent_id = c.id)
+        FROM categories c
+        JOIN category_closure cc ON cc.ancestor_id = c.id
+        LEFT JOIN (
+            SELECT category_id, SUM(content_views + story_views) AS views
+            FROM analytics_category_rollups
+            WHERE day > (now() AT TIME ZONE 'UTC')::date - $1
+            GROUP BY category_id
+        ) r ON r.category_id = cc.descendant_id
+        WHERE {_where}
+        GROUP BY c.id, c.name
+        ORDER BY views DESC, c.name
+        LIMIT $3
+    """, ["int", "text", "int"])
+
+register("category_direct_views", """
+    SELECT COALESCE(SUM(content_views + story_views), 0)::bigint
+    FROM analytics_category_rollups
+    WHERE category_id = $1 AND day > (now() AT TIME ZONE 'UTC')::date - $2
+""", ["text", "int"])
+
+register("top_authors", """
+    SELECT u.name, u.email,
+           (SELECT COUNT(*) FROM content c WHERE c.author_id = u.id)
+             + (SELECT COUNT(*) FROM stories s WHERE s.author_id = u.id),
+           r.views,
+           r.engagements::float / NULLIF(r.views, 0)
+    FROM (
+        SELECT author_id,
+               SUM(content_views + story_views)::bigint AS views,
+               SUM(content_engagements + story_engagements)::bigint AS engagements
+        FROM analytics_daily_rollups
+        WHERE day > (now() AT TIME ZONE 'UTC')::date - $1
+        GROUP BY author_id
+        ORDER BY views DESC
+        LIMIT $2
+    ) r
+    JOIN users u ON u.id = r.author_id
+    ORDER BY r.views DESC
+""", ["int", "int"])
+
+# Per-day story metrics between two dates, one row per day and series, as
+# parallel arrays. Only the ``$3`` largest series by views are named; the rest
+# are summed into ``Other``.
+_TIMESERIES_BY = {
+    "total": ("NULL::text", "", "'All'"),
+    "category": ("s.category_id", "LEFT JOIN categories n ON n.id = t.key",
+                 "COALESCE(n.name, 'Other')"),
+    "author": ("s.author_id", "LEFT JOIN users n ON n.id = t.key",
+               "COALESCE(NULLIF(n.name, ''), n.email, 'Other')"),
+}
+
+for _by, (_key, _join, _label) in _TIMESERIES_BY.items():
+    register(variant("story_timeseries", [_by]), f"""
+        WITH daily AS (
+            SELECT a.date AS day, {_key} AS key,
+                   SUM(a.views) AS views,
+                   SUM(a.unique_visitors) AS visitors,
+                   SUM(a.completion_rate * a.views) AS completed
+            FROM story_analytics a
+            JOIN stories s ON s.id = a.story_id
+            WHERE a.date BETWEEN $1 AND $2
+            GROUP BY 1, 2
+        ), top AS (
+            SELECT key FROM daily GROUP BY key ORDER BY SUM(views) DESC LIMIT $3
+        ), series AS (
+            SELECT d.day, {_label} AS label,
+                   SUM(d.views)::bigint AS views,
+                   SUM(d.visitors)::bigint AS visitors,
+                   SUM(d.completed)::float AS completed
+            FROM daily d
+            LEFT JOIN top t ON t.key = d.key
+            {_join}
+            GROUP BY 1, 2
+        )
+        SELECT array_agg(day), array_agg(label), array_agg(views),
+               array_agg(visitors), array_agg(completed)
+        FROM series
+    """, ["date", "date", "int"])
@@ -0,0 +1,72 @@
+"""Plan check of every registered statement, on a small generated dataset.
+
+    TEST_DATABASE_URL=postgresql://localhost/sekor_test python -m pytest tests
+
+``TEST_DATABASE_URL`` must be a throwaway database with the migrations
+applied: the tables ``bench/datagen.py`` writes to are truncated and
+reloaded. Skipped when it is unset or can't be reached.
+
+A table of a few thousand rows is cheaper to scan than to index, so the
+plans are taken with ``enable_seqscan`` off: Postgres then scans a table
+sequentially only where no index can serve the statement, which is what
+``bench/explain.py`` flags on a full-size database.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+psycopg2 = pytest.importorskip("psycopg2")
+
+ARTICLES = 2_000
+# Below this the table is fixed-size at any scale, like categories' 48 rows.
+MIN_ROWS = 100
+
+DSN = os.getenv("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="module")
+def conn():
+    if not DSN:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    try:
+        conn = psycopg2.connect(DSN, connect_timeout=3)
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"Postgres is unavailable: {e}")
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+        migrated = cur.fetchone() is not None
+    conn.rollback()
+    if not migrated:
+        conn.close()
+        pytest.skip("TEST_DATABASE_URL has no pg_trgm; apply the migrations first")
+
+    import datagen
+
+    datagen.load(DSN, ARTICLES, reset=True)
+    yield conn
+    conn.close()
+
+
+def test_no_unexpected_sequential_scans(conn):
+    import explain
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SET LOCAL enable_seqscan = off")
+            results = explain.check(cur, MIN_ROWS)
+    finally:
+        conn.rollback()
+
+    unexpected = [
+        f"{name}: {table} ({rows:,} rows)"
+        for name, _, scans in results
+        for table, rows, ok in scans
+        if not ok
+    ]
+    assert not unexpected, "unexpected sequential scans:\n" + "\n".join(unexpected)
@@ -0,0 +1,250 @@
+"""Fixed-size thumbnails of uploaded images for the Pending Review cards.
+
+Cards never send the browser an original. ``Thumbnailer.url()`` answers
+from a content-addressed cache on disk: each thumbnail is stored once as
+``<sha256 of the original>-<pixels>.webp``, so an unchanged upload is never
+resized twice and a replaced one gets a new name. A missing thumbnail is
+made in the background by a small worker pool while the card shows the grey
+placeholder; ``Thumbnailer.ready()`` tells a page when any of its own
+placeholders can be filled in.
+
+By default the cache lives in the portal's ``static/`` directory and the
+portal serves it on its own port (``server.enableStaticServing`` in
+``.streamlit/config.toml``), at ``app/static/thumbnails/...``. The browser
+caches each file by name and revalidates it with its ETag; the names are
+unguessable digests of unpublished uploads and can't be listed. To serve
+them from a CDN or proxy with a one-year ``immutable`` lifetime instead, set
+``THUMBNAIL_URL`` to its base URL; ``python thumbnails.py serve`` serves the
+cache that way for a proxy to front, on 127.0.0.1 only. With neither, e.g.
+``THUMBNAIL_DIR`` outside ``static/``, thumbnails are inlined into the
+cards as ``data:`` URIs.
+
+To fill the cache ahead of time::
+
+    python thumbnails.py                # every image in UPLOADS_DIR/image
+"""
+import argparse
+import base64
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+# Where the backend stores uploads (see media.service.ts), by media type.
+UPLOADS_DIR = Path(os.getenv("UPLOADS_DIR") or Path(__file__).resolve().parents[3] / "backend" / "uploads")
+# Streamlit serves this directory as app/static/ when static serving is on.
+STATIC_DIR = Path(__file__).resolve().parent / "static"
+THUMBNAIL_DIR = Path(os.getenv("THUMBNAIL_DIR") or STATIC_DIR / "thumbnails").resolve()
+
+# Pixels square; cards show them at 120 CSS px, sharp on 2x screens.
+SIZE = int(os.getenv("THUMBNAIL_SIZE", "240"))
+QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "80"))
+WORKERS = int(os.getenv("THUMBNAIL_WORKERS", "2"))
+
+# Where browsers fetch the cache from; unset, the portal's static route.
+BASE_URL = os.getenv("THUMBNAIL_URL", "").rstrip("/")
+PORT = int(os.getenv("THUMBNAIL_PORT", "8599"))
+MAX_AGE = 365 * 24 * 3600
+
+_NAME = re.compile(r"^/[0-9a-f]{2}/[0-9a-f]{64}-\d+\.webp$")
+
+logger = logging.getLogger(__name__)
+
+
+def cache_path(digest, size=SIZE):
+    return THUMBNAIL_DIR / digest[:2] / f"{digest}-{size}.webp"
+
+
+def static_base():
+    """The cache's URL on the portal's static route, or ``None`` if the
+    portal doesn't serve it."""
+    from streamlit import config
+
+    if not config.get_option("server.enableStaticServing") or not THUMBNAIL_DIR.is_relative_to(STATIC_DIR):
+        return None
+    # Relative, so it follows server.baseUrlPath.
+    return "app/static/" + THUMBNAIL_DIR.relative_to(STATIC_DIR).as_posix()
+
+
+def source_path(filename):
+    """The original of an image upload, from ``media.filename``."""
+    return UPLOADS_DIR / "image" / Path(filename).name
+
+
+def make(source, size=SIZE):
+    """Thumbnail ``source`` into the cache unless it is there; returns its digest."""
+    from PIL import Image, ImageOps
+
+    data = source.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    target = cache_path(digest, size)
+    if target.exists():
+        return digest
+    with Image.open(source) as image:
+        # JPEGs decode straight at a fraction of full size.
+        image.draft("RGB", (size, size))
+        image = ImageOps.exif_transpose(image)
+        image = ImageOps.fit(image.convert("RGB"), (size, size), Image.Resampling.LANCZOS)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    # Write then rename, so no process ever serves half a file.
+    fd, temp = tempfile.mkstemp(dir=target.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            image.save(out, "WEBP", quality=QUALITY, method=4)
+        os.replace(temp, target)
+    except BaseException:
+        os.unlink(temp)
+        raise
+    return digest
+
+
+class Thumbnailer:
+    """Process-wide map of originals to cached thumbnails, and the pool that
+    makes the missing ones.
+
+    An original is identified by path, mtime and size, so it is hashed once
+    per process and again only if the file changes.
+    """
+
+    def __init__(self, size=SIZE, workers=WORKERS):
+        self.size = size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="portal-thumbnail")
+        self._lock = threading.Lock()
+        self._digests = {}     # (path, mtime_ns, bytes) -> digest, or None if unreadable
+        self._names = {}       # upload filename -> its key when last looked up
+        self._pending = set()
+        self._base = None
+
+    def url(self, filename):
+        """The thumbnail's URL for upload ``filename``, or ``None`` until it exists."""
+        source = source_path(filename)
+        try:
+            stat = source.stat()
+        except OSError:
+            return None
+        key = (source, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            self._names[filename] = key
+            if key not in self._digests:
+                if key not in self._pending:
+                    self._pending.add(key)
+                    self._executor.submit(self._make, key)
+                return None
+            digest = self._digests[key]
+        if digest is None:
+            return None
+        if self._base is None:
+            self._base = BASE_URL or static_base() or ""
+        if self._base:
+            return f"{self._base}/{digest[:2]}/{digest}-{self.size}.webp"
+        try:
+            data = cache_path(digest, self.size).read_bytes()
+        except OSError:
+            # Swept from the cache since; make it again.
+            with self._lock:
+                self._digests.pop(key, None)
+            return None
+        return "data:image/webp;base64," + base64.b64encode(data).decode("ascii")
+
+    def ready(self, filenames):
+        """Whether a thumbnail was made for any of ``filenames`` since
+        ``url()`` last returned ``None`` for it."""
+        with self._lock:
+            return any(self._digests.get(self._names.get(name)) for name in filenames)
+
+    def _make(self, key):
+        digest = None
+        try:
+            digest = make(key[0], self.size)
+        except Exception as e:
+            logger.warning("could not thumbnail %s: %s", key[0], e)
+        with self._lock:
+            self._pending.discard(key)
+            self._digests[key] = digest
+
+
+def serve(host="127.0.0.1", port=PORT):
+    """Serve the cache on ``host:port`` until interrupted.
+
+    It has no access control of its own: keep it on loopback behind a proxy
+    that checks the portal's sign-in.
+    """
+    import http.server
+
+    class Handler(http.server.SimpleHTTPRequestHandler):
+        """Serves cache files only, by exact name, with a long lifetime."""
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=str(THUMBNAIL_DIR), **kwargs)
+
+        def send_head(self):
+            self.cacheable = False
+            if not _NAME.match(self.path):
+                self.send_error(404)
+                return None
+            # Errors, such as a name that isn't there yet, mustn't be cached.
+            self.cacheable = os.path.isfile(self.translate_path(self.path))
+            return super().send_head()
+
+        def end_headers(self):
+            if self.cacheable:
+                self.send_header("Cache-Control", f"public, max-age={MAX_AGE}, immutable")
+            super().end_headers()
+
+        def log_message(self, format, *args):
+            logger.debug(format, *args)
+
+    THUMBNAIL_DIR.mkdir(parents=True, exist_ok=True)
+    with http.server.ThreadingHTTPServer((host, port), Handler) as server:
+        print(f"serving {THUMBNAIL_DIR} on http://{host}:{port}")
+        server.serve_forever()
+
+
+_thumbnailer = None
+_thumbnailer_lock = threading.Lock()
+
+
+def get_thumbnailer():
+    """The process-wide ``Thumbnailer``."""
+    global _thumbnailer
+    if _thumbnailer is None:
+        with _thumbnailer_lock:
+            if _thumbnailer is None:
+                _thumbnailer = Thumbnailer()
+    return _thumbnailer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the thumbnail cache, or serve it.")
+    parser.add_argument("command", nargs="?", choices=("fill", "serve"), default="fill",
+                        help="fill: thumbnail every uploaded image (default); serve: serve the cache")
+    parser.add_argument("--size", type=int, default=SIZE, help="pixels square")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="127.0.0.1", help="serve on this address")
+    parser.add_argument("--port", type=int, default=PORT, help="serve on this port")
+    args = parser.parse_args()
+    if args.command == "serve":
+        return serve(args.host, args.port)
+
+    sources = [p for p in (UPLOADS_DIR / "image").iterdir() if p.is_file() and not p.name.startswith(".")]
+    started = time.monotonic()
+    failed = 0
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [executor.submit(make, source, args.size) for source in sources]
+        for source, future in zip(sources, futures):
+            try:
+                future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{source.name}: {e}")
+    print(f"thumbnailed {len(sources) - failed:,} of {len(sources):,} images into {THUMBNAIL_DIR} "
+          f"in {time.monotonic() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
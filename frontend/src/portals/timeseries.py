@@ -0,0 +1,74 @@
+"""Shape ``queries.story_timeseries`` columns into chart-ready frames.
+
+Everything here is vectorized pandas: the columns become one DataFrame, and
+``groupby`` + ``resample`` sum each series into buckets wide enough that a
+chart never has more than ``POINT_BUDGET`` points, so a two-year range costs
+about as much to build and send as a week.
+
+pandas is imported on first use, so only processes that draw a chart pay
+for it.
+"""
+import math
+import os
+
+POINT_BUDGET = int(os.getenv("ANALYTICS_CHART_POINTS", "120"))
+
+# Chart label -> frame column.
+METRICS = {
+    "Views": "views",
+    "Unique visitors": "visitors",
+    "Completion rate": "completion",
+}
+
+_SUMS = ["views", "visitors", "completed"]
+
+
+def bucket_days(start, end, budget=POINT_BUDGET):
+    """Days per point so that ``start``..``end`` fits in ``budget`` points."""
+    return max(1, math.ceil(((end - start).days + 1) / budget))
+
+
+def frame(columns):
+    """The query's parallel lists as a DataFrame indexed by day."""
+    import pandas as pd
+
+    df = pd.DataFrame(columns, columns=["day", "label", *_SUMS])
+    df["day"] = pd.to_datetime(df["day"])
+    return df.set_index("day")
+
+
+def series(columns, metric, start, end, budget=POINT_BUDGET):
+    """One column per series and one row per bucket from ``start`` to ``end``.
+
+    Buckets are ``bucket_days()`` wide and labelled by their first day; days
+    without data count as zero views. Columns are ordered by total views,
+    with ``Other`` last.
+    """
+    import pandas as pd
+
+    # A fixed-length Timedelta (unlike "7D") honours ``origin``.
+    width = pd.Timedelta(days=bucket_days(start, end, budget))
+    origin = pd.Timestamp(start)
+    buckets = pd.date_range(origin, pd.Timestamp(end), freq=width)
+    df = frame(columns)
+    if df.empty:
+        return pd.DataFrame(index=buckets)
+
+    sums = (
+        df.groupby("label")[_SUMS]
+        .resample(width, origin=origin)
+        .sum()
+        .unstack("label", fill_value=0)
+        .reindex(buckets, fill_value=0)
+    )
+    views = sums["views"]
+    order = views.sum().sort_values(ascending=False).index
+    order = [label for label in order if label != "Other"] + (["Other"] if "Other" in order else [])
+
+    if metric == "completion":
+        out = sums["completed"] / views.where(views > 0)
+    else:
+        out = sums[metric]
+    out = out[order]
+    out.columns.name = None
+    return out
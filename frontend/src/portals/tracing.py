@@ -0,0 +1,166 @@
+"""Lightweight per-run tracing for the portal.
+
+A trace covers one script run of one page. While a trace is active,
+connection checkouts, SQL statements (via ``TracedCursor``), HTML building and
+``st.markdown`` calls are recorded as spans. When no trace is active every
+hook reduces to a single context-variable lookup.
+
+Traces are started by ``app.py`` when the sidebar "Performance" panel is on
+or when ``PORTAL_TRACE_LOG`` names a file; in the latter case every finished
+trace is appended to it as one JSON line.
+"""
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from psycopg2.extensions import cursor as _cursor
+
+TRACE_LOG = os.getenv("PORTAL_TRACE_LOG")
+
+_current = contextvars.ContextVar("portal_trace", default=None)
+_label = contextvars.ContextVar("portal_trace_label", default=None)
+_WS = re.compile(r"\s+")
+
+logger = logging.getLogger("portal.trace")
+if TRACE_LOG and not logger.handlers:
+    _handler = logging.FileHandler(TRACE_LOG, encoding="utf-8")
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Trace:
+    def __init__(self, page, session=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.page = page
+        self.session = session
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.total = None
+        self._lap = self._t0
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, seconds, rows=None):
+        span = {
+            "kind": kind,
+            "name": name,
+            "start_ms": round((time.perf_counter() - seconds - self._t0) * 1e3, 3),
+            "ms": round(seconds * 1e3, 3),
+        }
+        if rows is not None:
+            span["rows"] = rows
+        with self._lock:
+            self.spans.append(span)
+
+    def lap(self, kind, name):
+        """Record the time since the previous lap (or the start) as a span."""
+        now = time.perf_counter()
+        seconds, self._lap = now - self._lap, now
+        self.record(kind, name, seconds)
+
+    def totals(self):
+        """Summed milliseconds per span kind."""
+        out = {}
+        for span in self.spans:
+            out[span["kind"]] = round(out.get(span["kind"], 0.0) + span["ms"], 3)
+        return out
+
+    def as_dict(self):
+        return {
+            "trace": self.id,
+            "ts": round(self.started_at, 3),
+            "session": self.session,
+            "page": self.page,
+            "total_ms": round(self.total * 1e3, 3) if self.total is not None else None,
+            "totals": self.totals(),
+            "spans": self.spans,
+        }
+
+
+def current():
+    return _current.get()
+
+
+def start(page, session=None):
+    trace = Trace(page, session)
+    _current.set(trace)
+    return trace
+
+
+def clear():
+    """Drop any trace left active on this thread without reporting it."""
+    _current.set(None)
+
+
+def finish():
+    """End the active trace, log it if configured, and return it."""
+    trace = _current.get()
+    if trace is None:
+        return None
+    _current.set(None)
+    trace.total = time.perf_counter() - trace._t0
+    if TRACE_LOG:
+        logger.info(json.dumps(trace.as_dict(), default=str))
+    return trace
+
+
+def record(kind, name, seconds, rows=None):
+    trace = _current.get()
+    if trace is not None:
+        trace.record(kind, name, seconds, rows)
+
+
+def lap(kind, name):
+    trace = _current.get()
+    if trace is not None:
+        trace.lap(kind, name)
+
+
+@contextmanager
+def span(kind, name):
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.record(kind, name, time.perf_counter() - t0)
+
+
+@contextmanager
+def label(name):
+    """Name the SQL statements run inside this block (default: the SQL itself)."""
+    token = _label.set(name)
+    try:
+        yield
+    finally:
+        _label.reset(token)
+
+
+class TracedCursor(_cursor):
+    """Cursor that records each ``execute`` as a ``query`` span while tracing."""
+
+    def execute(self, query, vars=None):
+        trace = _current.get()
+        if trace is None:
+            return super().execute(query, vars)
+        t0 = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            name = _label.get()
+            if name is None:
+                text = query.decode() if isinstance(query, bytes) else str(query)
+                name = _WS.sub(" ", text).strip()[:80]
+            trace.record("query", name, time.perf_counter() - t0,
+                         self.rowcount if self.rowcount >= 0 else None)